@@ -69,6 +69,7 @@ def create_app(config_name=None):
     from app.controllers.user_controller import user_bp
     from app.controllers.analytics_controller import analytics_bp
     from app.controllers.admin_controller import admin_bp
+    from app.controllers.question_bank_controller import question_bank_bp
     from app.controllers.ugc_net import register_ugc_net_blueprints
     from app.controllers.notifications_controller import notifications_bp
 
@@ -77,6 +78,7 @@ def create_app(config_name=None):
     app.register_blueprint(user_bp, url_prefix='/api/v1/users')
     app.register_blueprint(analytics_bp, url_prefix='/api/v1/analytics')
     app.register_blueprint(admin_bp, url_prefix='/api/v1/admin')
+    app.register_blueprint(question_bank_bp, url_prefix='/api/v1/admin/question-bank')
     app.register_blueprint(notifications_bp, url_prefix='/api/v1/notifications')
 
     # Register UGC NET modular blueprints with the app
@@ -108,8 +110,21 @@ def create_app(config_name=None):
     return app
 
 celery_app = None
+task_app = None  # Flask app the background tasks run in, one per process
 
 def init_celery(app):
-    global celery_app
+    global celery_app, task_app
     celery_app = make_celery(app)
+    task_app = app
+    
+    from app.tasks import register_tasks
+    register_tasks(celery_app)
     return celery_app
+
+def get_task_app():
+    """Flask app for background tasks: the worker's app, or one built on first use in this process"""
+    global task_app
+    if task_app is None:
+        # Building an app creates tables, applies migrations and seeds data, so do it once
+        task_app = create_app()
+    return task_app
@@ -5,7 +5,7 @@ This is the first step towards microservices - extracting business logic to serv
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Import services
 from app.services.admin_dashboard_service import AdminDashboardService
@@ -13,6 +13,8 @@ from app.services.content_management_service import ContentManagementService
 from app.services.user_management_service import UserManagementService
 from app.services.admin_profile_service import AdminProfileService
 from app.services.user_analytics_service import UserAnalyticsService
+from app.services.memoize import get_memo_stats
+from app.services.activity_service import ist_day
 
 from app.models import User
 
@@ -67,6 +69,53 @@ def get_dashboard_stats():
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/dashboard/trends', methods=['GET'])
+@admin_required
+def get_dashboard_trends():
+    """Get daily attempt trends for a date range (start/end as YYYY-MM-DD, or the last N days)"""
+    try:
+        end = request.args.get('end')
+        end_day = datetime.strptime(end, '%Y-%m-%d').date() if end else ist_day()
+        start = request.args.get('start')
+        if start:
+            start_day = datetime.strptime(start, '%Y-%m-%d').date()
+        else:
+            start_day = end_day - timedelta(days=request.args.get('days', 30, type=int) - 1)
+        
+        trends = dashboard_service.get_trends(
+            start_day, end_day,
+            subject_id=request.args.get('subject_id', type=int),
+            attempt_type=request.args.get('attempt_type')
+        )
+        return jsonify(trends), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/dashboard/activity', methods=['GET'])
+@admin_required
+def get_dashboard_activity():
+    """Get DAU/WAU/MAU, daily active users of the last ?days= and retention of the last ?weeks= signup cohorts"""
+    try:
+        days = max(1, min(request.args.get('days', 30, type=int), 365))
+        weeks = max(1, min(request.args.get('weeks', 8, type=int), 52))
+        report = dashboard_service.get_activity_report(days, weeks)
+        if report is None:
+            return jsonify({'error': 'Activity data is not available yet'}), 503
+        return jsonify(report), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Get hit and miss counters of the memoized services in this worker process"""
+    return jsonify({'memoized': get_memo_stats()}), 200
+
+
 # Subject Management
 @admin_bp.route('/subjects', methods=['GET'])
 @admin_required
@@ -235,6 +284,25 @@ def update_mock_test_status(test_id):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/mock-tests/attempts/<int:attempt_id>/regenerate', methods=['GET'])
+@admin_required
+def regenerate_mock_attempt_paper(attempt_id):
+    """Rebuild a mock attempt's paper from its seed and check it against the frozen paper"""
+    try:
+        result = content_service.regenerate_mock_attempt_paper(attempt_id)
+        if result is None:
+            return jsonify({'error': 'Mock attempt not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'data': result
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # User Management
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
@@ -3,6 +3,7 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from datetime import datetime
 from app import db
 from app.models import User
+from app.services.activity_service import ActivityService
 from app.utils.timezone_utils import get_ist_now
 
 auth_bp = Blueprint('auth', __name__)
@@ -54,6 +55,7 @@ def register():
         user.set_password(data['password'])
         db.session.add(user)
         db.session.commit()
+        ActivityService().record_signup(user)
         # Create access token
         access_token = create_access_token(identity=str(user.id))
         return jsonify({
@@ -7,6 +7,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import User, QuestionBank
 from app.services.question_bank_service import QuestionBankService
+from app.services.attempt_rescoring_service import AttemptRescoringService
 from datetime import datetime
 
 question_bank_bp = Blueprint('question_bank', __name__)
@@ -143,6 +144,7 @@ def update_question_bank_question(question_id):
             return jsonify({'error': 'Question not found'}), 404
         
         data = request.get_json()
+        previous_correct_option = question.correct_option
         
         # Update allowed fields
         if 'question_text' in data:
@@ -167,19 +169,48 @@ def update_question_bank_question(question_id):
             question.set_tags(data['tags'])
         
         # Regenerate content hash after changes
-        question.content_hash = question.generate_content_hash()
+        question.content_hash = QuestionBankService.generate_content_hash(
+            question.question_text,
+            {'A': question.option_a, 'B': question.option_b, 'C': question.option_c, 'D': question.option_d},
+            question.correct_option
+        )
         
         db.session.commit()
         
-        return jsonify({
+        response = {
             'message': 'Question updated successfully',
             'question': question.to_dict(include_answer=True)
-        }), 200
+        }
+        
+        # A corrected answer key re-scores only the attempts that served this question
+        if question.correct_option != previous_correct_option:
+            rescore_job = AttemptRescoringService().request_rescore([question.id])
+            response['rescore_job_id'] = rescore_job['job_id']
+            response['rescore_status'] = rescore_job['status']
         
+        return jsonify(response), 200
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@question_bank_bp.route('/rescore-jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_rescore_job_progress(job_id):
+    """Get the progress of a background re-score job"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        progress = AttemptRescoringService().get_progress(job_id)
+        if not progress:
+            return jsonify({'error': 'Re-score job not found'}), 404
+        
+        return jsonify({'job_id': job_id, 'progress': progress}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @question_bank_bp.route('/questions/<int:question_id>', methods=['DELETE'])
 @jwt_required()
 def delete_question_bank_question(question_id):
@@ -369,16 +400,22 @@ def get_question_performance_analytics(question_id):
 @question_bank_bp.route('/analytics/trends', methods=['GET'])
 @jwt_required()
 def get_question_bank_trends():
-    """Get usage trends for question bank"""
+    """Get usage trends for question bank per ?granularity= hour, day (default) or week"""
     try:
         if not admin_required():
             return jsonify({'error': 'Admin access required'}), 403
         
-        days = request.args.get('days', 30, type=int)
-        trends = QuestionBankService.get_usage_trends(days=days)
+        days = max(1, min(request.args.get('days', 30, type=int), 365))
+        granularity = request.args.get('granularity', 'day')
+        if granularity == 'hour':
+            # Hourly buckets are for recent activity, keep the series readable
+            days = min(days, 14)
+        trends = QuestionBankService.get_usage_trends(days=days, granularity=granularity)
         
         return jsonify(trends), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
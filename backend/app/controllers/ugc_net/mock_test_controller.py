@@ -5,8 +5,21 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from sqlalchemy import desc
 from app import db
-from app.models import User, UGCNetMockTest, UGCNetMockAttempt
+from app.models import User, QuestionBank, UGCNetMockTest, UGCNetMockAttempt
 from app.services.ugc_net_paper_generator import UGCNetPaperGenerator
+from app.services.activity_service import ActivityService
+from app.services.mock_paper_pool_service import MockPaperPoolService, build_paper_config
+from app.services.question_pool_index import hydrate_questions
+from app.services.question_exposure_service import QuestionExposureService
+from app.services.question_stats_service import QuestionStatsService
+from app.services.attempt_rescoring_service import AttemptRescoringService
+from app.services.attempt_response_service import AttemptResponseService
+from app.services.attempt_expiry_service import AttemptExpiryService
+from app.services.attempt_rollup_service import AttemptRollupService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.score_distribution_service import ScoreDistributionService
+from app.services.user_dashboard_service import UserDashboardService
+from app.services.scoring_engine import ScoringEngine, get_qualification_status
 import json
 
 ugc_net_mock_bp = Blueprint('ugc_net_mock', __name__)
@@ -21,6 +34,40 @@ def get_current_user():
         return None
 
 
+def freeze_attempt_paper(attempt, questions, seed=None, bank_version=None):
+    """Store the served question IDs, a compact answer key and the generation seed on the attempt"""
+    question_ids = [q.id if hasattr(q, 'id') else q.get('id') for q in questions]
+    
+    if all(hasattr(q, 'correct_option') for q in questions):
+        rows = questions
+    else:
+        # Answers are never sent to the client, so read them back in one primary key lookup
+        rows = db.session.query(
+            QuestionBank.id, QuestionBank.correct_option, QuestionBank.marks
+        ).filter(QuestionBank.id.in_(question_ids)).all()
+    
+    answer_key = {str(row.id): [row.correct_option, row.marks or 1] for row in rows}
+    
+    attempt.set_question_ids(question_ids)
+    attempt.set_answer_key(answer_key)
+    attempt.paper_seed = seed
+    attempt.bank_version = bank_version
+    attempt.total_questions = len(question_ids)
+    attempt.total_marks = sum(marks for _, marks in answer_key.values())
+
+
+def load_attempt_questions(attempt):
+    """Load the frozen paper of an attempt in its original order"""
+    question_ids = attempt.get_question_ids()
+    if not question_ids:
+        return []
+    
+    questions_by_id = {
+        q.id: q for q in QuestionBank.query.filter(QuestionBank.id.in_(question_ids)).all()
+    }
+    return [questions_by_id[q_id].to_dict() for q_id in question_ids if q_id in questions_by_id]
+
+
 @ugc_net_mock_bp.route('/mock-tests/generate', methods=['POST'])
 @jwt_required()
 def generate_mock_test():
@@ -239,43 +286,34 @@ def start_mock_test_attempt(test_id):
             expiry_time = ongoing_attempt.start_time + timedelta(minutes=time_limit_minutes)
             
             if datetime.utcnow() > expiry_time:
-                # Auto-submit the expired attempt
-                ongoing_attempt.status = 'completed'
-                ongoing_attempt.end_time = expiry_time
-                ongoing_attempt.score = 0.0
-                ongoing_attempt.percentage = 0.0
-                ongoing_attempt.correct_answers = 0
-                ongoing_attempt.total_questions = mock_test.total_questions
-                db.session.commit()
+                # Auto-submit the expired attempt, scored from whatever answers it saved
+                AttemptExpiryService().finalize_mock_attempts([ongoing_attempt])
                 
                 # Clear the ongoing_attempt to create a new fresh one below
                 ongoing_attempt = None
+            elif ongoing_attempt.get_question_ids():
+                # Resume with the paper frozen when the attempt was started
+                ongoing_attempt_dict = ongoing_attempt.to_dict()
+                ongoing_attempt_dict['questions'] = load_attempt_questions(ongoing_attempt)
+                
+                return jsonify({
+                    'message': 'You have an ongoing attempt for this test',
+                    'attempt': ongoing_attempt_dict
+                }), 200
             else:
-                # Generate questions for the valid ongoing attempt
+                # Attempt started before papers were frozen; generate once and freeze it now
                 generator = UGCNetPaperGenerator()
-                
-                # Build configuration from mock test
-                config = {
-                    'subject_id': mock_test.subject_id,
-                    'paper_type': mock_test.paper_type,
-                    'total_questions': mock_test.total_questions,
-                    'difficulty_distribution': {
-                        'easy': mock_test.easy_percentage,
-                        'medium': mock_test.medium_percentage,
-                        'hard': mock_test.hard_percentage
-                    },
-                    'source_distribution': {
-                        'previous_year': mock_test.previous_year_percentage,
-                        'ai_generated': mock_test.ai_generated_percentage,
-                        'manual': 100 - mock_test.previous_year_percentage - mock_test.ai_generated_percentage
-                    },
-                    'weightage_config': mock_test.get_weightage_config()
-                }
-                
-                # Generate questions
-                result = generator.generate_paper(config)
+                result = generator.generate_paper(build_paper_config(mock_test))
                 
                 if result['success']:
+                    freeze_attempt_paper(
+                        ongoing_attempt, result['paper']['questions'], result.get('seed'), result.get('bank_version')
+                    )
+                    AttemptRescoringService.index_attempt(
+                        'mock', ongoing_attempt.id, user.id, ongoing_attempt.get_question_ids()
+                    )
+                    db.session.commit()
+                    
                     ongoing_attempt_dict = ongoing_attempt.to_dict()
                     # Check if questions are already dicts or model objects
                     if result['paper']['questions'] and hasattr(result['paper']['questions'][0], 'to_dict'):
@@ -292,6 +330,28 @@ def start_mock_test_attempt(test_id):
                     'attempt': ongoing_attempt_dict
                 }), 200
         
+        # Claim a pre-generated paper, falling back to inline generation when the pool is empty
+        exposure_service = QuestionExposureService()
+        pooled_paper = MockPaperPoolService().claim_paper(mock_test)
+        
+        if pooled_paper:
+            questions = hydrate_questions(pooled_paper['question_ids'])
+            statistics = pooled_paper['statistics']
+            seed, bank_version = pooled_paper.get('seed'), pooled_paper.get('bank_version')
+        else:
+            # Generate questions for this attempt, steering away from questions the user has already seen
+            generator = UGCNetPaperGenerator()
+            seen = exposure_service.get_seen(user.id)
+            result = generator.generate_paper(build_paper_config(mock_test), avoid_ids=seen)
+            
+            if not result['success']:
+                return jsonify({'error': f'Failed to generate questions: {result["error"]}'}), 400
+            
+            questions = result['paper']['questions']
+            statistics = result['statistics']
+            # A paper steered by the seen questions cannot be rebuilt from its seed alone
+            seed, bank_version = (None, None) if seen else (result.get('seed'), result.get('bank_version'))
+        
         # Create new attempt (either no ongoing attempt or the old one was expired and cleaned up)
         attempt = UGCNetMockAttempt(
             mock_test_id=test_id,
@@ -301,46 +361,25 @@ def start_mock_test_attempt(test_id):
             time_limit=mock_test.time_limit
         )
         
+        # Freeze the paper so that resume and submit use exactly these questions
+        freeze_attempt_paper(attempt, questions, seed, bank_version)
+        
         db.session.add(attempt)
+        db.session.flush()
+        AttemptRescoringService.index_attempt('mock', attempt.id, user.id, attempt.get_question_ids())
         db.session.commit()
         
-        # Generate questions for this attempt using the mock test configuration
-        generator = UGCNetPaperGenerator()
-        
-        # Build configuration from mock test
-        config = {
-            'subject_id': mock_test.subject_id,
-            'paper_type': mock_test.paper_type,
-            'total_questions': mock_test.total_questions,
-            'difficulty_distribution': {
-                'easy': mock_test.easy_percentage,
-                'medium': mock_test.medium_percentage,
-                'hard': mock_test.hard_percentage
-            },
-            'source_distribution': {
-                'previous_year': mock_test.previous_year_percentage,
-                'ai_generated': mock_test.ai_generated_percentage,
-                'manual': 100 - mock_test.previous_year_percentage - mock_test.ai_generated_percentage
-            },
-            'weightage_config': mock_test.get_weightage_config()
-        }
-        
-        # Generate questions
-        result = generator.generate_paper(config)
-        
-        if not result['success']:
-            db.session.delete(attempt)
-            db.session.commit()
-            return jsonify({'error': f'Failed to generate questions: {result["error"]}'}), 400
+        exposure_service.mark_seen(user.id, attempt.get_question_ids())
+        ActivityService().record([user])
         
         # Return attempt details with questions
         attempt_dict = attempt.to_dict()
         # Check if questions are already dicts or model objects
-        if result['paper']['questions'] and hasattr(result['paper']['questions'][0], 'to_dict'):
-            attempt_dict['questions'] = [q.to_dict() for q in result['paper']['questions']]
+        if questions and hasattr(questions[0], 'to_dict'):
+            attempt_dict['questions'] = [q.to_dict() for q in questions]
         else:
-            attempt_dict['questions'] = result['paper']['questions']
-        attempt_dict['statistics'] = result['statistics']
+            attempt_dict['questions'] = questions
+        attempt_dict['statistics'] = statistics
         
         return jsonify({
             'message': 'Mock test attempt started',
@@ -376,81 +415,38 @@ def submit_mock_test_attempt(test_id, attempt_id):
         # Get mock test
         mock_test = UGCNetMockTest.query.get(test_id)
         
-        # Generate the same questions that were used in the attempt to validate answers
-        generator = UGCNetPaperGenerator()
-        
-        # Build configuration from mock test
-        config = {
-            'subject_id': mock_test.subject_id,
-            'paper_type': mock_test.paper_type,
-            'total_questions': mock_test.total_questions,
-            'difficulty_distribution': {
-                'easy': mock_test.easy_percentage,
-                'medium': mock_test.medium_percentage,
-                'hard': mock_test.hard_percentage
-            },
-            'source_distribution': {
-                'previous_year': mock_test.previous_year_percentage,
-                'ai_generated': mock_test.ai_generated_percentage,
-                'manual': 100 - mock_test.previous_year_percentage - mock_test.ai_generated_percentage
-            },
-            'weightage_config': mock_test.get_weightage_config()
-        }
-        
-        # Generate questions to get the correct answers
-        result = generator.generate_paper(config)
-        
-        # Calculate actual score
-        correct_answers = 0
-        total_marks = 0
-        obtained_marks = 0
-        
-        if result['success']:
-            questions = result['paper']['questions']
-            
-            # Create a mapping of question ID to correct answer and marks
-            question_answers = {}
-            question_marks = {}
-            for q in questions:
-                # Handle both model objects and dictionaries
-                if hasattr(q, 'id'):
-                    # q is a model object
-                    question_id = str(q.id)
-                    correct_option = q.correct_option if hasattr(q, 'correct_option') else 'A'
-                    marks = q.marks if hasattr(q, 'marks') else 2
-                else:
-                    # q is a dictionary
-                    question_id = str(q.get('id', 0))
-                    correct_option = q.get('correct_option', 'A')
-                    marks = q.get('marks', 2)
-                
-                question_answers[question_id] = correct_option
-                question_marks[question_id] = marks
-                total_marks += marks
-            
-            # Check submitted answers
-            for question_id, submitted_answer in answers.items():
-                if question_id in question_answers:
-                    if submitted_answer == question_answers[question_id]:
-                        correct_answers += 1
-                        obtained_marks += question_marks.get(question_id, 2)  # Use actual marks for this question
+        # Score against the answer key frozen when the attempt was started
+        # (attempts that only stored question IDs are scored against the question bank)
+        question_ids = attempt.get_question_ids()
+        
+        if question_ids:
+            result = ScoringEngine().score_attempt(question_ids, answers, attempt.get_answer_key())
+            correct_answers = result['correct_answers']
+            total_marks = int(result['total_marks'])
+            obtained_marks = result['obtained_marks']
+            total_questions = result['total_questions']
+            attempt.set_chapter_wise_performance(result['chapter_performance'])
+            AttemptResponseService.record_attempt(
+                'mock', attempt.id, user.id, result, data.get('time_spent')
+            )
         else:
-            # Fallback if question generation fails
+            # Fallback for attempts started before papers were frozen
             total_marks = mock_test.total_questions * 2
             correct_answers = 0
             obtained_marks = 0
+            total_questions = mock_test.total_questions
         
         # Calculate percentage (ensure it doesn't exceed 100%)
         percentage = min((obtained_marks / total_marks * 100), 100) if total_marks > 0 else 0
         
+        # Standing among earlier attempts, read from the score distribution in constant time
+        score_distribution = ScoreDistributionService()
+        standing = score_distribution.get_standing(test_id, mock_test.subject_id, percentage)
+        
         # Determine qualification status based on UGC NET criteria
-        qualification_status = 'not_qualified'
-        if percentage >= 60:
-            qualification_status = 'qualified'
-        elif percentage >= 40:
-            qualification_status = 'borderline'
-        else:
-            qualification_status = 'not_qualified'
+        qualification_status = get_qualification_status(
+            percentage, score_distribution.get_qualification_percentile(standing)
+        )
         
         # Update attempt
         attempt.status = 'completed'
@@ -460,10 +456,11 @@ def submit_mock_test_attempt(test_id, attempt_id):
         attempt.answers_data = json.dumps(answers)
         attempt.score = obtained_marks
         attempt.correct_answers = correct_answers
-        attempt.total_questions = mock_test.total_questions
+        attempt.total_questions = total_questions
         attempt.total_marks = total_marks
         attempt.percentage = percentage
         attempt.qualification_status = qualification_status
+        attempt.predicted_rank = standing['predicted_rank']
         
         # Calculate time taken
         time_taken_minutes = (attempt.end_time - attempt.start_time).total_seconds() / 60
@@ -473,13 +470,24 @@ def submit_mock_test_attempt(test_id, attempt_id):
             'total_time_taken': time_taken_minutes,
             'submitted_answers': len(answers),
             'completion_status': 'completed',
-            'accuracy': (correct_answers / mock_test.total_questions * 100) if mock_test.total_questions > 0 else 0
+            'accuracy': (correct_answers / mock_test.total_questions * 100) if mock_test.total_questions > 0 else 0,
+            'percentile': standing['percentile'],
+            'subject_percentile': standing['subject_percentile'],
+            'predicted_rank': standing['predicted_rank']
         }
         
         attempt.analytics = json.dumps(analytics)
+        AttemptRollupService().record('mock', [attempt])
+        UserDashboardService().record('mock', [attempt])
         
         db.session.commit()
         
+        score_distribution.record(test_id, mock_test.subject_id, percentage)
+        if question_ids:
+            QuestionStatsService().record_outcomes(result, data.get('time_spent'))
+        LeaderboardService().record([attempt])
+        ActivityService().record([user])
+        
         return jsonify({
             'message': 'Mock test submitted successfully',
             'attempt': attempt.to_dict(),
@@ -561,6 +569,66 @@ def get_test_attempts(test_id):
         return jsonify({'error': str(e)}), 500
 
 
+@ugc_net_mock_bp.route('/mock-tests/<int:test_id>/score-distribution', methods=['GET'])
+@jwt_required()
+def get_score_distribution(test_id):
+    """Score quantiles of a mock test and its subject, plus the standing of ?percentage= if given"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        
+        mock_test = UGCNetMockTest.query.get_or_404(test_id)
+        score_distribution = ScoreDistributionService()
+        
+        response = {
+            'mock_test': score_distribution.get_summary('mock_test', test_id),
+            'subject': score_distribution.get_summary('subject', mock_test.subject_id)
+        }
+        
+        percentage = request.args.get('percentage', type=float)
+        if percentage is not None:
+            standing = score_distribution.get_standing(test_id, mock_test.subject_id, percentage)
+            standing['qualification_status'] = get_qualification_status(
+                percentage, score_distribution.get_qualification_percentile(standing)
+            )
+            response['standing'] = standing
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@ugc_net_mock_bp.route('/leaderboards/<scope>/<scope_id>', methods=['GET'])
+@jwt_required()
+def get_leaderboard(scope, scope_id):
+    """Top ?limit= users of a mock test, subject, week or month board ('current' for this week or month) and the caller's standing"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        
+        leaderboards = LeaderboardService()
+        try:
+            board = leaderboards.resolve_board(scope, scope_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+        radius = max(0, min(request.args.get('radius', 2, type=int), 10))
+        
+        return jsonify({
+            'scope': board[0],
+            'scope_id': board[1],
+            'total': leaderboards.get_size(board),
+            'top': leaderboards.get_top(board, limit),
+            'me': leaderboards.get_standing(board, user.id, radius)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @ugc_net_mock_bp.route('/mock-tests/attempts/<int:attempt_id>', methods=['DELETE'])
 @jwt_required()
 def delete_mock_test_attempt(attempt_id):
@@ -580,8 +648,24 @@ def delete_mock_test_attempt(attempt_id):
             return jsonify({'error': 'Mock test attempt not found'}), 404
         
         # Delete the attempt
+        leaderboards = LeaderboardService()
+        boards = []
+        scored = None
+        if attempt.is_completed:
+            AttemptRollupService().record('mock', [attempt], sign=-1)
+            UserDashboardService().discard([attempt.user_id])
+            if attempt.status == 'completed' and attempt.completed_at:
+                boards = leaderboards.boards(attempt)
+        if attempt.status == 'completed':
+            scored = (attempt.mock_test_id, attempt.mock_test.subject_id, attempt.percentage)
+        AttemptRescoringService.unindex_attempts([attempt])
+        responses = AttemptResponseService.delete_responses(AttemptResponseService.attempts_criterion([attempt]))
         db.session.delete(attempt)
         db.session.commit()
+        QuestionStatsService().remove_outcomes(responses)
+        leaderboards.refresh([(user.id, boards)])
+        if scored:
+            ScoreDistributionService().discard(*scored)
         
         return jsonify({
             'success': True,
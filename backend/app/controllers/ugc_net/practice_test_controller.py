@@ -6,8 +6,17 @@ from datetime import datetime
 from sqlalchemy import desc
 from app import db
 from app.models import User, Subject, Chapter, QuestionBank, UGCNetPracticeAttempt
+from app.services.activity_service import ActivityService
+from app.services.answer_buffer_service import AnswerBufferService
+from app.services.attempt_rescoring_service import AttemptRescoringService
+from app.services.attempt_rollup_service import AttemptRollupService
+from app.services.attempt_response_service import AttemptResponseService
+from app.services.question_exposure_service import QuestionExposureService
+from app.services.question_stats_service import QuestionStatsService
+from app.services.scoring_engine import ScoringEngine, build_question_results
 from app.services.ugc_net_paper_generator import UGCNetPaperGenerator
-from app.utils.timezone_utils import get_ist_now
+from app.services.user_dashboard_service import UserDashboardService
+from app.utils.timezone_utils import get_ist_now, IST
 import json
 
 ugc_net_practice_bp = Blueprint('ugc_net_practice', __name__)
@@ -74,12 +83,15 @@ def generate_practice_test():
             'source_distribution': data.get('source_distribution', {
                 'previous_year': 70,
                 'ai_generated': 30
-            })
+            }),
+            'difficulty_band': data.get('difficulty_band')
         }
         
-        # Generate practice test using paper generator
+        # Generate practice test using paper generator, steering away from questions the user has already seen
+        exposure_service = QuestionExposureService()
         generator = UGCNetPaperGenerator()
-        result = generator.generate_practice_test(config)
+        seen = exposure_service.get_seen(user.id)
+        result = generator.generate_practice_test(config, avoid_ids=seen)
         
         if not result['success']:
             return jsonify({'error': result['error']}), 400
@@ -107,8 +119,19 @@ def generate_practice_test():
         attempt.set_selected_chapters(selected_chapter_ids)
         attempt.set_questions_data(questions)
         
+        # Keep the generation seed so the same test can be rebuilt from the question bank,
+        # unless the seen questions steered it and the seed alone no longer determines it
+        if not seen:
+            attempt.paper_seed = result.get('seed')
+            attempt.bank_version = result.get('bank_version')
+        
         db.session.add(attempt)
+        db.session.flush()
+        AttemptRescoringService.index_attempt('practice', attempt.id, user.id, [q['id'] for q in questions])
         db.session.commit()
+        ActivityService().record([user])
+        
+        exposure_service.mark_seen(user.id, [q['id'] for q in questions])
         
         return jsonify({
             'message': 'Practice test generated successfully',
@@ -128,7 +151,13 @@ def generate_practice_test():
 @ugc_net_practice_bp.route('/practice-tests/attempts/<int:attempt_id>/answers', methods=['PUT'])
 @jwt_required()
 def auto_save_answers(attempt_id):
-    """Auto-save answers for a practice test attempt (for progressive saving)"""
+    """
+    Auto-save answers for a practice test attempt (for progressive saving)
+    
+    Accepts either 'answers', a full snapshot, or 'changes', only the questions
+    answered or cleared (null) since the last save. Both are buffered and written
+    to the attempt in batches, see AnswerBufferService.
+    """
     try:
         user = get_current_user()
         if not user:
@@ -151,24 +180,32 @@ def auto_save_answers(attempt_id):
                 return jsonify({'error': 'Cannot save answers for this attempt'}), 400
         
         data = request.get_json()
-        if not data or 'answers' not in data:
+        if not data or ('answers' not in data and 'changes' not in data):
             return jsonify({'error': 'Answers data is required'}), 400
         
-        answers = data['answers']
-        print(f"DEBUG: Auto-saving answers for attempt {attempt_id}: {answers}")
+        replace = 'changes' not in data
+        answers = data['answers'] if replace else data['changes']
+        if not isinstance(answers, dict):
+            return jsonify({'error': 'Answers must be an object of question IDs to options'}), 400
         
         # Update the attempt status to in_progress if it was generated
-        if attempt.status == 'generated':
+        started = attempt.status == 'generated'
+        if started:
             attempt.status = 'in_progress'
             attempt.started_at = get_ist_now()
+            # UTC like the mock attempts, the expiry sweeper measures the time limit from here
+            attempt.start_time = datetime.utcnow()
         
-        # Save the current answers (auto-save)
-        attempt.set_answers_data(answers)
+        # Save the current answers (auto-save), only the first save of an attempt writes to the database
+        buffered = AnswerBufferService().save(attempt, answers, replace=replace)
         db.session.commit()
+        if started:
+            ActivityService().record([user])
         
         return jsonify({
             'message': 'Answers saved successfully',
             'saved_answers': len(answers),
+            'buffered': buffered,
             'status': attempt.status
         }), 200
         
@@ -198,46 +235,24 @@ def submit_practice_test(attempt_id):
         if attempt.status == 'completed':
             return jsonify({'error': 'Practice test already submitted'}), 400
         
-        data = request.get_json()
-        if not data or 'answers' not in data:
+        # Answers not sent with the submit fall back to the auto-saved ones
+        data = request.get_json() or {}
+        answer_buffer = AnswerBufferService()
+        answers = data['answers'] if 'answers' in data else answer_buffer.get_answers(attempt)
+        if not answers and 'answers' not in data:
             return jsonify({'error': 'Answers are required'}), 400
         
-        answers = data['answers']
-        
-        # Load questions from attempt data
+        # Score every question in one query and a vectorized pass
         questions_data = json.loads(attempt.questions_data)
-        questions = []
-        for q_data in questions_data:
-            # Reconstruct question bank objects for evaluation
-            question = QuestionBank.query.get(q_data['id'])
-            if question:
-                questions.append(question)
-        
-        # Calculate score
-        score = 0
-        total_marks = sum(getattr(question, 'marks', 1) for question in questions)  # Sum of all question marks
-        correct_answers = 0
-        wrong_answers = 0
-        question_results = []
-        
-        for question in questions:
-            question_id = str(question.id)
-            user_answer = answers.get(question_id)
-            is_correct = user_answer and user_answer.upper() == question.correct_option.upper()
-            
-            if is_correct:
-                score += getattr(question, 'marks', 1)  # Default to 1 mark if not set
-                correct_answers += 1
-            else:
-                wrong_answers += 1
-            
-            question_results.append({
-                'question_id': question.id,
-                'user_answer': user_answer,
-                'correct_answer': question.correct_option,
-                'is_correct': is_correct,
-                'explanation': question.explanation
-            })
+        question_ids = [q_data['id'] for q_data in questions_data]
+        result = ScoringEngine().score_attempt(question_ids, answers)
+        
+        score = result['obtained_marks']
+        total_marks = int(result['total_marks'])  # Sum of all question marks
+        correct_answers = result['correct_answers']
+        wrong_answers = result['total_questions'] - correct_answers
+        
+        question_results = build_question_results(result, answers)
         
         percentage = min((score / total_marks * 100), 100) if total_marks > 0 else 0
         
@@ -252,14 +267,25 @@ def submit_practice_test(attempt_id):
         attempt.wrong_answers = wrong_answers
         attempt.set_answers_data(answers)
         attempt.set_detailed_results({'questions': question_results})
+        AttemptResponseService.record_attempt('practice', attempt.id, user.id, result, data.get('time_spent'))
         
         # Calculate time taken if start time is available
         if attempt.started_at:
-            time_taken = (attempt.completed_at - attempt.started_at).total_seconds()
+            # started_at comes back from the database without its IST offset
+            started_at = attempt.started_at
+            if started_at.tzinfo is None:
+                started_at = IST.localize(started_at)
+            time_taken = (attempt.completed_at - started_at).total_seconds()
             attempt.time_taken = int(time_taken)
         
+        AttemptRollupService().record('practice', [attempt])
+        UserDashboardService().record('practice', [attempt])
         db.session.commit()
         
+        answer_buffer.discard(attempt.id)
+        QuestionStatsService().record_outcomes(result, data.get('time_spent'))
+        ActivityService().record([user])
+        
         return jsonify({
             'message': 'Practice test submitted successfully',
             'attempt_id': attempt.id,
@@ -559,8 +585,15 @@ def delete_practice_test_attempt(attempt_id):
             return jsonify({'error': 'Practice test attempt not found'}), 404
         
         # Delete the attempt
+        if attempt.is_completed:
+            AttemptRollupService().record('practice', [attempt], sign=-1)
+            UserDashboardService().discard([attempt.user_id])
+        AttemptRescoringService.unindex_attempts([attempt])
+        responses = AttemptResponseService.delete_responses(AttemptResponseService.attempts_criterion([attempt]))
         db.session.delete(attempt)
         db.session.commit()
+        QuestionStatsService().remove_outcomes(responses)
+        AnswerBufferService().discard(attempt_id)
         
         return jsonify({
             'success': True,
@@ -1,3 +1,3 @@
-from .models import User, Subject, Chapter, StudyMaterial, QuestionBank, UGCNetMockTest, UGCNetMockAttempt, UGCNetPracticeAttempt, UserStudySession, UserLearningMetrics
+from .models import User, Subject, Chapter, StudyMaterial, QuestionBank, UGCNetMockTest, UGCNetMockAttempt, UGCNetPracticeAttempt, AttemptQuestionIndex, AttemptResponse, DailyAttemptRollup, SubjectUserActivity, UserDashboard, QuestionStatsFlush, UserStudySession, UserLearningMetrics
 
-__all__ = ['User', 'Subject', 'Chapter', 'StudyMaterial', 'QuestionBank', 'UGCNetMockTest', 'UGCNetMockAttempt', 'UGCNetPracticeAttempt', 'UserStudySession', 'UserLearningMetrics']
+__all__ = ['User', 'Subject', 'Chapter', 'StudyMaterial', 'QuestionBank', 'UGCNetMockTest', 'UGCNetMockAttempt', 'UGCNetPracticeAttempt', 'AttemptQuestionIndex', 'AttemptResponse', 'DailyAttemptRollup', 'SubjectUserActivity', 'UserDashboard', 'QuestionStatsFlush', 'UserStudySession', 'UserLearningMetrics']
@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from app.utils.timezone_utils import current_ist_timestamp, get_ist_isoformat
+from app.utils.time_buckets import bucket_expression
 import json
 from typing import Dict, Optional
 
@@ -219,6 +220,9 @@ class QuestionBank(db.Model):
     avg_solve_time = db.Column(db.Integer)  # Average time to solve in seconds
     success_rate = db.Column(db.Float, default=0.0)  # Success percentage (0-100)
     attempt_count = db.Column(db.Integer, default=0)  # Total attempts across all users
+    irt_difficulty = db.Column(db.Float)  # Calibrated IRT difficulty (logits), NULL until calibrated
+    irt_discrimination = db.Column(db.Float)  # Calibrated IRT discrimination
+    irt_calibrated_at = db.Column(db.DateTime)
     
     # Verification fields
     is_verified = db.Column(db.Boolean, default=False)
@@ -266,6 +270,9 @@ class QuestionBank(db.Model):
             'avg_solve_time': self.avg_solve_time,
             'success_rate': self.success_rate,
             'attempt_count': self.attempt_count,
+            'irt_difficulty': self.irt_difficulty,
+            'irt_discrimination': self.irt_discrimination,
+            'irt_calibrated_at': get_ist_isoformat(self.irt_calibrated_at),
             'is_verified': self.is_verified,
             'verification_method': self.verification_method,
             'verification_confidence': self.verification_confidence,
@@ -284,10 +291,18 @@ class QuestionBank(db.Model):
         return data
     
     def update_performance_stats(self):
-        """Update performance statistics based on question attempts"""
-        # This would calculate avg_solve_time and success_rate from QuestionPerformance
-        # Implementation would depend on your analytics requirements
-        pass
+        """Recalculate performance statistics from the stored attempt responses"""
+        # The submit paths keep these columns current through QuestionStatsService;
+        # this rebuilds them for a single question, e.g. after an answer key correction
+        attempts, correct, avg_time = db.session.query(
+            db.func.count(AttemptResponse.id),
+            db.func.sum(db.case((AttemptResponse.is_correct == True, 1), else_=0)),
+            db.func.avg(AttemptResponse.time_spent)
+        ).filter(AttemptResponse.question_id == self.id).one()
+        
+        self.attempt_count = attempts
+        self.success_rate = round((correct or 0) / attempts * 100, 2) if attempts else 0.0
+        self.avg_solve_time = int(round(avg_time)) if avg_time is not None else None
     
     def increment_usage(self):
         """Increment usage count and update last used timestamp"""
@@ -306,9 +321,26 @@ class QuestionBank(db.Model):
         }
     
     def get_usage_trends(self, days=30):
-        """Get usage trends over specified days - simplified version"""
-        # Simplified implementation since we don't have detailed QuestionPerformance data
-        return []
+        """Get daily (IST) attempts and success rate of this question over the specified days"""
+        start_date = datetime.utcnow() - timedelta(days=days)
+        day = bucket_expression(AttemptResponse.created_at)
+        rows = db.session.query(
+            day.label('day'),
+            db.func.count(AttemptResponse.id).label('attempts'),
+            db.func.sum(db.case((AttemptResponse.is_correct == True, 1), else_=0)).label('correct')
+        ).filter(
+            AttemptResponse.question_id == self.id,
+            AttemptResponse.created_at >= start_date
+        ).group_by(day).order_by(day).all()
+        
+        return [
+            {
+                'date': str(row.day),
+                'attempts': row.attempts,
+                'success_rate': round((row.correct or 0) / row.attempts * 100, 2) if row.attempts else 0
+            }
+            for row in rows
+        ]
 
 class UGCNetMockTest(db.Model):
     """UGC NET Mock Test Configuration with weightage system"""
@@ -388,6 +420,12 @@ class UGCNetMockTest(db.Model):
 class UGCNetMockAttempt(db.Model):
     """UGC NET Mock Test Attempts with detailed analytics"""
     __tablename__ = 'ugc_net_mock_attempts'
+    __table_args__ = (
+        # Expiry sweeps and in-progress lookups
+        db.Index('ix_ugc_net_mock_attempts_status_start_time', 'status', 'start_time'),
+        # Attempt history pages
+        db.Index('ix_ugc_net_mock_attempts_user_completed', 'user_id', 'is_completed', 'completed_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -425,6 +463,9 @@ class UGCNetMockAttempt(db.Model):
     # Question-wise data (legacy fields for backward compatibility)
     answers = db.Column(db.Text)  # JSON string of user answers
     question_ids = db.Column(db.Text)  # JSON array of question IDs used in this attempt
+    answer_key = db.Column(db.Text)  # JSON object of question ID -> [correct_option, marks], frozen at start
+    paper_seed = db.Column(db.BigInteger)  # Seed the paper was generated from
+    bank_version = db.Column(db.Integer)  # Question bank version the paper was generated from
     
     # Time tracking (legacy fields for backward compatibility)
     started_at = db.Column(db.DateTime, default=current_ist_timestamp)
@@ -451,6 +492,12 @@ class UGCNetMockAttempt(db.Model):
     def get_question_ids(self):
         return json.loads(self.question_ids) if self.question_ids else []
     
+    def set_answer_key(self, answer_key_dict):
+        self.answer_key = json.dumps(answer_key_dict, separators=(',', ':'))
+    
+    def get_answer_key(self):
+        return json.loads(self.answer_key) if self.answer_key else {}
+    
     def set_chapter_wise_performance(self, performance_dict):
         self.chapter_wise_performance = json.dumps(performance_dict)
     
@@ -480,42 +527,20 @@ class UGCNetMockAttempt(db.Model):
         if not self.is_completed:
             return 0
             
-        # Basic score calculation
-        user_answers = self.get_answers()
-        question_ids = self.get_question_ids()
-        
-        score = 0
-        chapter_scores = {}
+        # Score against the frozen answer key in one query and a vectorized pass
+        from app.services.scoring_engine import ScoringEngine  # Import here to avoid circular import
+        result = ScoringEngine().score_mock_attempts([self])[0]
         
-        for q_id in question_ids:
-            question = QuestionBank.query.get(q_id)
-            if question and str(q_id) in user_answers:
-                if user_answers[str(q_id)].upper() == question.correct_option:
-                    score += question.marks
-                    
-                    # Track chapter-wise performance
-                    chapter_name = question.chapter.name if question.chapter else 'General'
-                    if chapter_name not in chapter_scores:
-                        chapter_scores[chapter_name] = {'correct': 0, 'total': 0}
-                    chapter_scores[chapter_name]['correct'] += 1
-                
-                # Always count total
-                chapter_name = question.chapter.name if question.chapter else 'General'
-                if chapter_name not in chapter_scores:
-                    chapter_scores[chapter_name] = {'correct': 0, 'total': 0}
-                chapter_scores[chapter_name]['total'] += 1
+        score = result['obtained_marks']
+        chapter_scores = result['chapter_performance']
         
         self.score = score
         self.percentage = round((score / self.total_marks) * 100, 2) if self.total_marks > 0 else 0
         self.set_chapter_wise_performance(chapter_scores)
         
-        # Determine qualification status (simplified logic)
-        if self.percentage >= 40:  # UGC NET qualification threshold
-            self.qualification_status = 'qualified'
-        elif self.percentage >= 35:
-            self.qualification_status = 'borderline'
-        else:
-            self.qualification_status = 'not_qualified'
+        # Same thresholds as the submit and re-scoring paths
+        from app.services.scoring_engine import get_qualification_status
+        self.qualification_status = get_qualification_status(self.percentage)
         
         db.session.commit()
         return score
@@ -554,6 +579,12 @@ class UGCNetMockAttempt(db.Model):
 class UGCNetPracticeAttempt(db.Model):
     """UGC NET Practice Test Attempts for focused chapter-wise practice"""
     __tablename__ = 'ugc_net_practice_attempts'
+    __table_args__ = (
+        # Expiry sweeps and in-progress lookups
+        db.Index('ix_ugc_net_practice_attempts_status_start_time', 'status', 'start_time'),
+        # Attempt history pages
+        db.Index('ix_ugc_net_practice_attempts_user_completed', 'user_id', 'is_completed', 'completed_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -590,6 +621,8 @@ class UGCNetPracticeAttempt(db.Model):
     
     # Data storage
     questions_data = db.Column(db.Text)  # JSON array of question IDs used
+    paper_seed = db.Column(db.BigInteger)  # Seed the test was generated from
+    bank_version = db.Column(db.Integer)  # Question bank version the test was generated from
     answers_data = db.Column(db.Text)  # JSON object of user answers
     detailed_results = db.Column(db.Text)  # JSON with question-wise results
     
@@ -683,42 +716,28 @@ class UGCNetPracticeAttempt(db.Model):
         questions_data = self.get_questions_data()
         user_answers = self.get_answers_data()
         
-        correct_count = 0
-        total_marks = 0
-        chapter_performance = {}
-        detailed_results = []
+        # Score against the question bank in one query and a vectorized pass
+        from app.services.scoring_engine import ScoringEngine  # Import here to avoid circular import
+        result = ScoringEngine().score_practice_attempts([self])[0]
         
-        for question_data in questions_data:
-            question_id = question_data['id']
-            total_marks += question_data.get('marks', 1)
-            
-            # Check if answer is correct
-            is_correct = False
-            if str(question_id) in user_answers:
-                user_answer = user_answers[str(question_id)].upper()
-                correct_answer = question_data.get('correct_option', '').upper()
-                is_correct = user_answer == correct_answer
-                
-                if is_correct:
-                    correct_count += 1
-            
-            # Track chapter-wise performance
-            chapter_name = question_data.get('chapter_name', 'General')
-            if chapter_name not in chapter_performance:
-                chapter_performance[chapter_name] = {'correct': 0, 'total': 0}
-            
-            chapter_performance[chapter_name]['total'] += 1
-            if is_correct:
-                chapter_performance[chapter_name]['correct'] += 1
-            
-            # Store detailed result
+        correct_count = result['correct_answers']
+        total_marks = result['total_marks']
+        chapter_performance = result['chapter_performance']
+        
+        # Store detailed result
+        questions_by_id = {question_data['id']: question_data for question_data in questions_data}
+        detailed_results = []
+        for question_id, is_correct, correct_answer in zip(
+            result['question_ids'], result['is_correct'], result['correct_options']
+        ):
+            question_data = questions_by_id.get(question_id, {})
             detailed_results.append({
                 'question_id': question_id,
                 'is_correct': is_correct,
                 'user_answer': user_answers.get(str(question_id), ''),
-                'correct_answer': question_data.get('correct_option', ''),
+                'correct_answer': correct_answer,
                 'marks': question_data.get('marks', 1),
-                'chapter': chapter_name,
+                'chapter': question_data.get('chapter_name', 'General'),
                 'difficulty': question_data.get('difficulty', 'medium')
             })
         
@@ -806,6 +825,151 @@ class UGCNetPracticeAttempt(db.Model):
         
         return result
 
+class AttemptQuestionIndex(db.Model):
+    """Inverted index from question ID to the mock and practice attempts that served it"""
+    __tablename__ = 'attempt_question_index'
+    __table_args__ = (
+        db.UniqueConstraint('attempt_type', 'attempt_id', 'question_id', name='uq_attempt_question_index'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, nullable=False, index=True)
+    attempt_type = db.Column(db.String(20), nullable=False)  # 'mock', 'practice'
+    attempt_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=current_ist_timestamp)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'question_id': self.question_id,
+            'attempt_type': self.attempt_type,
+            'attempt_id': self.attempt_id,
+            'user_id': self.user_id,
+            'created_at': get_ist_isoformat(self.created_at)
+        }
+
+class AttemptResponse(db.Model):
+    """One row per question answered in a submitted mock or practice attempt, for SQL-side analytics"""
+    __tablename__ = 'attempt_responses'
+    __table_args__ = (
+        db.UniqueConstraint('attempt_type', 'attempt_id', 'question_id', name='uq_attempt_response'),
+        db.Index('ix_attempt_responses_user_created', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    attempt_type = db.Column(db.String(20), nullable=False)  # 'mock', 'practice'
+    attempt_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('question_bank.id'), nullable=False, index=True)
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), index=True)
+    chosen_option = db.Column(db.String(1))  # A, B, C, D or NULL when unanswered
+    is_correct = db.Column(db.Boolean, nullable=False, default=False)
+    time_spent = db.Column(db.Integer)  # in seconds, when the client reports it
+    marks = db.Column(db.Float, nullable=False, default=0.0)  # Marks of the question
+    marks_awarded = db.Column(db.Float, nullable=False, default=0.0)
+    created_at = db.Column(db.DateTime, default=current_ist_timestamp, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'attempt_type': self.attempt_type,
+            'attempt_id': self.attempt_id,
+            'user_id': self.user_id,
+            'question_id': self.question_id,
+            'chapter_id': self.chapter_id,
+            'chosen_option': self.chosen_option,
+            'is_correct': self.is_correct,
+            'time_spent': self.time_spent,
+            'marks': self.marks,
+            'marks_awarded': self.marks_awarded,
+            'created_at': get_ist_isoformat(self.created_at)
+        }
+
+class DailyAttemptRollup(db.Model):
+    """Completed attempts per day, subject and attempt type, kept as additive sums for trend charts"""
+    __tablename__ = 'daily_attempt_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'subject_id', 'attempt_type', name='uq_daily_attempt_rollup'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # IST day of completed_at
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    attempt_type = db.Column(db.String(20), nullable=False)  # 'mock', 'practice'
+    
+    # Sums rather than averages so rows can be updated and combined in any range
+    attempt_count = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    percentage_sq_sum = db.Column(db.Float, nullable=False, default=0.0)
+    borderline_count = db.Column(db.Integer, nullable=False, default=0)  # Attempts rated borderline or qualified
+    qualifying_count = db.Column(db.Integer, nullable=False, default=0)  # Attempts rated qualified
+    timed_count = db.Column(db.Integer, nullable=False, default=0)  # Attempts with a known time taken
+    time_sum = db.Column(db.Float, nullable=False, default=0.0)  # in seconds
+    time_sq_sum = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=current_ist_timestamp, onupdate=current_ist_timestamp)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'subject_id': self.subject_id,
+            'attempt_type': self.attempt_type,
+            'attempt_count': self.attempt_count,
+            'percentage_sum': self.percentage_sum,
+            'percentage_sq_sum': self.percentage_sq_sum,
+            'borderline_count': self.borderline_count,
+            'qualifying_count': self.qualifying_count,
+            'timed_count': self.timed_count,
+            'time_sum': self.time_sum,
+            'time_sq_sum': self.time_sq_sum
+        }
+
+class SubjectUserActivity(db.Model):
+    """Completed attempts of a user in a subject, for distinct active user counts over any window"""
+    __tablename__ = 'subject_user_activity'
+    __table_args__ = (
+        db.UniqueConstraint('subject_id', 'user_id', name='uq_subject_user_activity'),
+        db.Index('ix_subject_user_activity_subject_last', 'subject_id', 'last_completed_at'),
+        db.Index('ix_subject_user_activity_last_user', 'last_completed_at', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    attempt_count = db.Column(db.Integer, nullable=False, default=0)
+    first_completed_at = db.Column(db.DateTime)  # naive UTC
+    last_completed_at = db.Column(db.DateTime)  # naive UTC
+    
+    def to_dict(self):
+        return {
+            'subject_id': self.subject_id,
+            'user_id': self.user_id,
+            'attempt_count': self.attempt_count,
+            'first_completed_at': get_ist_isoformat(self.first_completed_at),
+            'last_completed_at': get_ist_isoformat(self.last_completed_at)
+        }
+
+class UserDashboard(db.Model):
+    """Per-user dashboard read model folded from completed attempts, see UserDashboardService"""
+    __tablename__ = 'user_dashboards'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    document = db.Column(db.Text, nullable=False)  # JSON state of the dashboard statistics
+    updated_at = db.Column(db.DateTime, default=current_ist_timestamp, onupdate=current_ist_timestamp)
+    
+    def get_document(self):
+        return json.loads(self.document) if self.document else None
+    
+    def set_document(self, document):
+        self.document = json.dumps(document)
+
+class QuestionStatsFlush(db.Model):
+    """Batches of Redis question statistics deltas already applied to question_bank, see QuestionStatsService"""
+    __tablename__ = 'question_stats_flushes'
+    
+    flush_id = db.Column(db.String(32), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=current_ist_timestamp, index=True)
+
 class UserStudySession(db.Model):
     """Track detailed user study sessions for AI analysis"""
     __tablename__ = 'user_study_sessions'
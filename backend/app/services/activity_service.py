@@ -0,0 +1,325 @@
+"""
+Activity Service
+Per-day Redis bitmaps of the non-admin users who started or completed an
+attempt, and of those who signed up, bit N standing for user ID N. IST days,
+like the rest of the app. Active users over a window are the popcount of the
+OR of its days and N-day and weekly cohort retention the popcount of signup
+AND activity bitmaps, a few Redis round trips whatever the number of users.
+Bitmaps are rebuilt from the attempts by rebuild_activity_bitmaps, until then
+readers get None and fall back to the database
+"""
+
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import union
+
+from app import db, redis_client
+from app.models import UGCNetMockAttempt, UGCNetPracticeAttempt, User
+from app.utils.time_buckets import bucket_expression
+from app.utils.timezone_utils import ist_to_utc, utc_to_ist
+
+KEY_PREFIX = 'activity'
+# Days of bitmaps kept, a day of a million users is 125 KB
+RETENTION_DAYS = 400
+RETENTION_OFFSETS = (1, 7, 30)
+
+
+def ist_day(at: Optional[datetime] = None) -> date:
+    """IST day of a naive UTC time, today by default"""
+    return utc_to_ist(at or datetime.utcnow()).date()
+
+
+class ActivityService:
+    """Service for the daily activity and signup bitmaps behind DAU/WAU/MAU and retention"""
+    
+    @staticmethod
+    def get_active_key(day: date) -> str:
+        return f'{KEY_PREFIX}:active:{day.isoformat()}'
+    
+    @staticmethod
+    def get_signup_key(day: date) -> str:
+        return f'{KEY_PREFIX}:signup:{day.isoformat()}'
+    
+    @staticmethod
+    def get_built_key() -> str:
+        """Set once every bitmap of the retention window has been built, a Redis flush removes it"""
+        return f'{KEY_PREFIX}:built'
+    
+    @staticmethod
+    def _expire_at(day: date) -> int:
+        expires = datetime.combine(day + timedelta(days=RETENTION_DAYS), datetime.min.time())
+        return int(expires.replace(tzinfo=timezone.utc).timestamp())
+    
+    @staticmethod
+    def _days(start_day: date, end_day: date) -> List[date]:
+        return [start_day + timedelta(days=offset) for offset in range((end_day - start_day).days + 1)]
+    
+    @staticmethod
+    def _temp_key() -> str:
+        return f'{KEY_PREFIX}:tmp:{uuid.uuid4().hex}'
+    
+    # Updates
+    
+    def _set_bits(self, key: str, day: date, user_ids: Iterable[int]):
+        try:
+            if redis_client:
+                pipeline = redis_client.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipeline.setbit(key, user_id, 1)
+                pipeline.expireat(key, self._expire_at(day))
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+    
+    def record(self, users: Iterable[User], at: Optional[datetime] = None):
+        """Mark users active on the IST day of a naive UTC time (now by default), admins are skipped"""
+        user_ids = [user.id for user in users if user and not user.is_admin]
+        if user_ids:
+            day = ist_day(at)
+            self._set_bits(self.get_active_key(day), day, user_ids)
+    
+    def record_signup(self, user: User):
+        """Add a newly created user to the signup cohort of their creation day"""
+        if user and not user.is_admin:
+            day = ist_day(user.created_at)
+            self._set_bits(self.get_signup_key(day), day, [user.id])
+    
+    def rebuild(self, start_day: Optional[date] = None, end_day: Optional[date] = None) -> int:
+        """
+        Rebuild the bitmaps of an IST day range (the whole retention window by default)
+        from the attempts and users, returns the number of days rebuilt
+        
+        Each day is written to a staging key and renamed over the live one, so
+        readers never see a half built day.
+        """
+        end_day = end_day or ist_day()
+        full = start_day is None
+        start_day = start_day or end_day - timedelta(days=RETENTION_DAYS - 1)
+        days = self._days(start_day, end_day)
+        
+        # Practice completion times are stored in IST, every other time here in UTC
+        start_utc = ist_to_utc(datetime.combine(start_day, datetime.min.time()))
+        end_utc = ist_to_utc(datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+        start_ist = datetime.combine(start_day, datetime.min.time())
+        end_ist = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+        
+        def activity(column, in_utc: bool):
+            day = bucket_expression(column, 'day', stored_in_ist=not in_utc)
+            start, end = (start_utc, end_utc) if in_utc else (start_ist, end_ist)
+            return db.session.query(day.label('day'), column.class_.user_id.label('user_id')).join(
+                User, User.id == column.class_.user_id
+            ).filter(User.is_admin == False, column >= start, column < end)
+        
+        active = union(
+            activity(UGCNetMockAttempt.start_time, True),
+            activity(UGCNetMockAttempt.completed_at, True),
+            activity(UGCNetPracticeAttempt.created_at, True),
+            activity(UGCNetPracticeAttempt.start_time, True),
+            activity(UGCNetPracticeAttempt.completed_at, False)
+        ).subquery()
+        signups = db.session.query(bucket_expression(User.created_at, 'day'), User.id).filter(
+            User.is_admin == False, User.created_at >= start_utc, User.created_at < end_utc
+        )
+        
+        try:
+            if not redis_client:
+                return 0
+            for key_for, rows in (
+                (self.get_active_key, db.session.query(active.c.day, active.c.user_id)),
+                (self.get_signup_key, signups)
+            ):
+                staging = {day: f'{key_for(day)}:rebuild' for day in days}
+                pipeline = redis_client.pipeline(transaction=False)
+                pipeline.delete(*staging.values())
+                for count, (day, user_id) in enumerate(rows.yield_per(10000), 1):
+                    pipeline.setbit(staging[date.fromisoformat(day)], user_id, 1)
+                    if count % 10000 == 0:
+                        pipeline.execute()
+                pipeline.execute()
+                
+                pipeline = redis_client.pipeline()
+                for day in days:
+                    pipeline.exists(staging[day])
+                built = pipeline.execute()
+                pipeline = redis_client.pipeline()
+                for day, exists in zip(days, built):
+                    if exists:
+                        pipeline.rename(staging[day], key_for(day))
+                        pipeline.expireat(key_for(day), self._expire_at(day))
+                    else:
+                        pipeline.delete(key_for(day))
+                pipeline.execute()
+            
+            if full:
+                redis_client.set(self.get_built_key(), datetime.utcnow().isoformat())
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+            return 0
+        return len(days)
+    
+    # Queries
+    
+    def is_built(self) -> bool:
+        try:
+            return bool(redis_client and redis_client.exists(self.get_built_key()))
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+            return False
+    
+    def _window_keys(self, end_day: date, days: int) -> List[str]:
+        return [self.get_active_key(end_day - timedelta(days=offset)) for offset in range(days)]
+    
+    def count_active(self, start_day: date, end_day: date) -> Optional[int]:
+        """Distinct users active in an IST day range, None when the bitmaps are unavailable"""
+        if not self.is_built():
+            return None
+        try:
+            temp_key = self._temp_key()
+            pipeline = redis_client.pipeline()
+            pipeline.bitop('OR', temp_key, *[self.get_active_key(day) for day in self._days(start_day, end_day)])
+            pipeline.bitcount(temp_key)
+            pipeline.delete(temp_key)
+            return pipeline.execute()[1]
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+            return None
+    
+    def get_active_users(self, day: Optional[date] = None) -> Optional[Dict]:
+        """DAU, WAU and MAU as of an IST day (today by default), None when the bitmaps are unavailable"""
+        if not self.is_built():
+            return None
+        day = day or ist_day()
+        try:
+            temp_keys = {window: self._temp_key() for window in (7, 30)}
+            pipeline = redis_client.pipeline()
+            pipeline.bitcount(self.get_active_key(day))
+            for window, temp_key in temp_keys.items():
+                pipeline.bitop('OR', temp_key, *self._window_keys(day, window))
+                pipeline.bitcount(temp_key)
+            pipeline.delete(*temp_keys.values())
+            dau, _, wau, _, mau, _ = pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+            return None
+        return {
+            'day': day.isoformat(),
+            'dau': dau,
+            'wau': wau,
+            'mau': mau,
+            # Share of the month's users who come back on a given day
+            'stickiness': round(dau / mau * 100, 1) if mau else 0
+        }
+    
+    def get_daily_active(self, start_day: date, end_day: date) -> Optional[List[Dict]]:
+        """Active users of every IST day in a range"""
+        if not self.is_built():
+            return None
+        days = self._days(start_day, end_day)
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for day in days:
+                pipeline.bitcount(self.get_active_key(day))
+            counts = pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+            return None
+        return [{'day': day.isoformat(), 'active_users': count} for day, count in zip(days, counts)]
+    
+    def get_retention(self, offsets: Iterable[int] = RETENTION_OFFSETS, cohort_days: int = 30,
+                      day: Optional[date] = None) -> Optional[Dict]:
+        """
+        N-day retention of the daily signup cohorts of the last cohort_days days:
+        the share of users active N days after signing up, over the cohorts old
+        enough to tell
+        """
+        if not self.is_built():
+            return None
+        day = day or ist_day()
+        offsets = sorted(set(offsets))
+        cohorts = self._days(day - timedelta(days=cohort_days + max(offsets)), day)
+        try:
+            pipeline = redis_client.pipeline()
+            for cohort_day in cohorts:
+                pipeline.bitcount(self.get_signup_key(cohort_day))
+            pairs = [
+                (cohort_day, offset) for offset in offsets for cohort_day in cohorts
+                if cohort_day + timedelta(days=offset) <= day
+            ]
+            temp_key = self._temp_key()
+            for cohort_day, offset in pairs:
+                pipeline.bitop('AND', temp_key, self.get_signup_key(cohort_day),
+                               self.get_active_key(cohort_day + timedelta(days=offset)))
+                pipeline.bitcount(temp_key)
+            pipeline.delete(temp_key)
+            results = pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+            return None
+        
+        sizes = dict(zip(cohorts, results[:len(cohorts)]))
+        retained = results[len(cohorts):-1][1::2]
+        retention = {}
+        for offset in offsets:
+            counts = [
+                (sizes[cohort_day], count) for (cohort_day, pair_offset), count in zip(pairs, retained)
+                if pair_offset == offset
+            ][-cohort_days:]
+            users = sum(size for size, _ in counts)
+            retention[f'day_{offset}'] = {
+                'cohort_users': users,
+                'retained_users': sum(count for _, count in counts),
+                'rate': round(sum(count for _, count in counts) / users * 100, 1) if users else 0
+            }
+        return retention
+    
+    def get_cohort_matrix(self, weeks: int = 8, day: Optional[date] = None) -> Optional[List[Dict]]:
+        """
+        Weekly signup cohorts of the last weeks weeks (Monday to Sunday, IST) and
+        how many of them were active in each following week, oldest cohort first
+        """
+        if not self.is_built():
+            return None
+        day = day or ist_day()
+        this_week = day - timedelta(days=day.weekday())
+        week_starts = [this_week - timedelta(weeks=offset) for offset in range(weeks - 1, -1, -1)]
+        
+        def week_days(week_start: date) -> List[date]:
+            return self._days(week_start, min(week_start + timedelta(days=6), day))
+        
+        try:
+            pipeline = redis_client.pipeline()
+            cohort_keys = {week: self._temp_key() for week in week_starts}
+            active_keys = {week: self._temp_key() for week in week_starts}
+            for week in week_starts:
+                pipeline.bitop('OR', cohort_keys[week], *[self.get_signup_key(d) for d in week_days(week)])
+                pipeline.bitop('OR', active_keys[week], *[self.get_active_key(d) for d in week_days(week)])
+            for week in week_starts:
+                pipeline.bitcount(cohort_keys[week])
+            cells = [(cohort, week) for cohort in week_starts for week in week_starts if week >= cohort]
+            temp_key = self._temp_key()
+            for cohort, week in cells:
+                pipeline.bitop('AND', temp_key, cohort_keys[cohort], active_keys[week])
+                pipeline.bitcount(temp_key)
+            pipeline.delete(temp_key, *cohort_keys.values(), *active_keys.values())
+            results = pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis activity error: {redis_error}")
+            return None
+        
+        results = results[2 * weeks:-1]
+        sizes = dict(zip(week_starts, results[:weeks]))
+        retained = dict(zip(cells, results[weeks:][1::2]))
+        return [
+            {
+                'week_start': cohort.isoformat(),
+                'users': sizes[cohort],
+                'active': [retained[(cohort, week)] for week in week_starts if week >= cohort],
+                'rates': [
+                    round(retained[(cohort, week)] / sizes[cohort] * 100, 1) if sizes[cohort] else 0
+                    for week in week_starts if week >= cohort
+                ]
+            }
+            for cohort in week_starts
+        ]
@@ -4,27 +4,42 @@ Handles dashboard analytics and statistics
 """
 from datetime import datetime, timedelta
 from sqlalchemy import desc
-from app import db, redis_client
+from app import db
 from app.models import User, Subject, Chapter, QuestionBank, UGCNetMockTest, UGCNetMockAttempt, UGCNetPracticeAttempt
-import json
+from app.services.activity_service import ActivityService, ist_day
+from app.services.attempt_rollup_service import AttemptRollupService
+from app.services.memoize import memoize
+from app.services import domain_events
+
+TIME_FILTERS = ('24h', '7d', '30d', '90d')
+
+# Every change the dashboard reports on invalidates it, the timeout only bounds drift of the time windows
+DASHBOARD_CACHE_TIMEOUT = 3600  # 1 hour
+DASHBOARD_EVENTS = (
+    domain_events.ATTEMPT_COMPLETED, domain_events.ATTEMPT_RESCORED, domain_events.ATTEMPT_DELETED,
+    domain_events.QUESTION_CHANGED, domain_events.SUBJECT_CHANGED, domain_events.USER_CHANGED
+)
 
 
 class AdminDashboardService:
     """Service for admin dashboard operations"""
     
     def __init__(self):
-        self.cache_timeout = 300  # 5 minutes
+        self.rollups = AttemptRollupService()
+        self.activity = ActivityService()
     
     def get_basic_stats(self):
         """Get basic system statistics"""
         try:
+            # Attempt counts come from the daily rollups rather than counting attempts
+            totals = self.rollups.get_totals('attempt_type')
             return {
                 'total_users': User.query.filter_by(is_admin=False).count(),
                 'total_subjects': Subject.query.filter_by(is_active=True).count(),
                 'total_questions': QuestionBank.query.count(),
                 'total_mock_tests': UGCNetMockTest.query.filter_by(is_active=True).count(),
-                'total_mock_attempts': UGCNetMockAttempt.query.filter_by(is_completed=True).count(),
-                'total_practice_attempts': UGCNetPracticeAttempt.query.filter_by(is_completed=True).count()
+                'total_mock_attempts': totals.get('mock', {}).get('attempt_count') or 0,
+                'total_practice_attempts': totals.get('practice', {}).get('attempt_count') or 0
             }
         except Exception as e:
             print(f"Error getting basic stats: {e}")
@@ -57,20 +72,13 @@ class AdminDashboardService:
                 User.last_login >= start_date
             ).count()
             
-            recent_mock_attempts = UGCNetMockAttempt.query.filter(
-                UGCNetMockAttempt.is_completed == True,
-                UGCNetMockAttempt.completed_at >= start_date
-            ).count()
-            
-            recent_practice_attempts = UGCNetPracticeAttempt.query.filter(
-                UGCNetPracticeAttempt.is_completed == True,
-                UGCNetPracticeAttempt.completed_at >= start_date
-            ).count()
+            # Rollups are per day, so a window counts whole days from the day it starts
+            totals = self.rollups.get_totals('attempt_type', ist_day(start_date))
             
             return {
                 'active_users': active_users,
-                'recent_mock_attempts': recent_mock_attempts,
-                'recent_practice_attempts': recent_practice_attempts,
+                'recent_mock_attempts': totals.get('mock', {}).get('attempt_count') or 0,
+                'recent_practice_attempts': totals.get('practice', {}).get('attempt_count') or 0,
                 'start_date': start_date
             }
         except Exception as e:
@@ -85,41 +93,16 @@ class AdminDashboardService:
     def get_performance_stats(self, start_date):
         """Calculate performance statistics"""
         try:
-            # Mock test performance
-            completed_mock_attempts = UGCNetMockAttempt.query.filter(
-                UGCNetMockAttempt.is_completed == True,
-                UGCNetMockAttempt.completed_at >= start_date
-            ).all()
-            
-            average_mock_score = 0
-            mock_pass_rate = 0
-            
-            if completed_mock_attempts:
-                scores = [attempt.percentage for attempt in completed_mock_attempts if attempt.percentage is not None]
-                if scores:
-                    average_mock_score = round(sum(scores) / len(scores), 1)
-                    mock_pass_rate = round((len([s for s in scores if s >= 40]) / len(scores)) * 100, 1)
-            
-            # Practice test performance
-            completed_practice_attempts = UGCNetPracticeAttempt.query.filter(
-                UGCNetPracticeAttempt.is_completed == True,
-                UGCNetPracticeAttempt.completed_at >= start_date
-            ).all()
-            
-            average_practice_score = 0
-            practice_pass_rate = 0
-            
-            if completed_practice_attempts:
-                scores = [attempt.percentage for attempt in completed_practice_attempts if attempt.percentage is not None]
-                if scores:
-                    average_practice_score = round(sum(scores) / len(scores), 1)
-                    practice_pass_rate = round((len([s for s in scores if s >= 60]) / len(scores)) * 100, 1)
+            totals = self.rollups.get_totals('attempt_type', ist_day(start_date))
+            mock = self.rollups.describe(totals.get('mock'))
+            practice = self.rollups.describe(totals.get('practice'))
             
+            # Mock attempts pass at the borderline cut-off, practice attempts at the qualifying one
             return {
-                'average_mock_score': average_mock_score,
-                'average_practice_score': average_practice_score,
-                'mock_pass_rate': mock_pass_rate,
-                'practice_pass_rate': practice_pass_rate
+                'average_mock_score': mock['average_score'],
+                'average_practice_score': practice['average_score'],
+                'mock_pass_rate': mock['borderline_rate'],
+                'practice_pass_rate': practice['qualifying_rate']
             }
         except Exception as e:
             print(f"Error calculating performance: {e}")
@@ -134,41 +117,21 @@ class AdminDashboardService:
         """Get statistics by subject"""
         subject_stats = []
         try:
-            subjects = Subject.query.filter_by(is_active=True).all()
+            totals = self.rollups.get_totals('subject_id', ist_day(start_date))
+            active_users = self.rollups.count_active_users(start_date, group_by_subject=True)
             
-            for subject in subjects:
-                try:
-                    # Get attempts for this subject via mock tests
-                    subject_mock_attempts = db.session.query(UGCNetMockAttempt).join(UGCNetMockTest).filter(
-                        UGCNetMockTest.subject_id == subject.id,
-                        UGCNetMockAttempt.is_completed == True,
-                        UGCNetMockAttempt.completed_at >= start_date
-                    ).all()
-                    
-                    # Get practice attempts for this subject
-                    subject_practice_attempts = UGCNetPracticeAttempt.query.filter(
-                        UGCNetPracticeAttempt.subject_id == subject.id,
-                        UGCNetPracticeAttempt.is_completed == True,
-                        UGCNetPracticeAttempt.completed_at >= start_date
-                    ).all()
-                    
-                    total_subject_attempts = len(subject_mock_attempts) + len(subject_practice_attempts)
-                    
-                    if total_subject_attempts > 0:
-                        all_scores = []
-                        all_scores.extend([attempt.percentage for attempt in subject_mock_attempts if attempt.percentage is not None])
-                        all_scores.extend([attempt.percentage for attempt in subject_practice_attempts if attempt.percentage is not None])
-                        
-                        if all_scores:
-                            avg_score = round(sum(all_scores) / len(all_scores), 1)
-                            subject_stats.append({
-                                'name': subject.name,
-                                'attempts': total_subject_attempts,
-                                'average_score': avg_score
-                            })
-                except Exception as e:
-                    print(f"Error processing subject {subject.name}: {e}")
-                    continue
+            for subject in Subject.query.filter_by(is_active=True).all():
+                summary = self.rollups.describe(totals.get(subject.id))
+                if summary['attempts'] > 0:
+                    subject_stats.append({
+                        'name': subject.name,
+                        'attempts': summary['attempts'],
+                        'average_score': summary['average_score'],
+                        'score_stddev': summary['score_stddev'],
+                        'borderline_rate': summary['borderline_rate'],
+                        'qualifying_rate': summary['qualifying_rate'],
+                        'active_users': active_users.get(subject.id, 0)
+                    })
         except Exception as e:
             print(f"Error getting subject stats: {e}")
         
@@ -236,63 +199,46 @@ class AdminDashboardService:
     
     def get_daily_trends(self, days=7):
         """Get daily trends for the last N days"""
-        daily_trends = []
+        today = ist_day()
+        start_day = today - timedelta(days=days-1)
         try:
-            for i in range(days-1, -1, -1):  # Last N days
-                date = datetime.utcnow().date() - timedelta(days=i)
-                next_date = date + timedelta(days=1)
-                
-                # Count mock attempts for this day
-                day_mock_attempts = UGCNetMockAttempt.query.filter(
-                    UGCNetMockAttempt.completed_at >= date,
-                    UGCNetMockAttempt.completed_at < next_date,
-                    UGCNetMockAttempt.is_completed == True
-                ).count()
-                
-                # Count practice attempts for this day
-                day_practice_attempts = UGCNetPracticeAttempt.query.filter(
-                    UGCNetPracticeAttempt.completed_at >= date,
-                    UGCNetPracticeAttempt.completed_at < next_date,
-                    UGCNetPracticeAttempt.is_completed == True
-                ).count()
-                
-                total_day_attempts = day_mock_attempts + day_practice_attempts
-                
-                # Calculate average score for this day
-                day_mock_scores = [attempt.percentage for attempt in UGCNetMockAttempt.query.filter(
-                    UGCNetMockAttempt.completed_at >= date,
-                    UGCNetMockAttempt.completed_at < next_date,
-                    UGCNetMockAttempt.is_completed == True,
-                    UGCNetMockAttempt.percentage != None
-                ).all()]
-                
-                day_practice_scores = [attempt.percentage for attempt in UGCNetPracticeAttempt.query.filter(
-                    UGCNetPracticeAttempt.completed_at >= date,
-                    UGCNetPracticeAttempt.completed_at < next_date,
-                    UGCNetPracticeAttempt.is_completed == True,
-                    UGCNetPracticeAttempt.percentage != None
-                ).all()]
-                
-                all_day_scores = day_mock_scores + day_practice_scores
-                day_avg_score = round(sum(all_day_scores) / len(all_day_scores), 1) if all_day_scores else 0
-                
-                daily_trends.append({
-                    'date': date.strftime('%b %d'),
-                    'attempts': total_day_attempts,
-                    'average_score': day_avg_score
-                })
+            trends = self.rollups.get_daily_trends(start_day, today)
+            return [
+                {
+                    'date': datetime.strptime(day['date'], '%Y-%m-%d').strftime('%b %d'),
+                    'attempts': day['attempts'],
+                    'average_score': day['average_score']
+                }
+                for day in trends
+            ]
         except Exception as e:
             print(f"Error calculating daily trends: {e}")
             # Provide fallback data
-            for i in range(days-1, -1, -1):
-                date = datetime.utcnow().date() - timedelta(days=i)
-                daily_trends.append({
-                    'date': date.strftime('%b %d'),
+            return [
+                {
+                    'date': (start_day + timedelta(days=i)).strftime('%b %d'),
                     'attempts': 0,
                     'average_score': 0
-                })
+                }
+                for i in range(days)
+            ]
+    
+    def get_trends(self, start_day, end_day, subject_id=None, attempt_type=None):
+        """Get per-day attempt, score and time trends for any date range from the daily rollups"""
+        if end_day < start_day:
+            raise ValueError('end must not be before start')
+        if (end_day - start_day).days >= 366:
+            raise ValueError('Trend ranges are limited to one year')
+        if attempt_type not in (None, 'mock', 'practice'):
+            raise ValueError("attempt_type must be 'mock' or 'practice'")
         
-        return daily_trends
+        return {
+            'start': start_day.isoformat(),
+            'end': end_day.isoformat(),
+            'subject_id': subject_id,
+            'attempt_type': attempt_type,
+            'days': self.rollups.get_daily_trends(start_day, end_day, subject_id, attempt_type)
+        }
     
     def calculate_retention_rate(self):
         """Calculate user retention rate"""
@@ -302,19 +248,12 @@ class AdminDashboardService:
             # Total users
             total_users = User.query.filter_by(is_admin=False).count()
             
-            # Users who have made attempts in the last 30 days
-            active_users_30_days = db.session.query(User).join(
-                db.or_(
-                    User.id == UGCNetMockAttempt.user_id,
-                    User.id == UGCNetPracticeAttempt.user_id
-                )
-            ).filter(
-                db.or_(
-                    UGCNetMockAttempt.started_at >= thirty_days_ago,
-                    UGCNetPracticeAttempt.started_at >= thirty_days_ago
-                ),
-                User.is_admin == False
-            ).distinct().count()
+            # Users active in the last 30 days, from the activity bitmaps or else
+            # the users who completed an attempt since
+            today = ist_day()
+            active_users_30_days = self.activity.count_active(today - timedelta(days=29), today)
+            if active_users_30_days is None:
+                active_users_30_days = self.rollups.count_active_users(thirty_days_ago)
             
             if total_users > 0:
                 return round((active_users_30_days / total_users) * 100, 1)
@@ -324,20 +263,35 @@ class AdminDashboardService:
             print(f"Error calculating retention rate: {e}")
             return 0
     
+    def get_activity_stats(self):
+        """DAU/WAU/MAU and N-day retention from the activity bitmaps, None until they are built"""
+        active_users = self.activity.get_active_users()
+        if active_users is None:
+            return None
+        return {**active_users, 'retention': self.activity.get_retention()}
+    
+    def get_activity_report(self, days=30, weeks=8):
+        """Daily active users of the last N days and the weekly signup cohort matrix, None until the bitmaps are built"""
+        active_users = self.activity.get_active_users()
+        if active_users is None:
+            return None
+        today = ist_day()
+        return {
+            **active_users,
+            'daily': self.activity.get_daily_active(today - timedelta(days=days - 1), today),
+            'retention': self.activity.get_retention(),
+            'cohorts': self.activity.get_cohort_matrix(weeks)
+        }
+    
     def get_comprehensive_dashboard_stats(self, time_filter='7d'):
         """Get all dashboard statistics in one call"""
-        cache_key = f'admin_dashboard_stats_{time_filter}'
-        
-        # Try to get from cache
-        try:
-            if redis_client:
-                cached_stats = redis_client.get(cache_key)
-                if cached_stats:
-                    return json.loads(cached_stats)
-        except Exception as redis_error:
-            print(f"Redis cache error: {redis_error}")
-        
-        # Generate fresh data
+        if time_filter not in TIME_FILTERS:
+            time_filter = '7d'
+        return self._build_dashboard_stats(time_filter)
+    
+    @memoize(ttl=DASHBOARD_CACHE_TIMEOUT, key='admin_dashboard_stats:{time_filter}', invalidate_on=DASHBOARD_EVENTS)
+    def _build_dashboard_stats(self, time_filter):
+        """Dashboard statistics for a valid time filter, cached until an event changes them"""
         basic_stats = self.get_basic_stats()
         time_stats = self.get_time_filtered_stats(time_filter)
         performance_stats = self.get_performance_stats(time_stats['start_date'])
@@ -345,6 +299,7 @@ class AdminDashboardService:
         top_performers = self.get_top_performers()
         daily_trends = self.get_daily_trends()
         retention_rate = self.calculate_retention_rate()
+        activity = self.get_activity_stats()
         
         # User management specific stats
         user_management_stats = {
@@ -379,6 +334,7 @@ class AdminDashboardService:
             'average_score': combined_average_score,
             'pass_rate': combined_pass_rate,
             'retention_rate': retention_rate,
+            'activity': activity,
             **user_management_stats,
             'subjects': subject_stats,
             'top_performers': top_performers,
@@ -412,11 +368,4 @@ class AdminDashboardService:
             'user_management': user_management_stats
         }
         
-        # Cache for 5 minutes
-        try:
-            if redis_client:
-                redis_client.setex(cache_key, self.cache_timeout, json.dumps(stats, default=str))
-        except Exception as redis_error:
-            print(f"Redis cache set error: {redis_error}")
-        
         return stats
@@ -0,0 +1,223 @@
+"""
+Answer Buffer Service
+Write-behind buffer for practice test auto-saves: answer changes are merged into
+a Redis hash per attempt and folded into answers_data in batches, instead of the
+whole JSON column being rewritten and committed on every auto-save
+
+Durability:
+- An auto-save is acknowledged once the change is in Redis. It reaches the
+  database when the attempt is submitted, or when the periodic flush picks up an
+  attempt whose oldest unflushed change is ANSWER_BUFFER_FLUSH_AGE seconds old.
+- Until then answers_data lags behind the buffer. Reads that need the latest
+  answers go through get_answers, which overlays the buffer on the stored JSON.
+- Buffered changes not yet flushed are lost if Redis loses them (a restart
+  without persistence or a memory eviction), so at most the last flush age of
+  auto-saves. Submitted answers are unaffected: the client sends the full set on
+  submit and the buffer is only a fallback there.
+- A flush that dies between taking a buffer and committing leaves the taken
+  hash behind. It is merged by reads and retried by the next flush of that
+  attempt. Every buffer key expires after a day as a last resort.
+- Without Redis, or with ANSWER_BUFFER_ENABLED off, changes are written
+  through to answers_data like before.
+"""
+
+import json
+import time
+from typing import Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from app import db, redis_client
+from app.models import UGCNetPracticeAttempt
+
+
+class AnswerBufferService:
+    """Service for buffered practice test auto-saves"""
+    
+    KEY_PREFIX = 'answer_buffer'
+    DIRTY_KEY = 'answer_buffer:dirty'
+    
+    # Hash field marking a full snapshot that replaces the stored answers
+    REPLACE_FIELD = '__replace__'
+    
+    def __init__(self, batch_size: int = 200):
+        self.batch_size = batch_size
+        self.enabled = current_app.config.get('ANSWER_BUFFER_ENABLED', True)
+        self.flush_age = current_app.config.get('ANSWER_BUFFER_FLUSH_AGE', 300)
+        self.buffer_ttl = 24 * 60 * 60
+    
+    def get_key(self, attempt_id: int) -> str:
+        return f'{self.KEY_PREFIX}:{attempt_id}'
+    
+    def get_flushing_key(self, attempt_id: int) -> str:
+        return f'{self.KEY_PREFIX}:flushing:{attempt_id}'
+    
+    def save(self, attempt: UGCNetPracticeAttempt, changes: Dict, replace: bool = False) -> bool:
+        """
+        Buffer answer changes of an attempt, returns whether they were buffered
+        
+        changes maps question IDs to answers, None clears an answer. With replace
+        the changes are a full snapshot of the answers. When the buffer is
+        unavailable the changes are applied to answers_data and the caller commits.
+        """
+        fields = {str(question_id): json.dumps(answer) for question_id, answer in changes.items()}
+        if replace:
+            fields[self.REPLACE_FIELD] = '1'
+        if not fields:
+            return True
+        
+        if self.enabled:
+            try:
+                if redis_client:
+                    key = self.get_key(attempt.id)
+                    pipeline = redis_client.pipeline()
+                    if replace:
+                        pipeline.delete(key)
+                    pipeline.hset(key, mapping=fields)
+                    pipeline.expire(key, self.buffer_ttl)
+                    # The score is when the oldest unflushed change was made
+                    pipeline.zadd(self.DIRTY_KEY, {attempt.id: time.time()}, nx=True)
+                    pipeline.execute()
+                    return True
+            except Exception as redis_error:
+                print(f"Redis answer buffer error: {redis_error}")
+        
+        attempt.set_answers_data(self.merge_answers(attempt.get_answers_data(), fields))
+        return False
+    
+    def get_answers(self, attempt: UGCNetPracticeAttempt) -> Dict:
+        """Latest answers of an attempt: the stored answers with any buffered changes applied"""
+        answers = attempt.get_answers_data()
+        if not self.enabled:
+            return answers
+        
+        try:
+            if redis_client:
+                pipeline = redis_client.pipeline(transaction=False)
+                pipeline.hgetall(self.get_flushing_key(attempt.id))
+                pipeline.hgetall(self.get_key(attempt.id))
+                for fields in pipeline.execute():
+                    if fields:
+                        answers = self.merge_answers(answers, self._decode(fields))
+        except Exception as redis_error:
+            print(f"Redis answer buffer error: {redis_error}")
+        
+        return answers
+    
+    def discard(self, attempt_id: int):
+        """Drop the buffer of a submitted attempt"""
+        if not self.enabled:
+            return
+        
+        try:
+            if redis_client:
+                pipeline = redis_client.pipeline()
+                pipeline.delete(self.get_key(attempt_id), self.get_flushing_key(attempt_id))
+                pipeline.zrem(self.DIRTY_KEY, attempt_id)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis answer buffer error: {redis_error}")
+    
+    def flush(self, max_age: Optional[int] = None) -> int:
+        """Write buffers with changes at least max_age seconds old to the database, returns the attempts written"""
+        if not redis_client:
+            return 0
+        
+        cutoff = time.time() - (self.flush_age if max_age is None else max_age)
+        flushed = 0
+        while True:
+            attempt_ids = [
+                int(attempt_id) for attempt_id in
+                redis_client.zrangebyscore(self.DIRTY_KEY, '-inf', cutoff, start=0, num=self.batch_size)
+            ]
+            if not attempt_ids:
+                break
+            flushed += self._flush_batch(attempt_ids)
+        return flushed
+    
+    def _flush_batch(self, attempt_ids: List[int]) -> int:
+        # Take the buffers out of the write path first; auto-saves made during the
+        # flush start a new buffer and mark the attempt dirty again. A buffer left
+        # behind by an interrupted flush is written before a new one is taken.
+        pipeline = redis_client.pipeline()
+        pipeline.zrem(self.DIRTY_KEY, *attempt_ids)
+        for attempt_id in attempt_ids:
+            pipeline.exists(self.get_flushing_key(attempt_id))
+        interrupted = pipeline.execute()[1:]
+        
+        pipeline = redis_client.pipeline()
+        for attempt_id, left_behind in zip(attempt_ids, interrupted):
+            if not left_behind:
+                pipeline.rename(self.get_key(attempt_id), self.get_flushing_key(attempt_id))
+        # Buffers discarded by a submit in the meantime no longer exist to rename
+        pipeline.execute(raise_on_error=False)
+        
+        pipeline = redis_client.pipeline(transaction=False)
+        for attempt_id in attempt_ids:
+            pipeline.hgetall(self.get_flushing_key(attempt_id))
+        buffers = {
+            attempt_id: self._decode(fields)
+            for attempt_id, fields in zip(attempt_ids, pipeline.execute()) if fields
+        }
+        
+        # Submitted attempts already store their final answers
+        rows = []
+        if buffers:
+            for attempt_id, answers_data in db.session.query(
+                UGCNetPracticeAttempt.id, UGCNetPracticeAttempt.answers_data
+            ).filter(
+                UGCNetPracticeAttempt.id.in_(list(buffers)),
+                UGCNetPracticeAttempt.status != 'completed'
+            ).all():
+                answers = self.merge_answers(json.loads(answers_data) if answers_data else {}, buffers[attempt_id])
+                rows.append({'b_id': attempt_id, 'b_answers': json.dumps(answers)})
+        
+        if rows:
+            table = UGCNetPracticeAttempt.__table__
+            # Guard again in the UPDATE, an attempt may have been submitted since it was read
+            db.session.execute(
+                table.update().where(
+                    table.c.id == bindparam('b_id'), table.c.status != 'completed'
+                ).values(answers_data=bindparam('b_answers')),
+                rows
+            )
+            db.session.commit()
+        
+        pipeline = redis_client.pipeline()
+        pipeline.delete(*[self.get_flushing_key(attempt_id) for attempt_id in attempt_ids])
+        # Attempts whose new buffer was held back behind an interrupted flush go round again
+        for attempt_id, left_behind in zip(attempt_ids, interrupted):
+            if left_behind:
+                pipeline.exists(self.get_key(attempt_id))
+        pending = pipeline.execute()[1:]
+        
+        held_back = [
+            attempt_id for attempt_id, left_behind in zip(attempt_ids, interrupted) if left_behind
+        ]
+        requeue = {attempt_id: time.time() for attempt_id, exists in zip(held_back, pending) if exists}
+        if requeue:
+            redis_client.zadd(self.DIRTY_KEY, requeue, nx=True)
+        
+        return len(rows)
+    
+    @staticmethod
+    def _decode(fields: Dict) -> Dict:
+        return {
+            (field.decode() if isinstance(field, bytes) else field): value.decode() if isinstance(value, bytes) else value
+            for field, value in fields.items()
+        }
+    
+    @classmethod
+    def merge_answers(cls, answers: Dict, fields: Dict) -> Dict:
+        """Apply buffered hash fields to an answers dict"""
+        merged = {} if cls.REPLACE_FIELD in fields else dict(answers)
+        for question_id, encoded in fields.items():
+            if question_id == cls.REPLACE_FIELD:
+                continue
+            answer = json.loads(encoded)
+            if answer is None:
+                merged.pop(question_id, None)
+            else:
+                merged[question_id] = answer
+        return merged
@@ -0,0 +1,173 @@
+"""
+Attempt Expiry Service
+Finalizes mock and practice attempts left in progress past their time limit:
+expired attempts are found through the (status, start_time) index, scored from
+the answers saved so far and committed in small batches so the sweep never
+holds the SQLite write lock for long
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from app import db
+from app.models import UGCNetMockAttempt, UGCNetPracticeAttempt
+from app.services.activity_service import ActivityService
+from app.services.answer_buffer_service import AnswerBufferService
+from app.services.attempt_response_service import AttemptResponseService
+from app.services.attempt_rollup_service import AttemptRollupService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.question_stats_service import QuestionStatsService
+from app.services.score_distribution_service import ScoreDistributionService
+from app.services.scoring_engine import ScoringEngine, build_question_results, get_qualification_status
+from app.services.user_dashboard_service import UserDashboardService
+from app.utils.timezone_utils import attempt_time_to_utc, utc_to_ist
+
+
+class AttemptExpiryService:
+    """Service for finalizing expired in-progress attempts"""
+    
+    def __init__(self, batch_size: int = 50, max_batches: int = 20):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        # Submits racing the time limit win over the sweeper
+        self.grace_period = timedelta(minutes=5)
+        self.scoring_engine = ScoringEngine()
+    
+    def sweep(self) -> Dict[str, int]:
+        """Finalize expired mock and practice attempts, returns the number finalized per type"""
+        return {
+            'mock': self._sweep(UGCNetMockAttempt, self.finalize_mock_attempts),
+            'practice': self._sweep(UGCNetPracticeAttempt, self.finalize_practice_attempts)
+        }
+    
+    def _sweep(self, model, finalize) -> int:
+        now = datetime.utcnow()
+        # Nothing that started after this can have expired, whatever its time limit
+        shortest_limit = db.session.query(db.func.min(model.time_limit)).filter(
+            model.status == 'in_progress'
+        ).scalar()
+        if shortest_limit is None:
+            return 0
+        started_before = now - timedelta(minutes=shortest_limit) - self.grace_period
+        
+        finalized = 0
+        last_start, last_id = None, 0
+        for _ in range(self.max_batches):
+            # Keyset pagination over ix_*_status_start_time
+            query = model.query.filter(
+                model.status == 'in_progress',
+                model.start_time < started_before
+            )
+            if last_start is not None:
+                query = query.filter(db.or_(
+                    model.start_time > last_start,
+                    db.and_(model.start_time == last_start, model.id > last_id)
+                ))
+            candidates = query.order_by(model.start_time, model.id).limit(self.batch_size).all()
+            if not candidates:
+                break
+            last_start, last_id = candidates[-1].start_time, candidates[-1].id
+            
+            expired = [attempt for attempt in candidates if self.get_expiry_time(attempt) + self.grace_period < now]
+            if expired:
+                finalize(expired)
+                finalized += len(expired)
+        
+        return finalized
+    
+    @staticmethod
+    def get_expiry_time(attempt) -> datetime:
+        return attempt.start_time + timedelta(minutes=attempt.time_limit or 0)
+    
+    def finalize_mock_attempts(self, attempts: List[UGCNetMockAttempt]):
+        """Score expired mock attempts from their saved answers and mark them completed"""
+        score_distribution = ScoreDistributionService()
+        results = self.scoring_engine.score_mock_attempts(attempts)
+        
+        # Standings are read before any attempt of the batch is marked completed
+        standings = [
+            score_distribution.get_standing(attempt.mock_test_id, attempt.mock_test.subject_id, result['percentage'])
+            for attempt, result in zip(attempts, results)
+        ]
+        
+        recorded = []
+        for attempt, result, standing in zip(attempts, results, standings):
+            attempt.status = 'completed'
+            attempt.is_completed = True
+            attempt.end_time = self.get_expiry_time(attempt)
+            attempt.completed_at = attempt.end_time
+            attempt.score = result['obtained_marks']
+            attempt.correct_answers = result['correct_answers']
+            attempt.total_questions = result['total_questions'] or attempt.mock_test.total_questions
+            attempt.total_marks = int(result['total_marks'])
+            attempt.percentage = result['percentage']
+            attempt.qualification_status = get_qualification_status(
+                result['percentage'], score_distribution.get_qualification_percentile(standing)
+            )
+            attempt.predicted_rank = standing['predicted_rank']
+            attempt.set_chapter_wise_performance(result['chapter_performance'])
+            recorded.append(self._record_responses('mock', attempt, result))
+        AttemptRollupService().record('mock', attempts)
+        UserDashboardService().record('mock', attempts)
+        
+        db.session.commit()
+        
+        for attempt, result, answered in zip(attempts, results, recorded):
+            score_distribution.record(attempt.mock_test_id, attempt.mock_test.subject_id, result['percentage'])
+            if answered:
+                QuestionStatsService().record_outcomes(result)
+        LeaderboardService().record(attempts)
+        self._record_activity(attempts)
+    
+    def finalize_practice_attempts(self, attempts: List[UGCNetPracticeAttempt]):
+        """Score expired practice attempts from their saved and buffered answers and mark them completed"""
+        answer_buffer = AnswerBufferService()
+        answers_by_attempt = [answer_buffer.get_answers(attempt) for attempt in attempts]
+        for attempt, answers in zip(attempts, answers_by_attempt):
+            attempt.set_answers_data(answers)
+        
+        results = self.scoring_engine.score_practice_attempts(attempts)
+        
+        recorded = []
+        for attempt, answers, result in zip(attempts, answers_by_attempt, results):
+            attempt.status = 'completed'
+            attempt.is_completed = True
+            attempt.end_time = self.get_expiry_time(attempt)
+            # Practice completion times are kept in IST like on submit
+            attempt.completed_at = utc_to_ist(attempt.end_time)
+            attempt.time_taken = (attempt.time_limit or 0) * 60
+            attempt.score = result['obtained_marks']
+            attempt.total_marks = int(result['total_marks'])
+            attempt.percentage = result['percentage']
+            attempt.correct_answers = result['correct_answers']
+            attempt.set_chapter_wise_performance(result['chapter_performance'])
+            attempt.set_detailed_results({'questions': build_question_results(result, answers)})
+            recorded.append(self._record_responses('practice', attempt, result))
+        AttemptRollupService().record('practice', attempts)
+        UserDashboardService().record('practice', attempts)
+        
+        db.session.commit()
+        
+        for attempt, result, answered in zip(attempts, results, recorded):
+            answer_buffer.discard(attempt.id)
+            if answered:
+                QuestionStatsService().record_outcomes(result)
+        self._record_activity(attempts)
+    
+    @staticmethod
+    def _record_activity(attempts: List):
+        # Expired attempts count as activity on the day their time ran out
+        activity = ActivityService()
+        for attempt in attempts:
+            activity.record([attempt.attempt_user], attempt.end_time)
+    
+    @staticmethod
+    def _record_responses(attempt_type: str, attempt, result: Dict) -> bool:
+        # Attempts abandoned without a single answer say nothing about the questions
+        if not any(option is not None for option in result['chosen_options']):
+            return False
+        AttemptResponseService.record_attempt(
+            attempt_type, attempt.id, attempt.user_id, result,
+            created_at=attempt_time_to_utc(attempt_type, attempt.completed_at)
+        )
+        return True
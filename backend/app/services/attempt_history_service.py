@@ -0,0 +1,124 @@
+"""
+Attempt History Service
+A user's completed mock and practice attempts as one feed, newest first, with
+keyset pagination. Each attempt table is read through its (user_id,
+is_completed, completed_at, id) index for just one page past the cursor and
+the two pages are merged, so a page costs the same however long the history is
+"""
+
+import base64
+import heapq
+import json
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+
+from app.models import UGCNetMockAttempt, UGCNetMockTest, UGCNetPracticeAttempt
+from app.utils.timezone_utils import attempt_time_to_utc, utc_to_ist
+
+ATTEMPT_TYPES = ('mock', 'practice')
+MAX_PER_PAGE = 100
+
+
+class AttemptHistoryService:
+    """Service for the paginated attempt history feed"""
+    
+    # Cursors hold a feed position: (completed_at in UTC, attempt type, attempt ID),
+    # the feed runs in descending order of it
+    @staticmethod
+    def encode_cursor(position: Tuple[datetime, str, int]) -> str:
+        completed_at, attempt_type, attempt_id = position
+        raw = json.dumps([completed_at.isoformat(), attempt_type, attempt_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, str, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            completed_at, attempt_type, attempt_id = json.loads(raw)
+            if attempt_type not in ATTEMPT_TYPES:
+                raise ValueError(attempt_type)
+            return datetime.fromisoformat(completed_at), attempt_type, int(attempt_id)
+        except (TypeError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+    
+    @staticmethod
+    def _stored_time(attempt_type: str, completed_at: datetime) -> datetime:
+        """A UTC completion time as the attempt table stores it, mock attempts in UTC and practice ones in IST"""
+        return completed_at if attempt_type == 'mock' else utc_to_ist(completed_at).replace(tzinfo=None)
+    
+    def _page_query(self, attempt_type: str, user_id: int, limit: int,
+                    after: Optional[Tuple[datetime, str, int]], subject_id: Optional[int]):
+        if attempt_type == 'mock':
+            model = UGCNetMockAttempt
+            query = model.query.options(joinedload(model.mock_test))
+            if subject_id:
+                query = query.join(UGCNetMockTest).filter(UGCNetMockTest.subject_id == subject_id)
+        else:
+            model = UGCNetPracticeAttempt
+            query = model.query.options(joinedload(model.subject))
+            if subject_id:
+                query = query.filter(model.subject_id == subject_id)
+        
+        query = query.filter(
+            model.user_id == user_id,
+            model.is_completed == True,
+            model.completed_at.isnot(None)
+        )
+        if after:
+            completed_at, after_type, after_id = after
+            bound = self._stored_time(attempt_type, completed_at)
+            # Ties on completion time go by attempt type, then ID, like the feed order
+            if ATTEMPT_TYPES.index(attempt_type) > ATTEMPT_TYPES.index(after_type):
+                query = query.filter(model.completed_at < bound)
+            elif attempt_type == after_type:
+                query = query.filter(or_(
+                    model.completed_at < bound,
+                    and_(model.completed_at == bound, model.id < after_id)
+                ))
+            else:
+                query = query.filter(model.completed_at <= bound)
+        
+        return query.order_by(model.completed_at.desc(), model.id.desc()).limit(limit)
+    
+    def get_page(self, user_id: int, per_page: int = 10, cursor: Optional[str] = None,
+                 attempt_type: Optional[str] = None, subject_id: Optional[int] = None) -> Dict:
+        """One page of the feed after cursor (from the start without one), raises ValueError on bad input"""
+        if attempt_type not in (None, 'all') + ATTEMPT_TYPES:
+            raise ValueError(f'Invalid attempt type: {attempt_type}')
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        after = self.decode_cursor(cursor) if cursor else None
+        
+        feeds = []
+        for feed_type in ATTEMPT_TYPES:
+            if attempt_type in (None, 'all', feed_type):
+                # One row past the page tells whether another page follows
+                attempts = self._page_query(feed_type, user_id, per_page + 1, after, subject_id).all()
+                feeds.append([
+                    ((attempt_time_to_utc(feed_type, attempt.completed_at), feed_type, attempt.id), attempt)
+                    for attempt in attempts
+                ])
+        
+        merged = list(heapq.merge(*feeds, key=lambda entry: entry[0], reverse=True))
+        page = merged[:per_page]
+        has_next = len(merged) > per_page
+        
+        return {
+            'attempts': [self._feed_item(position, attempt) for position, attempt in page],
+            'pagination': {
+                'per_page': per_page,
+                'has_next': has_next,
+                'next_cursor': self.encode_cursor(page[-1][0]) if has_next else None
+            }
+        }
+    
+    @staticmethod
+    def _feed_item(position: Tuple[datetime, str, int], attempt) -> Dict:
+        completed_at, attempt_type, _ = position
+        return {
+            'type': attempt_type,
+            'data': attempt.to_dict(),
+            'completed_at': completed_at.isoformat() + 'Z'
+        }
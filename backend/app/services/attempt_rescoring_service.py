@@ -0,0 +1,334 @@
+"""
+Attempt Rescoring Service
+Keeps an inverted index from questions to the attempts that served them so a
+corrected answer key only re-scores the affected mock and practice attempts
+"""
+
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from app import db, redis_client
+from app.models import (
+    QuestionBank, UGCNetMockAttempt, UGCNetPracticeAttempt,
+    AttemptQuestionIndex, UserLearningMetrics
+)
+from app.services.attempt_response_service import AttemptResponseService
+from app.services.attempt_rollup_service import AttemptRollupService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.question_stats_service import QuestionStatsService
+from app.services.score_distribution_service import ScoreDistributionService, ScoreHistogram
+from app.services.scoring_engine import ScoringEngine, get_qualification_status
+from app.services.user_dashboard_service import UserDashboardService
+
+
+class AttemptRescoringService:
+    """Service for incremental re-scoring after answer key corrections"""
+    
+    PROGRESS_PREFIX = 'rescore_job'
+    
+    def __init__(self, batch_size: int = 200):
+        self.batch_size = batch_size
+        self.progress_ttl = 24 * 60 * 60
+        self.scoring_engine = ScoringEngine()
+        self.score_distribution = ScoreDistributionService()
+        self.rollups = AttemptRollupService()
+        self.dashboards = UserDashboardService()
+        self.leaderboards = LeaderboardService()
+    
+    @staticmethod
+    def index_attempt(attempt_type: str, attempt_id: int, user_id: int, question_ids: Iterable[int]):
+        """Record the questions served in an attempt, the caller commits"""
+        rows = [
+            {
+                'question_id': int(question_id),
+                'attempt_type': attempt_type,
+                'attempt_id': attempt_id,
+                'user_id': user_id,
+                'created_at': datetime.utcnow()
+            }
+            for question_id in dict.fromkeys(question_ids)
+        ]
+        if rows:
+            db.session.execute(AttemptQuestionIndex.__table__.insert(), rows)
+    
+    @staticmethod
+    def unindex_attempts(attempts):
+        """Drop the index rows of attempts that are being deleted, the caller commits"""
+        if attempts:
+            db.session.query(AttemptQuestionIndex).filter(
+                AttemptResponseService.attempts_criterion(attempts, AttemptQuestionIndex)
+            ).delete(synchronize_session=False)
+    
+    def find_affected_attempts(self, question_ids: List[int]) -> Dict[str, List[int]]:
+        """Attempt IDs per attempt type that served any of the given questions"""
+        rows = db.session.query(
+            AttemptQuestionIndex.attempt_type, AttemptQuestionIndex.attempt_id
+        ).filter(
+            AttemptQuestionIndex.question_id.in_(question_ids)
+        ).distinct().order_by(AttemptQuestionIndex.attempt_id).all()
+        
+        affected = {'mock': [], 'practice': []}
+        for row in rows:
+            affected.setdefault(row.attempt_type, []).append(row.attempt_id)
+        return affected
+    
+    def request_rescore(self, question_ids: List[int]) -> Dict:
+        """
+        Queue a background re-score, returns its job_id for progress polling and its status
+        
+        The status is 'queued', or 'completed' / 'failed' when no worker was
+        available and the re-score ran inline. A failed re-score never raises,
+        the change that asked for it is already committed.
+        """
+        job_id = uuid.uuid4().hex
+        self._set_progress(job_id, status='queued', question_ids=','.join(map(str, question_ids)))
+        
+        try:
+            from app import celery_app
+            if celery_app:
+                celery_app.send_task('app.tasks.rescore_question_attempts', args=[question_ids, job_id])
+                return {'job_id': job_id, 'status': 'queued'}
+        except Exception as e:
+            print(f"Rescore task dispatch error: {e}")
+        
+        # No worker available: re-score inline rather than leave stale scores behind
+        try:
+            self.rescore(question_ids, job_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Inline rescore error for job {job_id}: {e}")
+            self._set_progress(job_id, status='failed', error=str(e))
+            return {'job_id': job_id, 'status': 'failed'}
+        return {'job_id': job_id, 'status': 'completed'}
+    
+    def rescore(self, question_ids: List[int], job_id: Optional[str] = None) -> Dict:
+        """
+        Re-score every attempt that served the given questions
+        
+        Attempts are processed in batches, each locked, re-scored and committed
+        on its own so live traffic is only ever blocked for one batch. Frozen mock
+        answer keys are patched first, including in-progress attempts, so those
+        are scored correctly when they are submitted.
+        """
+        affected = self.find_affected_attempts(question_ids)
+        total = sum(len(ids) for ids in affected.values())
+        self._set_progress(job_id, status='running', total=total, processed=0)
+        
+        corrected_keys = {
+            str(row.id): [row.correct_option, row.marks or 1]
+            for row in db.session.query(
+                QuestionBank.id, QuestionBank.correct_option, QuestionBank.marks
+            ).filter(QuestionBank.id.in_(question_ids)).all()
+        }
+        
+        processed = 0
+        rescored = 0
+        user_ids = set()
+        try:
+            for attempt_type, attempt_ids in affected.items():
+                for start in range(0, len(attempt_ids), self.batch_size):
+                    batch_ids = attempt_ids[start:start + self.batch_size]
+                    
+                    score_moves = []
+                    if attempt_type == 'mock':
+                        rescored_attempts = self._rescore_mock_batch(batch_ids, corrected_keys, score_moves)
+                    else:
+                        rescored_attempts = self._rescore_practice_batch(batch_ids)
+                    
+                    db.session.commit()
+                    
+                    for move in score_moves:
+                        self.score_distribution.move(*move)
+                    if attempt_type == 'mock':
+                        self.leaderboards.refresh(
+                            (attempt.user_id, self.leaderboards.boards(attempt)) for attempt in rescored_attempts
+                        )
+                    
+                    rescored += len(rescored_attempts)
+                    user_ids.update(attempt.user_id for attempt in rescored_attempts)
+                    processed += len(batch_ids)
+                    self._set_progress(job_id, processed=processed, rescored=rescored)
+            
+            AttemptResponseService.apply_answer_key(question_ids)
+            db.session.commit()
+            QuestionStatsService().rebuild(question_ids)
+            
+            metrics_updated = self._refresh_learning_metrics(user_ids)
+            
+            self._set_progress(
+                job_id, status='completed', metrics_updated=metrics_updated,
+                finished_at=datetime.utcnow().isoformat()
+            )
+            return {
+                'job_id': job_id,
+                'attempts_checked': processed,
+                'attempts_rescored': rescored,
+                'users_affected': len(user_ids),
+                'metrics_updated': metrics_updated
+            }
+        
+        except Exception as e:
+            db.session.rollback()
+            self._set_progress(job_id, status='failed', error=str(e))
+            raise
+    
+    def _rescore_mock_batch(self, attempt_ids: List[int], corrected_keys: Dict,
+                            score_moves: List) -> List[UGCNetMockAttempt]:
+        attempts = UGCNetMockAttempt.query.filter(
+            UGCNetMockAttempt.id.in_(attempt_ids)
+        ).with_for_update().all()
+        
+        for attempt in attempts:
+            answer_key = attempt.get_answer_key()
+            if answer_key and any(q_id in answer_key for q_id in corrected_keys):
+                answer_key.update({q_id: key for q_id, key in corrected_keys.items() if q_id in answer_key})
+                attempt.set_answer_key(answer_key)
+        
+        completed = [attempt for attempt in attempts if attempt.status == 'completed']
+        
+        # Distributions are loaded once per batch, before any score in it changes
+        histograms = {}
+        for attempt in completed:
+            for scope, scope_id in (('mock_test', attempt.mock_test_id), ('subject', attempt.mock_test.subject_id)):
+                if (scope, scope_id) not in histograms:
+                    histograms[(scope, scope_id)] = self.score_distribution.get_histogram(scope, scope_id)
+        
+        rescored = []
+        for attempt, result in zip(completed, self.scoring_engine.score_mock_attempts(completed)):
+            # Rank the new score against everyone else's, the moves are applied once the batch is committed
+            subject_id = attempt.mock_test.subject_id
+            others = []
+            for key in (('mock_test', attempt.mock_test_id), ('subject', subject_id)):
+                histogram = ScoreHistogram(histograms[key].counts)
+                histogram.add(attempt.percentage, -1)
+                others.append(histogram)
+            standing = self.score_distribution.build_standing(*others, result['percentage'])
+            score_moves.append((attempt.mock_test_id, subject_id, attempt.percentage, result['percentage']))
+            rescored.append((attempt, attempt.percentage, attempt.qualification_status))
+            
+            attempt.score = result['obtained_marks']
+            attempt.correct_answers = result['correct_answers']
+            attempt.total_questions = result['total_questions']
+            attempt.total_marks = int(result['total_marks'])
+            attempt.percentage = result['percentage']
+            attempt.qualification_status = get_qualification_status(
+                result['percentage'], self.score_distribution.get_qualification_percentile(standing)
+            )
+            attempt.predicted_rank = standing['predicted_rank']
+            attempt.set_chapter_wise_performance(result['chapter_performance'])
+        
+        # Daily rollups live in the database and move in the batch's transaction
+        self.rollups.move('mock', rescored)
+        self.dashboards.discard(attempt.user_id for attempt, *_ in rescored)
+        return completed
+    
+    def _rescore_practice_batch(self, attempt_ids: List[int]) -> List[UGCNetPracticeAttempt]:
+        attempts = UGCNetPracticeAttempt.query.filter(
+            UGCNetPracticeAttempt.id.in_(attempt_ids),
+            UGCNetPracticeAttempt.status == 'completed'
+        ).with_for_update().all()
+        
+        rescored = []
+        for attempt, result in zip(attempts, self.scoring_engine.score_practice_attempts(attempts)):
+            rescored.append((attempt, attempt.percentage, None))
+            attempt.score = result['obtained_marks']
+            attempt.correct_answers = result['correct_answers']
+            attempt.total_marks = int(result['total_marks'])
+            attempt.percentage = result['percentage']
+            attempt.set_chapter_wise_performance(result['chapter_performance'])
+            
+            # Keep the stored question-wise results in line with the new key
+            outcomes = {
+                question_id: (is_correct, correct_option)
+                for question_id, is_correct, correct_option in zip(
+                    result['question_ids'], result['is_correct'], result['correct_options']
+                )
+            }
+            detailed_results = attempt.get_detailed_results()
+            for question_result in detailed_results.get('questions', []):
+                outcome = outcomes.get(question_result.get('question_id'))
+                if outcome:
+                    question_result['is_correct'], question_result['correct_answer'] = outcome
+            attempt.set_detailed_results(detailed_results)
+        
+        self.rollups.move('practice', rescored)
+        self.dashboards.discard(attempt.user_id for attempt, *_ in rescored)
+        return attempts
+    
+    def _refresh_learning_metrics(self, user_ids) -> int:
+        """Recalculate the derived learning metrics of users that already have them"""
+        if not user_ids:
+            return 0
+        
+        # Import here to avoid circular import
+        from app.services.learning_metrics_calculator import LearningMetricsCalculator
+        
+        metrics_user_ids = [
+            row.user_id for row in db.session.query(UserLearningMetrics.user_id).filter(
+                UserLearningMetrics.user_id.in_(list(user_ids))
+            ).all()
+        ]
+        
+        calculator = LearningMetricsCalculator()
+        updated = 0
+        for user_id in metrics_user_ids:
+            try:
+                calculator.calculate_all_user_metrics(user_id)
+                updated += 1
+            except Exception as e:
+                print(f"Learning metrics refresh error for user {user_id}: {e}")
+        return updated
+    
+    def backfill_index(self) -> int:
+        """Index the questions of attempts created before the index existed, returns the attempts added"""
+        added = 0
+        for attempt_type, model in (('mock', UGCNetMockAttempt), ('practice', UGCNetPracticeAttempt)):
+            indexed_ids = db.session.query(AttemptQuestionIndex.attempt_id).filter(
+                AttemptQuestionIndex.attempt_type == attempt_type
+            ).distinct()
+            
+            last_id = 0
+            while True:
+                attempts = model.query.filter(
+                    model.id > last_id, ~model.id.in_(indexed_ids)
+                ).order_by(model.id).limit(self.batch_size).all()
+                if not attempts:
+                    break
+                
+                for attempt in attempts:
+                    if attempt_type == 'mock':
+                        question_ids = attempt.get_question_ids()
+                    else:
+                        question_ids = [q['id'] for q in attempt.get_questions_data()]
+                    self.index_attempt(attempt_type, attempt.id, attempt.user_id, question_ids)
+                
+                db.session.commit()
+                added += len(attempts)
+                last_id = attempts[-1].id
+        
+        return added
+    
+    def get_progress(self, job_id: str) -> Optional[Dict]:
+        """Progress of a re-score job, None when unknown or Redis is unavailable"""
+        try:
+            if redis_client:
+                progress = redis_client.hgetall(f'{self.PROGRESS_PREFIX}:{job_id}')
+                if progress:
+                    return {key.decode(): value.decode() for key, value in progress.items()}
+        except Exception as redis_error:
+            print(f"Redis rescore progress error: {redis_error}")
+        return None
+    
+    def _set_progress(self, job_id: Optional[str], **fields):
+        if not job_id:
+            return
+        try:
+            if redis_client:
+                key = f'{self.PROGRESS_PREFIX}:{job_id}'
+                pipeline = redis_client.pipeline()
+                pipeline.hset(key, mapping={name: str(value) for name, value in fields.items()})
+                pipeline.expire(key, self.progress_ttl)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis rescore progress error: {redis_error}")
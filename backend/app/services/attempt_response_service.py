@@ -0,0 +1,171 @@
+"""
+Attempt Response Service
+Writes the per-question responses of submitted attempts to the narrow, indexed
+attempt_responses table and runs topic, difficulty and chapter aggregations
+over it as SQL GROUP BYs instead of decoding answer JSON in Python
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, cast, false, func, or_
+
+from app import db
+from app.models import AttemptResponse, QuestionBank, UGCNetMockAttempt, UGCNetPracticeAttempt
+from app.services.scoring_engine import ScoringEngine
+from app.utils.timezone_utils import attempt_time_to_utc
+
+
+class AttemptResponseService:
+    """Service for the normalized per-question attempt responses"""
+    
+    def __init__(self, batch_size: int = 200):
+        self.batch_size = batch_size
+        self.scoring_engine = ScoringEngine()
+    
+    @staticmethod
+    def record_attempt(attempt_type: str, attempt_id: int, user_id: int, result: Dict,
+                       time_spent: Optional[Dict] = None, created_at: Optional[datetime] = None):
+        """Bulk insert the responses of a scored attempt (see ScoringEngine.score_attempts), the caller commits"""
+        time_spent = time_spent or {}
+        
+        rows = []
+        for question_id, chapter_id, chosen_option, is_correct, marks in zip(
+            result['question_ids'], result['chapter_ids'], result['chosen_options'],
+            result['is_correct'], result['question_marks']
+        ):
+            seconds = time_spent.get(str(question_id))
+            rows.append({
+                'attempt_type': attempt_type,
+                'attempt_id': attempt_id,
+                'user_id': user_id,
+                'question_id': question_id,
+                'chapter_id': chapter_id,
+                'chosen_option': chosen_option,
+                'is_correct': is_correct,
+                'time_spent': int(seconds) if isinstance(seconds, (int, float)) and seconds >= 0 else None,
+                'marks': marks,
+                'marks_awarded': marks if is_correct else 0.0
+            })
+            if created_at:
+                rows[-1]['created_at'] = created_at
+        
+        if rows:
+            db.session.execute(AttemptResponse.__table__.insert(), rows)
+    
+    @staticmethod
+    def delete_responses(*criteria) -> List:
+        """Delete the matching responses, the caller commits; returns their (question_id, is_correct, time_spent) rows"""
+        query = db.session.query(AttemptResponse).filter(*criteria)
+        responses = query.with_entities(
+            AttemptResponse.question_id, AttemptResponse.is_correct, AttemptResponse.time_spent
+        ).all()
+        if responses:
+            query.delete(synchronize_session=False)
+        return responses
+    
+    @staticmethod
+    def apply_answer_key(question_ids: List[int]):
+        """Re-mark stored responses of questions whose answer key changed, the caller commits"""
+        for question in db.session.query(
+            QuestionBank.id, QuestionBank.correct_option, QuestionBank.marks
+        ).filter(QuestionBank.id.in_(question_ids)).all():
+            # Unanswered responses have no chosen option and stay incorrect
+            is_correct = func.coalesce(AttemptResponse.chosen_option == (question.correct_option or '').upper(), False)
+            db.session.query(AttemptResponse).filter(
+                AttemptResponse.question_id == question.id
+            ).update({
+                AttemptResponse.is_correct: is_correct,
+                AttemptResponse.marks_awarded: case((is_correct, AttemptResponse.marks), else_=0.0)
+            }, synchronize_session=False)
+    
+    @staticmethod
+    def attempts_criterion(attempts, model=AttemptResponse):
+        """SQL criterion matching the responses (or other per-attempt rows of model) of the given attempt rows"""
+        mock_ids = [a.id for a in attempts if isinstance(a, UGCNetMockAttempt)]
+        practice_ids = [a.id for a in attempts if isinstance(a, UGCNetPracticeAttempt)]
+        
+        criteria = []
+        if mock_ids:
+            criteria.append(and_(model.attempt_type == 'mock', model.attempt_id.in_(mock_ids)))
+        if practice_ids:
+            criteria.append(and_(model.attempt_type == 'practice', model.attempt_id.in_(practice_ids)))
+        return or_(*criteria) if criteria else false()
+    
+    @staticmethod
+    def get_breakdown(group_by, *criteria, min_responses: int = 1,
+                      order: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """
+        Aggregate responses grouped by an AttemptResponse or QuestionBank column
+        
+        Returns {key: {'total', 'correct', 'success_rate', 'average_time', 'attempts'}}
+        where attempts counts the distinct attempts the responses came from.
+        order='best' or 'worst' sorts groups by success rate before the limit.
+        """
+        total = func.count(AttemptResponse.id)
+        correct = func.sum(case((AttemptResponse.is_correct == True, 1), else_=0))
+        success_rate = correct * 1.0 / total
+        attempt_key = AttemptResponse.attempt_type + ':' + cast(AttemptResponse.attempt_id, db.String)
+        
+        query = db.session.query(
+            group_by.label('key'),
+            total.label('total'),
+            correct.label('correct'),
+            func.avg(AttemptResponse.time_spent).label('average_time'),
+            func.count(func.distinct(attempt_key)).label('attempts')
+        ).join(
+            QuestionBank, QuestionBank.id == AttemptResponse.question_id
+        ).filter(*criteria).group_by(group_by)
+        
+        if min_responses > 1:
+            query = query.having(total >= min_responses)
+        if order == 'best':
+            query = query.order_by(success_rate.desc(), total.desc())
+        elif order == 'worst':
+            query = query.order_by(success_rate.asc(), total.desc())
+        if limit:
+            query = query.limit(limit)
+        
+        return {
+            row.key: {
+                'total': row.total,
+                'correct': int(row.correct or 0),
+                'success_rate': round((row.correct or 0) / row.total * 100, 2) if row.total else 0,
+                'average_time': round(row.average_time, 1) if row.average_time is not None else None,
+                'attempts': row.attempts
+            }
+            for row in query.all()
+        }
+    
+    def backfill(self) -> int:
+        """Write responses for completed attempts submitted before the table existed, returns the attempts added"""
+        added = 0
+        for attempt_type, model in (('mock', UGCNetMockAttempt), ('practice', UGCNetPracticeAttempt)):
+            recorded_ids = db.session.query(AttemptResponse.attempt_id).filter(
+                AttemptResponse.attempt_type == attempt_type
+            ).distinct()
+            
+            last_id = 0
+            while True:
+                attempts = model.query.filter(
+                    model.id > last_id, model.status == 'completed', ~model.id.in_(recorded_ids)
+                ).order_by(model.id).limit(self.batch_size).all()
+                if not attempts:
+                    break
+                
+                if attempt_type == 'mock':
+                    results = self.scoring_engine.score_mock_attempts(attempts)
+                else:
+                    results = self.scoring_engine.score_practice_attempts(attempts)
+                
+                for attempt, result in zip(attempts, results):
+                    self.record_attempt(
+                        attempt_type, attempt.id, attempt.user_id, result,
+                        created_at=attempt_time_to_utc(attempt_type, attempt.completed_at) or attempt.created_at
+                    )
+                
+                db.session.commit()
+                added += len(attempts)
+                last_id = attempts[-1].id
+        
+        return added
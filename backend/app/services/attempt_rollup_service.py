@@ -0,0 +1,353 @@
+"""
+Attempt Rollup Service
+Maintains daily_attempt_rollups, the count, qualification counts, sum and sum of squares
+of the percentage and time taken of completed attempts per IST day, subject and
+attempt type, and subject_user_activity, the first and last completion (in UTC)
+of every user in every subject. Submits add to both in the same transaction, so trend charts and
+the admin dashboard read one row per day and subject (and an index range for
+distinct users) instead of scanning attempts
+"""
+
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, union_all
+from sqlalchemy.dialects.sqlite import insert
+
+from app import db
+from app.models import (
+    DailyAttemptRollup, SubjectUserActivity, UGCNetMockAttempt, UGCNetMockTest, UGCNetPracticeAttempt, User
+)
+from app.services.scoring_engine import BORDERLINE_PERCENTAGE, QUALIFYING_PERCENTAGE, get_qualification_status
+from app.utils.time_buckets import bucket_expression, utc_expression
+from app.utils.timezone_utils import attempt_time_to_utc, current_ist_timestamp, utc_to_ist
+
+ROLLUP_KEY = ('day', 'subject_id', 'attempt_type')
+SUM_COLUMNS = (
+    'attempt_count', 'percentage_sum', 'percentage_sq_sum', 'borderline_count', 'qualifying_count',
+    'timed_count', 'time_sum', 'time_sq_sum'
+)
+
+
+class AttemptRollupService:
+    """Service for the daily attempt rollups and subject activity behind admin statistics"""
+    
+    @staticmethod
+    def _subject_id(attempt_type: str, attempt) -> int:
+        return attempt.mock_test.subject_id if attempt_type == 'mock' else attempt.subject_id
+    
+    def _rollup_key(self, attempt_type: str, attempt) -> Tuple:
+        completed_at = attempt_time_to_utc(attempt_type, attempt.completed_at)
+        return utc_to_ist(completed_at).date(), self._subject_id(attempt_type, attempt), attempt_type
+    
+    @staticmethod
+    def _time_taken(attempt_type: str, attempt) -> Optional[float]:
+        """Seconds spent on an attempt, None when not known"""
+        if attempt_type == 'mock':
+            if attempt.start_time and attempt.end_time:
+                return (attempt.end_time - attempt.start_time).total_seconds()
+            return None
+        return attempt.time_taken
+    
+    @staticmethod
+    def _pass_counts(percentage: float, qualification_status: Optional[str]) -> Tuple[int, int]:
+        """
+        (borderline or better, qualified) of an attempt
+        
+        Mock attempts count by their stored qualification status, which follows
+        percentile cut-offs once a test has enough attempts. Practice attempts,
+        and mock attempts scored before statuses were stored, use the percentage.
+        """
+        if qualification_status is None:
+            qualification_status = get_qualification_status(percentage)
+        return int(qualification_status in ('borderline', 'qualified')), int(qualification_status == 'qualified')
+    
+    @staticmethod
+    def _qualification_status(attempt_type: str, attempt) -> Optional[str]:
+        return attempt.qualification_status if attempt_type == 'mock' else None
+    
+    def record(self, attempt_type: str, attempts: List, sign: int = 1):
+        """Add completed attempts to their rollups, or remove them with sign=-1, the caller commits"""
+        deltas = {}
+        activity = {}
+        for attempt in attempts:
+            if not attempt.completed_at:
+                continue
+            percentage = attempt.percentage or 0
+            time_taken = self._time_taken(attempt_type, attempt)
+            borderline, qualifying = self._pass_counts(percentage, self._qualification_status(attempt_type, attempt))
+            
+            row = deltas.setdefault(self._rollup_key(attempt_type, attempt), dict.fromkeys(SUM_COLUMNS, 0))
+            row['attempt_count'] += sign
+            row['percentage_sum'] += sign * percentage
+            row['percentage_sq_sum'] += sign * percentage * percentage
+            row['borderline_count'] += sign * borderline
+            row['qualifying_count'] += sign * qualifying
+            if time_taken is not None:
+                row['timed_count'] += sign
+                row['time_sum'] += sign * time_taken
+                row['time_sq_sum'] += sign * time_taken * time_taken
+            
+            # Removals only lower the count, first and last completion are fixed up by rebuild_activity
+            completed_at = attempt_time_to_utc(attempt_type, attempt.completed_at)
+            user = activity.setdefault(
+                (self._subject_id(attempt_type, attempt), attempt.user_id),
+                {'attempt_count': 0, 'first_completed_at': completed_at, 'last_completed_at': completed_at}
+            )
+            user['attempt_count'] += sign
+            user['first_completed_at'] = min(user['first_completed_at'], completed_at)
+            user['last_completed_at'] = max(user['last_completed_at'], completed_at)
+        
+        self._apply(deltas)
+        self._apply_activity(activity)
+    
+    def move(self, attempt_type: str, rescored: List[Tuple]):
+        """
+        Move re-scored (attempt, old percentage, old qualification status) entries
+        to their new percentage and status, the caller commits
+        """
+        deltas = {}
+        for attempt, old_percentage, old_status in rescored:
+            if not attempt.completed_at:
+                continue
+            old_percentage, new_percentage = old_percentage or 0, attempt.percentage or 0
+            new_status = self._qualification_status(attempt_type, attempt)
+            if old_percentage == new_percentage and old_status == new_status:
+                continue
+            old_borderline, old_qualifying = self._pass_counts(old_percentage, old_status)
+            new_borderline, new_qualifying = self._pass_counts(new_percentage, new_status)
+            
+            row = deltas.setdefault(self._rollup_key(attempt_type, attempt), dict.fromkeys(SUM_COLUMNS, 0))
+            row['percentage_sum'] += new_percentage - old_percentage
+            row['percentage_sq_sum'] += new_percentage * new_percentage - old_percentage * old_percentage
+            row['borderline_count'] += new_borderline - old_borderline
+            row['qualifying_count'] += new_qualifying - old_qualifying
+        
+        self._apply(deltas)
+    
+    def _apply(self, deltas: Dict[Tuple, Dict]):
+        # One upsert adding every delta to its row, creating rows for new days
+        if not deltas:
+            return
+        
+        table = DailyAttemptRollup.__table__
+        statement = insert(table).values([
+            {**dict(zip(ROLLUP_KEY, key)), **sums, 'updated_at': current_ist_timestamp()}
+            for key, sums in deltas.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEY),
+            set_={
+                **{column: table.c[column] + statement.excluded[column] for column in SUM_COLUMNS},
+                'updated_at': statement.excluded.updated_at
+            }
+        )
+        db.session.execute(statement)
+    
+    def _apply_activity(self, activity: Dict[Tuple, Dict]):
+        if not activity:
+            return
+        
+        table = SubjectUserActivity.__table__
+        statement = insert(table).values([
+            {'subject_id': subject_id, 'user_id': user_id, **values}
+            for (subject_id, user_id), values in activity.items()
+        ])
+        # Two-argument min() and max() are SQLite's scalar functions
+        statement = statement.on_conflict_do_update(
+            index_elements=['subject_id', 'user_id'],
+            set_={
+                'attempt_count': table.c.attempt_count + statement.excluded.attempt_count,
+                'first_completed_at': func.min(
+                    func.coalesce(table.c.first_completed_at, statement.excluded.first_completed_at),
+                    statement.excluded.first_completed_at
+                ),
+                'last_completed_at': func.max(
+                    func.coalesce(table.c.last_completed_at, statement.excluded.last_completed_at),
+                    statement.excluded.last_completed_at
+                )
+            }
+        )
+        db.session.execute(statement)
+    
+    def is_built(self) -> bool:
+        """Whether any rollups exist, an empty table still has to be backfilled from all attempts"""
+        return db.session.query(DailyAttemptRollup.id).first() is not None
+    
+    def rebuild(self, start_day: Optional[date] = None, end_day: Optional[date] = None) -> int:
+        """
+        Recompute the rollups of a day range (all days by default) from the attempts
+        
+        Backfills days completed before rollups existed and repairs any drift
+        left by attempts changed outside the submit and re-score paths. Returns
+        the number of rollup rows written.
+        """
+        rollups = DailyAttemptRollup.query
+        if start_day:
+            rollups = rollups.filter(DailyAttemptRollup.day >= start_day)
+        if end_day:
+            rollups = rollups.filter(DailyAttemptRollup.day <= end_day)
+        rollups.delete(synchronize_session=False)
+        
+        table = DailyAttemptRollup.__table__
+        columns = list(ROLLUP_KEY) + list(SUM_COLUMNS) + ['updated_at']
+        written = 0
+        for attempt_type, model in (('mock', UGCNetMockAttempt), ('practice', UGCNetPracticeAttempt)):
+            if attempt_type == 'mock':
+                subject_id = UGCNetMockTest.subject_id
+                time_taken = (func.julianday(model.end_time) - func.julianday(model.start_time)) * 86400
+            else:
+                subject_id = model.subject_id
+                time_taken = model.time_taken
+            percentage = func.coalesce(model.percentage, 0)
+            qualification_status = case(
+                (percentage >= QUALIFYING_PERCENTAGE, 'qualified'),
+                (percentage >= BORDERLINE_PERCENTAGE, 'borderline'),
+                else_='not_qualified'
+            )
+            if attempt_type == 'mock':
+                qualification_status = func.coalesce(model.qualification_status, qualification_status)
+            stored_in_ist = attempt_type == 'practice'
+            day = bucket_expression(model.completed_at, 'day', stored_in_ist=stored_in_ist)
+            
+            query = db.session.query(
+                day, subject_id, db.literal(attempt_type),
+                func.count(model.id),
+                func.sum(percentage),
+                func.sum(percentage * percentage),
+                func.sum(case((qualification_status.in_(['borderline', 'qualified']), 1), else_=0)),
+                func.sum(case((qualification_status == 'qualified', 1), else_=0)),
+                func.sum(case((time_taken.is_(None), 0), else_=1)),
+                func.coalesce(func.sum(time_taken), 0),
+                func.coalesce(func.sum(time_taken * time_taken), 0),
+                db.literal(current_ist_timestamp())
+            ).filter(
+                model.is_completed == True,
+                model.completed_at.isnot(None)
+            )
+            if attempt_type == 'mock':
+                query = query.join(UGCNetMockTest, UGCNetMockTest.id == model.mock_test_id)
+            # IST day boundaries in the time zone the column is stored in
+            offset = timedelta() if stored_in_ist else timedelta(minutes=330)
+            if start_day:
+                query = query.filter(model.completed_at >= datetime.combine(start_day, datetime.min.time()) - offset)
+            if end_day:
+                query = query.filter(
+                    model.completed_at < datetime.combine(end_day + timedelta(days=1), datetime.min.time()) - offset
+                )
+            query = query.group_by(day, subject_id)
+            
+            written += db.session.execute(table.insert().from_select(columns, query.statement)).rowcount
+        
+        db.session.commit()
+        return written
+    
+    def rebuild_activity(self) -> int:
+        """Recompute every user's activity per subject from the attempts, returns the rows written"""
+        completions = union_all(
+            db.session.query(
+                UGCNetMockTest.subject_id.label('subject_id'), UGCNetMockAttempt.user_id.label('user_id'),
+                UGCNetMockAttempt.completed_at.label('completed_at')
+            ).join(UGCNetMockTest, UGCNetMockTest.id == UGCNetMockAttempt.mock_test_id).filter(
+                UGCNetMockAttempt.is_completed == True, UGCNetMockAttempt.completed_at.isnot(None)
+            ),
+            db.session.query(
+                UGCNetPracticeAttempt.subject_id, UGCNetPracticeAttempt.user_id,
+                utc_expression(UGCNetPracticeAttempt.completed_at, stored_in_ist=True)
+            ).filter(
+                UGCNetPracticeAttempt.is_completed == True, UGCNetPracticeAttempt.completed_at.isnot(None)
+            )
+        ).subquery()
+        
+        query = db.session.query(
+            completions.c.subject_id, completions.c.user_id, func.count(),
+            func.min(completions.c.completed_at), func.max(completions.c.completed_at)
+        ).group_by(completions.c.subject_id, completions.c.user_id)
+        
+        SubjectUserActivity.query.delete(synchronize_session=False)
+        written = db.session.execute(SubjectUserActivity.__table__.insert().from_select(
+            ['subject_id', 'user_id', 'attempt_count', 'first_completed_at', 'last_completed_at'], query.statement
+        )).rowcount
+        db.session.commit()
+        return written
+    
+    @staticmethod
+    def summarize(count: int, total: float, sq_total: float) -> Tuple[float, float]:
+        """Mean and population standard deviation from a count, sum and sum of squares"""
+        if not count:
+            return 0, 0
+        mean = total / count
+        return mean, math.sqrt(max(sq_total / count - mean * mean, 0))
+    
+    def get_totals(self, group_by: str, start_day: Optional[date] = None,
+                   end_day: Optional[date] = None) -> Dict[object, Dict]:
+        """Summed rollup columns per attempt_type, subject_id or day over an IST day range (all days by default)"""
+        group_column = getattr(DailyAttemptRollup, group_by)
+        query = db.session.query(
+            group_column, *[func.sum(getattr(DailyAttemptRollup, column)) for column in SUM_COLUMNS]
+        )
+        if start_day:
+            query = query.filter(DailyAttemptRollup.day >= start_day)
+        if end_day:
+            query = query.filter(DailyAttemptRollup.day <= end_day)
+        
+        return {row[0]: dict(zip(SUM_COLUMNS, row[1:])) for row in query.group_by(group_column).all()}
+    
+    def describe(self, sums: Optional[Dict]) -> Dict:
+        """Attempt count, score, pass rate and time statistics of summed rollup columns"""
+        sums = sums or dict.fromkeys(SUM_COLUMNS, 0)
+        count = sums['attempt_count'] or 0
+        average_score, score_stddev = self.summarize(count, sums['percentage_sum'], sums['percentage_sq_sum'])
+        average_time, time_stddev = self.summarize(sums['timed_count'], sums['time_sum'], sums['time_sq_sum'])
+        return {
+            'attempts': count,
+            'average_score': round(average_score, 1),
+            'score_stddev': round(score_stddev, 1),
+            'borderline_rate': round(sums['borderline_count'] / count * 100, 1) if count else 0,
+            'qualifying_rate': round(sums['qualifying_count'] / count * 100, 1) if count else 0,
+            'average_time_minutes': round(average_time / 60, 1),
+            'time_stddev_minutes': round(time_stddev / 60, 1)
+        }
+    
+    def get_daily_trends(self, start_day: date, end_day: date, subject_id: Optional[int] = None,
+                         attempt_type: Optional[str] = None) -> List[Dict]:
+        """Attempts, score and time statistics for each IST day of a range, days without attempts included"""
+        query = db.session.query(
+            DailyAttemptRollup.day,
+            *[func.sum(getattr(DailyAttemptRollup, column)) for column in SUM_COLUMNS]
+        ).filter(
+            DailyAttemptRollup.day >= start_day,
+            DailyAttemptRollup.day <= end_day
+        )
+        if subject_id:
+            query = query.filter(DailyAttemptRollup.subject_id == subject_id)
+        if attempt_type:
+            query = query.filter(DailyAttemptRollup.attempt_type == attempt_type)
+        
+        sums_by_day = {row[0]: dict(zip(SUM_COLUMNS, row[1:])) for row in query.group_by(DailyAttemptRollup.day).all()}
+        
+        trends = []
+        for offset in range((end_day - start_day).days + 1):
+            day = start_day + timedelta(days=offset)
+            trends.append({'date': day.isoformat(), **self.describe(sums_by_day.get(day))})
+        return trends
+    
+    def count_active_users(self, since: datetime, group_by_subject: bool = False):
+        """Distinct non-admin users with a completed attempt since a naive UTC time, overall or per subject ID"""
+        filters = (
+            SubjectUserActivity.last_completed_at >= since,
+            SubjectUserActivity.attempt_count > 0,
+            User.is_admin == False
+        )
+        
+        if group_by_subject:
+            return dict(db.session.query(
+                SubjectUserActivity.subject_id, func.count(SubjectUserActivity.user_id)
+            ).join(User, User.id == SubjectUserActivity.user_id).filter(*filters).group_by(
+                SubjectUserActivity.subject_id
+            ).all())
+        
+        return db.session.query(func.count(func.distinct(SubjectUserActivity.user_id))).join(
+            User, User.id == SubjectUserActivity.user_id
+        ).filter(*filters).scalar() or 0
@@ -0,0 +1,114 @@
+"""
+Cache Registry
+Maps domain events to the Redis cache keys they make stale. Cached reads
+register their key templates with the events that change what they cache and
+every committed transaction deletes the keys its events resolve to, so hot
+endpoints can cache for long periods without serving stale data
+"""
+
+import json
+from collections import defaultdict
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app import redis_client
+from app.services.domain_events import DomainEvent, subscribe
+
+
+class _Wildcards(dict):
+    """Format mapping that turns fields missing from an event payload into '*'"""
+    
+    partial = False
+    
+    def __missing__(self, key):
+        self.partial = True
+        return '*'
+
+
+class CacheRegistry:
+    """Registry of cache keys and the domain events that invalidate them"""
+    
+    def __init__(self):
+        # event name -> key templates, formatted with the event payload
+        self._templates: Dict[str, List[str]] = defaultdict(list)
+        # key template -> Redis set holding the keys written for it
+        self._indexes: Dict[str, str] = {}
+        self._listeners: List[Callable[[Set[str], Set[str]], None]] = []
+    
+    def register(self, key_template: str, *event_names: str, index_key: Optional[str] = None):
+        """
+        Invalidate key_template, e.g. 'user_chapters_{subject_id}', whenever one of the events commits
+        
+        Fields the event doesn't carry match any value. Those keys are looked up
+        with SCAN, or in index_key, a Redis set of the template's keys, if given.
+        """
+        for event_name in event_names:
+            if key_template not in self._templates[event_name]:
+                self._templates[event_name].append(key_template)
+        if index_key:
+            self._indexes[key_template] = index_key
+    
+    def add_listener(self, listener: Callable[[Set[str], Set[str]], None]):
+        """Also call listener(keys, patterns) on invalidation, for caches kept outside Redis"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+    
+    def resolve(self, events: List[DomainEvent]) -> Tuple[Set[str], Dict[str, Optional[str]]]:
+        """Keys made stale by events, and match patterns (with their index) for keys of events without the IDs they need"""
+        keys, patterns = set(), {}
+        for domain_event in events:
+            for template in self._templates.get(domain_event.name, []):
+                values = _Wildcards(domain_event.payload)
+                key = template.format_map(values)
+                if values.partial:
+                    # Bulk changes don't know which rows they touched
+                    patterns[key] = self._indexes.get(template)
+                else:
+                    keys.add(key)
+        return keys, patterns
+    
+    def invalidate(self, events: List[DomainEvent]):
+        keys, patterns = self.resolve(events)
+        for listener in self._listeners:
+            listener(set(keys), set(patterns))
+        try:
+            if redis_client:
+                for pattern, index_key in patterns.items():
+                    keys.update(self._match(pattern, index_key))
+                if keys:
+                    redis_client.delete(*keys)
+        except Exception as redis_error:
+            print(f"Redis cache invalidation error: {redis_error}")
+    
+    @staticmethod
+    def _match(pattern: str, index_key: Optional[str]) -> Iterable[str]:
+        if not index_key:
+            return redis_client.scan_iter(match=pattern, count=500)
+        matched = [key for key in redis_client.smembers(index_key) if fnmatchcase(key.decode(), pattern)]
+        if matched:
+            redis_client.srem(index_key, *matched)
+        return matched
+    
+    @staticmethod
+    def get_json(key: str) -> Optional[object]:
+        """Cached JSON value, None on a miss or when Redis is unavailable"""
+        try:
+            if redis_client:
+                cached = redis_client.get(key)
+                if cached:
+                    return json.loads(cached)
+        except Exception as redis_error:
+            print(f"Redis cache error: {redis_error}")
+        return None
+    
+    @staticmethod
+    def set_json(key: str, value, timeout: int):
+        try:
+            if redis_client:
+                redis_client.setex(key, timeout, json.dumps(value, default=str))
+        except Exception as redis_error:
+            print(f"Redis cache set error: {redis_error}")
+
+
+cache_registry = CacheRegistry()
+subscribe(cache_registry.invalidate)
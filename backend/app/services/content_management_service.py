@@ -2,8 +2,10 @@
 Content Management Service
 Handles subjects, chapters, and mock tests management
 """
-from app import db, redis_client
-from app.models import Subject, Chapter, UGCNetMockTest
+from app import db
+from app.models import Subject, Chapter, UGCNetMockTest, UGCNetMockAttempt
+from app.services.ugc_net_paper_generator import UGCNetPaperGenerator
+from app.services.mock_paper_pool_service import build_paper_config
 
 
 class ContentManagementService:
@@ -12,14 +14,6 @@ class ContentManagementService:
     def __init__(self):
         pass
     
-    def clear_cache(self):
-        """Clear relevant caches"""
-        try:
-            if redis_client:
-                redis_client.delete('admin_dashboard_stats')
-        except Exception as redis_error:
-            print(f"Redis cache delete error: {redis_error}")
-    
     # Subject Management
     def get_all_subjects(self):
         """Get all subjects"""
@@ -52,7 +46,6 @@ class ContentManagementService:
             
             db.session.add(subject)
             db.session.commit()
-            self.clear_cache()
             
             return subject.to_dict()
         except Exception as e:
@@ -85,7 +78,6 @@ class ContentManagementService:
                     setattr(subject, field, data[field])
             
             db.session.commit()
-            self.clear_cache()
             
             return subject.to_dict()
         except Exception as e:
@@ -105,7 +97,6 @@ class ContentManagementService:
             
             db.session.delete(subject)
             db.session.commit()
-            self.clear_cache()
             
             return True
         except Exception as e:
@@ -245,3 +236,33 @@ class ContentManagementService:
         except Exception as e:
             db.session.rollback()
             raise Exception(f"Error updating mock test status: {str(e)}")
+    
+    def regenerate_mock_attempt_paper(self, attempt_id):
+        """
+        Rebuild the paper of a mock attempt from its stored seed and compare it with the frozen one
+        
+        Returns None when the attempt does not exist and raises ValueError when it cannot be rebuilt.
+        """
+        attempt = UGCNetMockAttempt.query.get(attempt_id)
+        if not attempt:
+            return None
+        
+        if attempt.paper_seed is None:
+            raise ValueError('Attempt has no stored paper seed')
+        
+        mock_test = UGCNetMockTest.query.get(attempt.mock_test_id)
+        result = UGCNetPaperGenerator().regenerate_paper(
+            build_paper_config(mock_test), attempt.paper_seed, attempt.bank_version
+        )
+        if not result['success']:
+            raise ValueError(result['error'])
+        
+        question_ids = [q.id if hasattr(q, 'id') else q.get('id') for q in result['paper']['questions']]
+        
+        return {
+            'attempt_id': attempt.id,
+            'paper_seed': attempt.paper_seed,
+            'bank_version': attempt.bank_version,
+            'question_ids': question_ids,
+            'matches_frozen_paper': question_ids == attempt.get_question_ids()
+        }
@@ -0,0 +1,200 @@
+"""
+Domain Events
+Named events describing committed changes (an attempt completed, a question or
+subject changed, ...) with the IDs they affect. Mapper listeners queue them on
+the session while it flushes and they are handed to subscribers once, in a
+batch, after the transaction commits, so nothing reacts to rolled back changes
+"""
+
+from collections import namedtuple
+from typing import Callable, Dict, List
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import Chapter, QuestionBank, Subject, UGCNetMockAttempt, UGCNetMockTest, UGCNetPracticeAttempt, User
+
+ATTEMPT_COMPLETED = 'attempt_completed'
+ATTEMPT_RESCORED = 'attempt_rescored'
+ATTEMPT_DELETED = 'attempt_deleted'
+QUESTION_CHANGED = 'question_changed'
+SUBJECT_CHANGED = 'subject_changed'  # The subject itself, its chapters or its mock tests
+USER_CHANGED = 'user_changed'
+
+DomainEvent = namedtuple('DomainEvent', ['name', 'payload'])
+
+_subscribers: List[Callable[[List[DomainEvent]], None]] = []
+
+
+def subscribe(handler: Callable[[List[DomainEvent]], None]):
+    """
+    Call handler with the events of every committed transaction
+    
+    Handlers run inside the commit and must not use the session.
+    """
+    _subscribers.append(handler)
+    return handler
+
+
+def emit(session: Session, name: str, **payload):
+    """Queue an event to be dispatched when the session's transaction commits"""
+    seen = session.info.setdefault('domain_event_keys', set())
+    key = (name, tuple(sorted(payload.items())))
+    if key not in seen:
+        seen.add(key)
+        session.info.setdefault('domain_events', []).append(DomainEvent(name, payload))
+
+
+def _clear(session: Session):
+    for key in ('domain_event_keys', 'domain_event_lookups'):
+        session.info.pop(key, None)
+    return session.info.pop('domain_events', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_on_commit(session):
+    events = _clear(session)
+    if not events:
+        return
+    for handler in _subscribers:
+        try:
+            handler(events)
+        except Exception as e:
+            print(f"Domain event handler error: {e}")
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    _clear(session)
+
+
+def _lookup(connection, session: Session, column, row_id):
+    """Single column of a row read on the flushing connection, memoized for the transaction"""
+    cache: Dict = session.info.setdefault('domain_event_lookups', {})
+    key = (column.key, column.class_.__name__, row_id)
+    if key not in cache:
+        cache[key] = connection.execute(select(column).where(column.class_.id == row_id)).scalar()
+    return cache[key]
+
+
+def _old_value(target, attribute):
+    """Value of an attribute before this flush, None when unchanged"""
+    history = inspect(target).attrs[attribute].history
+    return history.deleted[0] if history.deleted else None
+
+
+# Catalog changes
+
+@event.listens_for(Subject, 'after_insert')
+@event.listens_for(Subject, 'after_update')
+@event.listens_for(Subject, 'after_delete')
+def _subject_changed(mapper, connection, target):
+    emit(inspect(target).session, SUBJECT_CHANGED, subject_id=target.id)
+
+
+@event.listens_for(Chapter, 'after_insert')
+@event.listens_for(Chapter, 'after_update')
+@event.listens_for(Chapter, 'after_delete')
+@event.listens_for(UGCNetMockTest, 'after_insert')
+@event.listens_for(UGCNetMockTest, 'after_update')
+@event.listens_for(UGCNetMockTest, 'after_delete')
+def _subject_content_changed(mapper, connection, target):
+    session = inspect(target).session
+    for subject_id in {target.subject_id, _old_value(target, 'subject_id')} - {None}:
+        emit(session, SUBJECT_CHANGED, subject_id=subject_id)
+
+
+@event.listens_for(QuestionBank, 'after_insert')
+@event.listens_for(QuestionBank, 'after_update')
+@event.listens_for(QuestionBank, 'after_delete')
+def _question_changed(mapper, connection, target):
+    session = inspect(target).session
+    for chapter_id in {target.chapter_id, _old_value(target, 'chapter_id')} - {None}:
+        subject_id = _lookup(connection, session, Chapter.subject_id, chapter_id)
+        emit(session, QUESTION_CHANGED, question_id=target.id, chapter_id=chapter_id, subject_id=subject_id)
+
+
+# Bookkeeping columns no cached view shows, login alone writes last_login on every call
+USER_BOOKKEEPING_COLUMNS = frozenset((
+    'last_login', 'updated_at', 'password_hash',
+    'email_verification_token', 'password_reset_token', 'password_reset_expires'
+))
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    emit(inspect(target).session, USER_CHANGED, user_id=target.id)
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(
+        state.attrs[column.key].history.has_changes()
+        for column in mapper.column_attrs if column.key not in USER_BOOKKEEPING_COLUMNS
+    ):
+        emit(state.session, USER_CHANGED, user_id=target.id)
+
+
+# Attempt lifecycle
+
+def _attempt_payload(connection, session: Session, attempt_type: str, target) -> Dict:
+    if attempt_type == 'mock':
+        subject_id = _lookup(connection, session, UGCNetMockTest.subject_id, target.mock_test_id)
+    else:
+        subject_id = target.subject_id
+    return {'attempt_type': attempt_type, 'attempt_id': target.id, 'user_id': target.user_id, 'subject_id': subject_id}
+
+
+def _attempt_updated(attempt_type: str, connection, target):
+    if target.status != 'completed':
+        return
+    state = inspect(target)
+    if state.attrs.status.history.has_changes():
+        name = ATTEMPT_COMPLETED
+    elif state.attrs.percentage.history.has_changes():
+        name = ATTEMPT_RESCORED
+    else:
+        return
+    emit(state.session, name, **_attempt_payload(connection, state.session, attempt_type, target))
+
+
+def _attempt_deleted(attempt_type: str, connection, target):
+    if target.status == 'completed':
+        session = inspect(target).session
+        emit(session, ATTEMPT_DELETED, **_attempt_payload(connection, session, attempt_type, target))
+
+
+@event.listens_for(UGCNetMockAttempt, 'after_update')
+def _mock_attempt_updated(mapper, connection, target):
+    _attempt_updated('mock', connection, target)
+
+
+@event.listens_for(UGCNetPracticeAttempt, 'after_update')
+def _practice_attempt_updated(mapper, connection, target):
+    _attempt_updated('practice', connection, target)
+
+
+@event.listens_for(UGCNetMockAttempt, 'after_delete')
+def _mock_attempt_deleted(mapper, connection, target):
+    _attempt_deleted('mock', connection, target)
+
+
+@event.listens_for(UGCNetPracticeAttempt, 'after_delete')
+def _practice_attempt_deleted(mapper, connection, target):
+    _attempt_deleted('practice', connection, target)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_changes(orm_execute_state):
+    # Query.update() / Query.delete() bypass the mapper events above, the
+    # affected rows are unknown so the event carries no IDs
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        name = {
+            Subject: SUBJECT_CHANGED, Chapter: SUBJECT_CHANGED, UGCNetMockTest: SUBJECT_CHANGED,
+            QuestionBank: QUESTION_CHANGED, User: USER_CHANGED
+        }.get(mapper.class_ if mapper is not None else None)
+        if name:
+            emit(orm_execute_state.session, name)
@@ -0,0 +1,323 @@
+"""
+Leaderboard Service
+Mock test leaderboards as Redis sorted sets: one per mock test, per subject
+and per IST week and month, holding every non-admin user's best attempt. A
+submit raises the user's entry in O(log n) and top-k, rank of a user and the
+users around them are read in O(log n + k). Missing boards (new, or after a
+Redis flush) are rebuilt from the database on first read, and by
+rebuild_leaderboards for all of them
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app import db, redis_client
+from app.models import UGCNetMockAttempt, UGCNetMockTest, User
+from app.utils.timezone_utils import ist_to_utc, utc_to_ist
+
+SCOPES = ('mock_test', 'subject', 'week', 'month')
+PERIOD_SCOPES = ('week', 'month')
+# Period boards are kept this long after their period ends
+PERIOD_RETENTION = timedelta(days=90)
+# Scores are the percentage (to 0.01) in units of TIME_SCALE, plus a term that
+# ranks earlier completions first among equal percentages
+TIME_SCALE = 10 ** 10
+
+Board = Tuple[str, str]
+
+
+def board_score(percentage: float, completed_at: datetime) -> float:
+    """Sorted set score of an attempt completed at a naive UTC time"""
+    seconds = int(completed_at.replace(tzinfo=timezone.utc).timestamp())
+    return int(round((percentage or 0) * 100)) * TIME_SCALE + (TIME_SCALE - 1 - seconds)
+
+
+def score_percentage(score: float) -> float:
+    return int(score) // TIME_SCALE / 100
+
+
+def period_of(scope: str, completed_at: datetime) -> str:
+    """Week ('2026-W07') or month ('2026-02') label of a naive UTC time, in IST"""
+    ist_time = utc_to_ist(completed_at)
+    if scope == 'week':
+        year, week, _ = ist_time.isocalendar()
+        return f'{year}-W{week:02d}'
+    return ist_time.strftime('%Y-%m')
+
+
+def period_bounds(scope: str, period: str) -> Tuple[datetime, datetime]:
+    """Naive UTC start and end of a week or month label, raises ValueError on a bad label"""
+    if scope == 'week':
+        start = datetime.strptime(f'{period}-1', '%G-W%V-%u')
+        end = start + timedelta(days=7)
+    else:
+        start = datetime.strptime(period, '%Y-%m')
+        end = (start + timedelta(days=32)).replace(day=1)
+    return ist_to_utc(start), ist_to_utc(end)
+
+
+class LeaderboardService:
+    """Service for the mock test leaderboards"""
+    
+    KEY_PREFIX = 'leaderboard'
+    
+    def get_key(self, board: Board) -> str:
+        return f'{self.KEY_PREFIX}:{board[0]}:{board[1]}'
+    
+    def get_details_key(self, board: Board) -> str:
+        """Hash of user ID -> the attempt behind their score"""
+        return f'{self.get_key(board)}:best'
+    
+    @staticmethod
+    def resolve_board(scope: str, scope_id: str) -> Board:
+        """Board of a scope and ID, 'current' standing for this week or month, raises ValueError"""
+        if scope not in SCOPES:
+            raise ValueError(f'Invalid leaderboard scope: {scope}')
+        try:
+            if scope in PERIOD_SCOPES:
+                if scope_id == 'current':
+                    scope_id = period_of(scope, datetime.utcnow())
+                period_bounds(scope, scope_id)
+                return scope, scope_id
+            return scope, str(int(scope_id))
+        except ValueError as e:
+            raise ValueError(f'Invalid {scope} leaderboard: {scope_id}') from e
+    
+    @staticmethod
+    def boards(attempt: UGCNetMockAttempt) -> List[Board]:
+        """Every board a completed mock attempt counts on"""
+        return [
+            ('mock_test', str(attempt.mock_test_id)),
+            ('subject', str(attempt.mock_test.subject_id)),
+            ('week', period_of('week', attempt.completed_at)),
+            ('month', period_of('month', attempt.completed_at))
+        ]
+    
+    @staticmethod
+    def _details(attempt_id: int, mock_test_id: int, completed_at: datetime) -> str:
+        return json.dumps({'attempt_id': attempt_id, 'mock_test_id': mock_test_id, 'completed_at': completed_at.isoformat()})
+    
+    def _expire_at(self, board: Board) -> Optional[int]:
+        if board[0] not in PERIOD_SCOPES:
+            return None
+        end = period_bounds(*board)[1]
+        return int((end + PERIOD_RETENTION).replace(tzinfo=timezone.utc).timestamp())
+    
+    # Updates
+    
+    def record(self, attempts: Iterable[UGCNetMockAttempt]):
+        """Raise the users' entries to newly completed attempts that beat their best, after the commit"""
+        entries = []
+        for attempt in attempts:
+            user = db.session.get(User, attempt.user_id)
+            if attempt.completed_at and user and not user.is_admin:
+                score = board_score(attempt.percentage, attempt.completed_at)
+                details = self._details(attempt.id, attempt.mock_test_id, attempt.completed_at)
+                entries.extend((board, str(attempt.user_id), score, details) for board in self.boards(attempt))
+        if not entries:
+            return
+        
+        try:
+            if redis_client:
+                # Boards missing from Redis are rebuilt from the database on their next read
+                pipeline = redis_client.pipeline()
+                for board, _, _, _ in entries:
+                    pipeline.exists(self.get_key(board))
+                entries = [entry for entry, exists in zip(entries, pipeline.execute()) if exists]
+                
+                pipeline = redis_client.pipeline()
+                for board, member, score, _ in entries:
+                    pipeline.zadd(self.get_key(board), {member: score}, gt=True, ch=True)
+                changed = pipeline.execute()
+                
+                pipeline = redis_client.pipeline()
+                for (board, member, _, details), raised in zip(entries, changed):
+                    if raised:
+                        pipeline.hset(self.get_details_key(board), member, details)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis leaderboard error: {redis_error}")
+    
+    def refresh(self, user_boards: Iterable[Tuple[int, List[Board]]]):
+        """Recompute users' entries on boards after their attempts were deleted or re-scored, after the commit"""
+        pairs = {(user_id, board) for user_id, boards in user_boards for board in boards}
+        try:
+            if not redis_client:
+                return
+            for user_id, board in pairs:
+                key = self.get_key(board)
+                if not redis_client.exists(key):
+                    continue
+                best = self._best_attempts(board, user_id=user_id)
+                pipeline = redis_client.pipeline()
+                if best:
+                    attempt_id, mock_test_id, percentage, completed_at = best[0][1:]
+                    pipeline.zadd(key, {str(user_id): board_score(percentage, completed_at)})
+                    pipeline.hset(self.get_details_key(board), str(user_id), self._details(attempt_id, mock_test_id, completed_at))
+                else:
+                    pipeline.zrem(key, str(user_id))
+                    pipeline.hdel(self.get_details_key(board), str(user_id))
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis leaderboard error: {redis_error}")
+    
+    def _best_attempts(self, board: Board, user_id: Optional[int] = None) -> List[Tuple]:
+        """(user ID, attempt ID, mock test ID, percentage, completed_at) of each non-admin user's best attempt on a board"""
+        query = db.session.query(
+            UGCNetMockAttempt.user_id, UGCNetMockAttempt.id, UGCNetMockAttempt.mock_test_id,
+            UGCNetMockAttempt.percentage, UGCNetMockAttempt.completed_at
+        ).join(User, User.id == UGCNetMockAttempt.user_id).filter(
+            UGCNetMockAttempt.status == 'completed',
+            UGCNetMockAttempt.completed_at.isnot(None),
+            User.is_admin == False
+        )
+        
+        scope, scope_id = board
+        if scope == 'mock_test':
+            query = query.filter(UGCNetMockAttempt.mock_test_id == int(scope_id))
+        elif scope == 'subject':
+            query = query.join(UGCNetMockTest, UGCNetMockTest.id == UGCNetMockAttempt.mock_test_id).filter(
+                UGCNetMockTest.subject_id == int(scope_id)
+            )
+        else:
+            start, end = period_bounds(scope, scope_id)
+            query = query.filter(UGCNetMockAttempt.completed_at >= start, UGCNetMockAttempt.completed_at < end)
+        if user_id is not None:
+            query = query.filter(UGCNetMockAttempt.user_id == user_id)
+        
+        # Picked with the sorted set's own score so a rebuild ranks exactly like submits do,
+        # the first attempt to reach a score keeps it
+        best = {}
+        for row in query.order_by(UGCNetMockAttempt.id).yield_per(1000):
+            score = board_score(row.percentage, row.completed_at)
+            if row.user_id not in best or score > best[row.user_id][0]:
+                best[row.user_id] = (score, tuple(row))
+        return [row for _, row in best.values()]
+    
+    def rebuild(self, board: Board) -> int:
+        """Rebuild a board from the database, returns its number of users"""
+        best = self._best_attempts(board)
+        try:
+            if redis_client:
+                key, details_key = self.get_key(board), self.get_details_key(board)
+                pipeline = redis_client.pipeline()
+                pipeline.delete(key, details_key)
+                if best:
+                    pipeline.zadd(key, {
+                        str(user_id): board_score(percentage, completed_at)
+                        for user_id, _, _, percentage, completed_at in best
+                    })
+                    pipeline.hset(details_key, mapping={
+                        str(user_id): self._details(attempt_id, mock_test_id, completed_at)
+                        for user_id, attempt_id, mock_test_id, _, completed_at in best
+                    })
+                    expire_at = self._expire_at(board)
+                    if expire_at:
+                        pipeline.expireat(key, expire_at)
+                        pipeline.expireat(details_key, expire_at)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis leaderboard error: {redis_error}")
+        return len(best)
+    
+    def rebuild_all(self) -> int:
+        """Rebuild every mock test and subject board and the period boards still retained, returns the board count"""
+        boards = [('mock_test', str(test_id)) for (test_id,) in db.session.query(UGCNetMockTest.id)]
+        boards += [
+            ('subject', str(subject_id))
+            for (subject_id,) in db.session.query(UGCNetMockTest.subject_id).distinct()
+        ]
+        
+        retained_since = datetime.utcnow() - PERIOD_RETENTION - timedelta(days=31)
+        periods = set()
+        for (completed_at,) in db.session.query(UGCNetMockAttempt.completed_at).filter(
+            UGCNetMockAttempt.status == 'completed',
+            UGCNetMockAttempt.completed_at >= retained_since
+        ):
+            periods.update((scope, period_of(scope, completed_at)) for scope in PERIOD_SCOPES)
+        now = datetime.utcnow()
+        boards += [board for board in sorted(periods) if period_bounds(*board)[1] + PERIOD_RETENTION > now]
+        
+        for board in boards:
+            self.rebuild(board)
+        return len(boards)
+    
+    # Queries
+    
+    def _ensure(self, board: Board) -> bool:
+        """Whether the board is in Redis, rebuilding it when missing"""
+        if not redis_client:
+            return False
+        if not redis_client.exists(self.get_key(board)):
+            self.rebuild(board)
+        return True
+    
+    def _entries(self, board: Board, start: int, members: List[Tuple[bytes, float]]) -> List[Dict]:
+        """Leaderboard rows of (member, score) pairs ranked from start + 1"""
+        if not members:
+            return []
+        user_ids = [int(member) for member, _ in members]
+        details = redis_client.hmget(self.get_details_key(board), [str(user_id) for user_id in user_ids])
+        details = [json.loads(detail) if detail else {} for detail in details]
+        names = dict(db.session.query(User.id, User.full_name).filter(User.id.in_(user_ids)).all())
+        test_ids = {detail.get('mock_test_id') for detail in details} - {None}
+        titles = dict(
+            db.session.query(UGCNetMockTest.id, UGCNetMockTest.title).filter(UGCNetMockTest.id.in_(test_ids)).all()
+        ) if test_ids else {}
+        
+        return [
+            {
+                'rank': start + position + 1,
+                'user_id': user_id,
+                'user_name': names.get(user_id),
+                'percentage': score_percentage(score),
+                'attempt_id': detail.get('attempt_id'),
+                'mock_test_id': detail.get('mock_test_id'),
+                'mock_test_title': titles.get(detail.get('mock_test_id')),
+                'completed_at': detail.get('completed_at')
+            }
+            for position, (user_id, (_, score), detail) in enumerate(zip(user_ids, members, details))
+        ]
+    
+    def get_top(self, board: Board, limit: int = 10) -> List[Dict]:
+        """The board's best limit users"""
+        try:
+            if self._ensure(board):
+                members = redis_client.zrevrange(self.get_key(board), 0, limit - 1, withscores=True)
+                return self._entries(board, 0, members)
+        except Exception as redis_error:
+            print(f"Redis leaderboard error: {redis_error}")
+        return []
+    
+    def get_standing(self, board: Board, user_id: int, radius: int = 2) -> Optional[Dict]:
+        """A user's rank and the users right around them, None when they are not on the board"""
+        try:
+            if self._ensure(board):
+                key = self.get_key(board)
+                pipeline = redis_client.pipeline()
+                pipeline.zrevrank(key, str(user_id))
+                pipeline.zcard(key)
+                index, total = pipeline.execute()
+                if index is None:
+                    return None
+                start = max(index - radius, 0)
+                members = redis_client.zrevrange(key, start, index + radius, withscores=True)
+                neighbors = self._entries(board, start, members)
+                return {
+                    'rank': index + 1,
+                    'total': total,
+                    'percentage': neighbors[index - start]['percentage'],
+                    'neighbors': neighbors
+                }
+        except Exception as redis_error:
+            print(f"Redis leaderboard error: {redis_error}")
+        return None
+    
+    def get_size(self, board: Board) -> int:
+        try:
+            if self._ensure(board):
+                return redis_client.zcard(self.get_key(board))
+        except Exception as redis_error:
+            print(f"Redis leaderboard error: {redis_error}")
+        return 0
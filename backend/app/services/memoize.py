@@ -0,0 +1,366 @@
+"""
+Memoize
+Two-tier cache for expensive service methods that are pure functions of their
+arguments for a while: a small in-process LRU in front of Redis.
+
+- Every Redis entry records when it logically expires and how long it took to
+  compute. Readers refresh it early with a probability that rises as expiry
+  nears and with the compute time (XFetch), so a popular key is usually
+  recomputed by one request before it expires instead of by all of them after.
+- Recomputation is single flight: one thread per process and one process per
+  key (a Redis NX lock) computes while the others keep serving the previous
+  value, which outlives its logical expiry by stale_ttl for this. Without a
+  previous value they wait for the result up to lock_timeout.
+- Keys can be invalidated through the cache registry by domain events. The
+  local tier of other processes is not told and serves its copy for at most
+  local_ttl seconds, keep it short. Invalidation bumps a generation counter
+  of the key (of the whole function for wildcard invalidations) and a refresh
+  only writes its result if the generations it started from are unchanged, so
+  a value computed from data read before an invalidation is never stored.
+- Values go through JSON like every other cache here, cached and fresh calls
+  both return a decoded copy the caller may modify.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, Iterable, Optional
+
+from redis.exceptions import WatchError
+
+from app import redis_client
+from app.services.cache_registry import cache_registry
+
+KEY_PREFIX = 'memo'
+
+# Stats of every memoized function in this process, by function name
+_stats: Dict[str, 'MemoStats'] = {}
+
+
+class MemoStats:
+    """Hit and miss counters of a memoized function in this process"""
+    
+    FIELDS = ('local_hits', 'redis_hits', 'misses', 'early_refreshes', 'stale_served', 'lock_waits', 'errors')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+    
+    def incr(self, field: str):
+        with self._lock:
+            self.counts[field] += 1
+    
+    def to_dict(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts['local_hits'] + counts['redis_hits'] + counts['misses']
+        counts['hit_rate'] = round((lookups - counts['misses']) / lookups * 100, 1) if lookups else None
+        return counts
+
+
+def get_memo_stats() -> Dict[str, Dict]:
+    """Counters of every memoized function in this process"""
+    return {name: stats.to_dict() for name, stats in sorted(_stats.items())}
+
+
+class LocalCache:
+    """Thread-safe LRU of serialized entries with a per-entry deadline"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            deadline, payload = entry
+            if deadline <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+    
+    def set(self, key: str, payload: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def discard(self, keys: Iterable[str] = (), patterns: Iterable[str] = ()):
+        patterns = list(patterns)
+        with self._lock:
+            for key in list(self._entries):
+                if key in keys or any(fnmatchcase(key, pattern) for pattern in patterns):
+                    del self._entries[key]
+
+
+class Memoized:
+    """A function wrapped by memoize, see the module docstring"""
+    
+    # Striped per-key locks, so threads of a process compute a key once
+    LOCK_STRIPES = 64
+    
+    def __init__(self, func: Callable, ttl: int, key: Optional[str], local_ttl: float, maxsize: int,
+                 stale_ttl: Optional[int], beta: float, lock_timeout: int, invalidate_on: Iterable[str]):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.stale_ttl = ttl if stale_ttl is None else stale_ttl
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.signature = inspect.signature(func)
+        self.skip_self = next(iter(self.signature.parameters), None) in ('self', 'cls')
+        self.key_template = f'{KEY_PREFIX}:{key}' if key else None
+        # Glob matching every key of the template, to spot invalidations that concern this function
+        self.key_glob = re.sub(r'\{[^}]*\}', '*', self.key_template) if key else None
+        self.index_key = f'{KEY_PREFIX}:index:{self.name}'
+        self.generation_key = f'{KEY_PREFIX}:generation:{self.name}'
+        self.local = LocalCache(maxsize)
+        self.stats = _stats.setdefault(self.name, MemoStats())
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        
+        if invalidate_on:
+            if not self.key_template:
+                raise ValueError('memoize needs a key template to be invalidated by events')
+            cache_registry.register(self.key_template, *invalidate_on, index_key=self.index_key)
+            cache_registry.add_listener(self._on_invalidate)
+        
+        functools.update_wrapper(self, func)
+    
+    def __get__(self, instance, owner):
+        # Bind like a plain function when used as a method
+        if instance is None:
+            return self
+        return functools.partial(self.__call__, instance)
+    
+    def make_key(self, *args, **kwargs) -> str:
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        if self.skip_self:
+            arguments.pop(next(iter(self.signature.parameters)))
+        if self.key_template:
+            return self.key_template.format(**arguments)
+        digest = hashlib.sha1(json.dumps(arguments, sort_keys=True, default=str).encode()).hexdigest()
+        return f'{KEY_PREFIX}:{self.name}:{digest}'
+    
+    def __call__(self, *args, **kwargs):
+        key = self.make_key(*args, **kwargs)
+        
+        payload = self.local.get(key)
+        if payload is not None:
+            self.stats.incr('local_hits')
+            return json.loads(payload)['value']
+        
+        envelope = self._read(key)
+        if envelope is not None and not self._should_refresh(envelope):
+            self.stats.incr('redis_hits')
+            return self._serve(key, envelope)
+        
+        lock = self._locks[hash(key) % self.LOCK_STRIPES]
+        if not lock.acquire(blocking=envelope is None):
+            # Another thread of this process is already refreshing it
+            self.stats.incr('stale_served')
+            return self._serve(key, envelope)
+        try:
+            if envelope is None:
+                # It may have been computed while this thread waited for the lock
+                payload = self.local.get(key)
+                if payload is not None:
+                    self.stats.incr('local_hits')
+                    return json.loads(payload)['value']
+            return self._refresh(key, envelope, args, kwargs)
+        finally:
+            lock.release()
+    
+    def _refresh(self, key: str, envelope: Optional[Dict], args, kwargs):
+        token = self._acquire(key)
+        if token is None:
+            if envelope is not None:
+                # Another process is refreshing it, the current value is still good to serve
+                self.stats.incr('stale_served')
+                return self._serve(key, envelope)
+            self.stats.incr('lock_waits')
+            envelope = self._wait(key)
+            if envelope is not None:
+                self.stats.incr('redis_hits')
+                return self._serve(key, envelope)
+        
+        if envelope is not None:
+            self.stats.incr('early_refreshes')
+        self.stats.incr('misses')
+        try:
+            generations = self._read_generations(key)
+            started = time.time()
+            value = self.func(*args, **kwargs)
+            envelope = {'value': value, 'expires_at': time.time() + self.ttl, 'delta': time.time() - started}
+            payload = json.dumps(envelope, default=str)
+            if self._write(key, payload, generations):
+                self.local.set(key, payload, self.local_ttl)
+            return json.loads(payload)['value']
+        finally:
+            if token:
+                self._release(key, token)
+    
+    def _serve(self, key: str, envelope: Dict):
+        self.local.set(key, json.dumps(envelope, default=str), min(self.local_ttl, self._remaining(envelope)))
+        return envelope['value']
+    
+    @staticmethod
+    def _remaining(envelope: Dict) -> float:
+        return max(envelope['expires_at'] - time.time(), 0)
+    
+    def _should_refresh(self, envelope: Dict) -> bool:
+        # XFetch: refresh early with probability growing as expiry nears,
+        # scaled by how long the value takes to compute
+        jitter = envelope['delta'] * self.beta * -math.log(1.0 - random.random())
+        return time.time() + jitter >= envelope['expires_at']
+    
+    def _read(self, key: str) -> Optional[Dict]:
+        try:
+            if redis_client:
+                payload = redis_client.get(key)
+                if payload:
+                    return json.loads(payload)
+        except Exception as redis_error:
+            self.stats.incr('errors')
+            print(f"Redis memoize error: {redis_error}")
+        return None
+    
+    def _generation_keys(self, key: str):
+        return f'{key}:generation', self.generation_key
+    
+    def _read_generations(self, key: str) -> Optional[list]:
+        try:
+            if redis_client:
+                return redis_client.mget(self._generation_keys(key))
+        except Exception as redis_error:
+            self.stats.incr('errors')
+            print(f"Redis memoize error: {redis_error}")
+        return None
+    
+    def _write(self, key: str, payload: str, generations: Optional[list]) -> bool:
+        """Store a computed value unless the key was invalidated since it was computed, returns whether it was stored"""
+        try:
+            if redis_client:
+                generation_keys = self._generation_keys(key)
+                with redis_client.pipeline() as pipeline:
+                    # Any invalidation between this check and EXEC aborts the write
+                    pipeline.watch(*generation_keys)
+                    if generations is None or pipeline.mget(generation_keys) != generations:
+                        return False
+                    pipeline.multi()
+                    pipeline.setex(key, self.ttl + self.stale_ttl, payload)
+                    pipeline.sadd(self.index_key, key)
+                    pipeline.expire(self.index_key, self.ttl + self.stale_ttl)
+                    pipeline.execute()
+        except WatchError:
+            return False
+        except Exception as redis_error:
+            self.stats.incr('errors')
+            print(f"Redis memoize error: {redis_error}")
+        return True
+    
+    def _bump_generations(self, keys: Iterable[str], whole_function: bool = False):
+        """Make in-flight refreshes of these keys (or of every key) drop their result, before the keys are deleted"""
+        try:
+            if redis_client:
+                pipeline = redis_client.pipeline()
+                for key in keys:
+                    generation_key = f'{key}:generation'
+                    pipeline.incr(generation_key)
+                    pipeline.expire(generation_key, self.ttl + self.stale_ttl)
+                if whole_function:
+                    pipeline.incr(self.generation_key)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis memoize error: {redis_error}")
+    
+    def _on_invalidate(self, keys, patterns):
+        self.local.discard(keys, patterns)
+        own_keys = [key for key in keys if fnmatchcase(key, self.key_glob)]
+        # A pattern's '*' fields are literal here and match the template's '*' fields
+        wildcard = any(fnmatchcase(pattern, self.key_glob) for pattern in patterns)
+        if own_keys or wildcard:
+            self._bump_generations(own_keys, whole_function=wildcard)
+    
+    def _acquire(self, key: str) -> Optional[str]:
+        """Take the recompute lock of a key, '' when Redis is unavailable (compute locally), None when held"""
+        token = uuid.uuid4().hex
+        try:
+            if redis_client:
+                if redis_client.set(f'{key}:lock', token, nx=True, ex=self.lock_timeout):
+                    return token
+                return None
+        except Exception as redis_error:
+            self.stats.incr('errors')
+            print(f"Redis memoize error: {redis_error}")
+        return ''
+    
+    def _release(self, key: str, token: str):
+        try:
+            if redis_client:
+                lock_key = f'{key}:lock'
+                # A lock that timed out may have been taken by another process since
+                current = redis_client.get(lock_key)
+                if current and current.decode() == token:
+                    redis_client.delete(lock_key)
+        except Exception as redis_error:
+            print(f"Redis memoize error: {redis_error}")
+    
+    def _wait(self, key: str) -> Optional[Dict]:
+        """Wait for the lock holder's result, None if it does not show up in time"""
+        deadline = time.time() + self.lock_timeout
+        delay = 0.02
+        while time.time() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            envelope = self._read(key)
+            if envelope is not None and self._remaining(envelope) > 0:
+                return envelope
+            try:
+                if redis_client and not redis_client.exists(f'{key}:lock'):
+                    return None
+            except Exception:
+                return None
+        return None
+    
+    def invalidate(self, *args, **kwargs):
+        """Drop the cached value for these arguments"""
+        key = self.make_key(*args, **kwargs)
+        self.local.discard([key])
+        self._bump_generations([key])
+        try:
+            if redis_client:
+                redis_client.delete(key)
+        except Exception as redis_error:
+            print(f"Redis memoize error: {redis_error}")
+
+
+def memoize(ttl: int, key: Optional[str] = None, local_ttl: float = 5, maxsize: int = 128,
+            stale_ttl: Optional[int] = None, beta: float = 1.0, lock_timeout: int = 30,
+            invalidate_on: Iterable[str] = ()):
+    """
+    Cache a function's results for ttl seconds in process and in Redis
+    
+    key is a template over the function's arguments, e.g.
+    'user_metrics:{user_id}:{days}' (default: a hash of all arguments), and is
+    required for invalidate_on, the domain events that drop the cached value.
+    """
+    def decorator(func):
+        return Memoized(func, ttl, key, local_ttl, maxsize, stale_ttl, beta, lock_timeout, invalidate_on)
+    return decorator
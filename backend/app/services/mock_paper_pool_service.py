@@ -0,0 +1,170 @@
+"""
+Mock Paper Pool Service
+Keeps ready-made papers per active mock test in Redis so that starting an
+attempt only has to claim one instead of generating it inside the request
+"""
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from app import redis_client
+from app.models import UGCNetMockTest
+from app.services.question_pool_index import BANK_VERSION_KEY
+from app.services.ugc_net_paper_generator import UGCNetPaperGenerator
+
+
+# Mock test columns that change the papers a test produces
+PAPER_CONFIG_COLUMNS = (
+    'subject_id', 'paper_type', 'total_questions',
+    'easy_percentage', 'medium_percentage', 'hard_percentage',
+    'previous_year_percentage', 'ai_generated_percentage',
+    'weightage_config', 'is_active'
+)
+
+
+def build_paper_config(mock_test):
+    """Build the paper generator configuration for a mock test"""
+    return {
+        'subject_id': mock_test.subject_id,
+        'paper_type': mock_test.paper_type,
+        'total_questions': mock_test.total_questions,
+        'difficulty_distribution': {
+            'easy': mock_test.easy_percentage,
+            'medium': mock_test.medium_percentage,
+            'hard': mock_test.hard_percentage
+        },
+        'source_distribution': {
+            'previous_year': mock_test.previous_year_percentage,
+            'ai_generated': mock_test.ai_generated_percentage,
+            'manual': 100 - mock_test.previous_year_percentage - mock_test.ai_generated_percentage
+        },
+        'weightage_config': mock_test.get_weightage_config()
+    }
+
+
+class MockPaperPoolService:
+    """Service for the pre-generated mock test paper pool"""
+    
+    KEY_PREFIX = 'mock_paper_pool'
+    REFILL_LOCK_PREFIX = 'mock_paper_pool_refill'
+    
+    def __init__(self):
+        self.pool_size = current_app.config.get('MOCK_PAPER_POOL_SIZE', 20)
+        self.low_water_mark = current_app.config.get('MOCK_PAPER_POOL_LOW_WATER', 5)
+        self.pool_ttl = 24 * 60 * 60  # Unused pools of retired configurations expire after a day
+    
+    def get_pool_key(self, mock_test) -> str:
+        """Pool key for a mock test, fingerprinted by its paper configuration"""
+        config_json = json.dumps(build_paper_config(mock_test), sort_keys=True, default=str)
+        fingerprint = hashlib.sha1(config_json.encode()).hexdigest()[:12]
+        return f'{self.KEY_PREFIX}:{mock_test.id}:{fingerprint}'
+    
+    def claim_paper(self, mock_test) -> Optional[Dict]:
+        """
+        Atomically claim one ready-made paper for a mock test
+        
+        Returns a dict with question_ids, statistics, seed and bank_version, or None when the pool is empty,
+        was built from an older question bank or Redis is unavailable, in which case the caller generates
+        the paper inline.
+        """
+        try:
+            if not redis_client:
+                return None
+            
+            pool_key = self.get_pool_key(mock_test)
+            pipeline = redis_client.pipeline()
+            pipeline.get(BANK_VERSION_KEY)
+            pipeline.lpop(pool_key)
+            pipeline.llen(pool_key)
+            bank_version, payload, remaining = pipeline.execute()
+            
+            paper = json.loads(payload) if payload else None
+            if paper and paper.get('bank_version') != int(bank_version or 0):
+                # Drop the whole pool rather than failing one claim per stale paper, the refill rebuilds it
+                redis_client.delete(pool_key)
+                paper, remaining = None, 0
+        except Exception as redis_error:
+            print(f"Redis paper pool error: {redis_error}")
+            return None
+        
+        if remaining < self.low_water_mark:
+            self.request_refill(mock_test.id)
+        
+        return paper
+    
+    def fill_pool(self, mock_test) -> int:
+        """Generate papers until the pool of a mock test is full, returns the number added"""
+        if not redis_client or not mock_test.is_active:
+            return 0
+        
+        pool_key = self.get_pool_key(mock_test)
+        missing = self.pool_size - redis_client.llen(pool_key)
+        if missing <= 0:
+            return 0
+        
+        generator = UGCNetPaperGenerator()
+        config = build_paper_config(mock_test)
+        
+        papers = []
+        for _ in range(missing):
+            result = generator.generate_paper(config)
+            if not result['success']:
+                print(f"Paper pool generation failed for mock test {mock_test.id}: {result['error']}")
+                break
+            papers.append(json.dumps({
+                'question_ids': self._get_question_ids(result['paper']['questions']),
+                'statistics': result['statistics'],
+                'seed': result['seed'],
+                'bank_version': result['bank_version']
+            }))
+        
+        if papers:
+            pipeline = redis_client.pipeline()
+            pipeline.rpush(pool_key, *papers)
+            pipeline.expire(pool_key, self.pool_ttl)
+            pipeline.execute()
+        
+        return len(papers)
+    
+    def request_refill(self, mock_test_id: int):
+        """Ask a Celery worker to refill a pool, at most once per minute per mock test"""
+        try:
+            if not redis_client.set(f'{self.REFILL_LOCK_PREFIX}:{mock_test_id}', 1, nx=True, ex=60):
+                return
+            
+            from app import celery_app
+            if celery_app:
+                celery_app.send_task('app.tasks.refill_mock_paper_pools', args=[mock_test_id])
+        except Exception as e:
+            print(f"Paper pool refill request error: {e}")
+    
+    @staticmethod
+    def invalidate(mock_test_id: int):
+        """Drop every pooled paper of a mock test"""
+        try:
+            if redis_client:
+                keys = list(redis_client.scan_iter(f'{MockPaperPoolService.KEY_PREFIX}:{mock_test_id}:*'))
+                if keys:
+                    redis_client.delete(*keys)
+        except Exception as redis_error:
+            print(f"Redis paper pool invalidation error: {redis_error}")
+    
+    def _get_question_ids(self, questions) -> List[int]:
+        return [q.id if hasattr(q, 'id') else q.get('id') for q in questions]
+
+
+@event.listens_for(UGCNetMockTest, 'after_update')
+def _invalidate_pool_on_config_change(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in PAPER_CONFIG_COLUMNS):
+        # Stale pools are never read again because the key fingerprint changed,
+        # dropping them here just frees the memory early
+        MockPaperPoolService.invalidate(target.id)
+
+
+@event.listens_for(UGCNetMockTest, 'after_delete')
+def _invalidate_pool_on_delete(mapper, connection, target):
+    MockPaperPoolService.invalidate(target.id)
@@ -0,0 +1,265 @@
+"""
+Paper Assembler
+Solves the chapter x difficulty x source allocation of a paper in one pass over
+in-memory candidate IDs, so generators no longer query the bank cell by cell
+"""
+
+import random
+from typing import Container, Dict, Iterable, List, Optional, Tuple
+
+# (difficulty, source)
+Cell = Tuple[str, str]
+
+
+def apportion(total: int, weights: List[float], capacities: Optional[List[int]] = None) -> List[int]:
+    """
+    Split a whole number across weights with the largest remainder method
+    
+    When capacities are given no share exceeds its capacity; whatever cannot be
+    placed is handed to the remaining slots in proportion to their weights.
+    """
+    shares = [0] * len(weights)
+    if total <= 0 or not weights:
+        return shares
+    
+    if capacities is None:
+        capacities = [total] * len(weights)
+    
+    remaining = min(total, sum(capacities))
+    while remaining > 0:
+        open_slots = [i for i, w in enumerate(weights) if w > 0 and shares[i] < capacities[i]]
+        if not open_slots:
+            break
+        
+        weight_sum = sum(weights[i] for i in open_slots)
+        quotas = {i: remaining * weights[i] / weight_sum for i in open_slots}
+        floors = {i: min(int(quotas[i]), capacities[i] - shares[i]) for i in open_slots}
+        
+        placed = sum(floors.values())
+        for i in open_slots:
+            shares[i] += floors[i]
+        
+        # Hand out the leftover seats by largest fractional remainder, ties go to the earlier slot
+        by_remainder = sorted(
+            (i for i in open_slots if shares[i] < capacities[i]),
+            key=lambda i: (-(quotas[i] - int(quotas[i])), i)
+        )
+        for i in by_remainder[:remaining - placed]:
+            shares[i] += 1
+            placed += 1
+        
+        if placed == 0:
+            break
+        remaining -= placed
+    
+    return shares
+
+
+class PaperAssembler:
+    """
+    Allocates chapter quotas over difficulty and source cells and samples the IDs
+    
+    Cell targets come from the product of the difficulty and source weights.
+    Cells that run short are backfilled, in order, from the same difficulty with
+    another source, the same source with another difficulty, any cell of the
+    chapter, and finally other chapters. Every backfill is reported as a
+    relaxed constraint.
+    """
+    
+    def __init__(self, difficulty_distribution: Dict[str, float], source_distribution: Dict[str, float]):
+        self.difficulty_distribution = difficulty_distribution
+        self.source_distribution = source_distribution
+        self.cells: List[Cell] = [
+            (difficulty, source)
+            for difficulty in difficulty_distribution
+            for source in source_distribution
+        ]
+        self.cell_weights = [
+            difficulty_distribution[difficulty] * source_distribution[source]
+            for difficulty, source in self.cells
+        ]
+    
+    def cell_targets(self, quota: int) -> Dict[Cell, int]:
+        """Ideal number of questions per cell for a chapter quota"""
+        weights = self.cell_weights
+        if not any(w > 0 for w in weights):
+            weights = [1] * len(self.cells)
+        return dict(zip(self.cells, apportion(quota, weights)))
+    
+    def allocate(self, chapter_quotas: Dict[int, int], inventory: Dict[int, Dict[Cell, int]],
+                 reserve_inventory: Optional[Dict[int, Dict[Cell, int]]] = None) -> Dict:
+        """
+        Solve the allocation from per-cell inventory counts
+        
+        reserve_inventory holds stock that is only drawn on once the regular
+        inventory of a cell, its chapter and finally the whole paper is exhausted.
+        
+        Returns a dict with the per-chapter cell allocation (regular and
+        reserve), the list of relaxed constraints and the total shortfall that
+        could not be placed.
+        """
+        reserve_inventory = reserve_inventory or {}
+        allocation: Dict[int, Dict[Cell, int]] = {}
+        reserve_allocation: Dict[int, Dict[Cell, int]] = {chapter_id: {} for chapter_id in chapter_quotas}
+        relaxations = []
+        unplaced: Dict[Cell, int] = {}
+        
+        for chapter_id, quota in chapter_quotas.items():
+            capacity = inventory.get(chapter_id, {})
+            reserve_capacity = reserve_inventory.get(chapter_id, {})
+            targets = self.cell_targets(quota)
+            
+            chapter_alloc = {cell: min(target, capacity.get(cell, 0)) for cell, target in targets.items()}
+            allocation[chapter_id] = chapter_alloc
+            
+            shortages = {cell: target - chapter_alloc[cell] for cell, target in targets.items()}
+            for cell, short in shortages.items():
+                if not short:
+                    continue
+                
+                difficulty, source = cell
+                for relaxed, alloc, stock, matches in (
+                    ('source_distribution', chapter_alloc, capacity, lambda c: c[0] == difficulty),
+                    ('difficulty_distribution', chapter_alloc, capacity, lambda c: c[1] == source),
+                    ('difficulty_and_source_distribution', chapter_alloc, capacity, lambda c: True),
+                    ('avoided_questions', reserve_allocation[chapter_id], reserve_capacity, lambda c: c == cell)
+                ):
+                    short -= self._relax(relaxations, relaxed, chapter_id, cell, alloc, stock, short, matches)
+                    if not short:
+                        break
+                
+                if short:
+                    unplaced[cell] = unplaced.get(cell, 0) + short
+        
+        # Chapters that ran dry hand their deficit to chapters that still have stock,
+        # largest quotas first so the weightage shape is disturbed as little as possible
+        donors = sorted(chapter_quotas, key=lambda ch_id: (-chapter_quotas[ch_id], ch_id))
+        shortfall = 0
+        for cell, short in unplaced.items():
+            for relaxed, allocations, stocks, matches in (
+                ('chapter_distribution', allocation, inventory, lambda c: c == cell),
+                ('chapter_distribution', allocation, inventory, lambda c: True),
+                ('avoided_questions', reserve_allocation, reserve_inventory, lambda c: True)
+            ):
+                for chapter_id in donors:
+                    if not short:
+                        break
+                    short -= self._relax(
+                        relaxations, relaxed, chapter_id, cell,
+                        allocations[chapter_id], stocks.get(chapter_id, {}), short, matches
+                    )
+            shortfall += short
+        
+        return {
+            'allocation': allocation,
+            'reserve_allocation': reserve_allocation,
+            'relaxations': relaxations,
+            'shortfall': shortfall
+        }
+    
+    def assemble(self, chapter_quotas: Dict[int, int], candidates: Dict[int, Dict[Cell, List[int]]],
+                 rng: Optional[random.Random] = None, exclude_ids: Optional[Iterable[int]] = None,
+                 avoid_ids: Optional[Container] = None) -> Dict:
+        """
+        Allocate the quotas and sample question IDs from the candidate pools
+        
+        candidates maps chapter_id -> {(difficulty, source): [question IDs]}.
+        exclude_ids are never selected; avoid_ids (any container supporting
+        `in`) are only selected when nothing else can fill the paper.
+        Returns the allocate() result plus the selected IDs per chapter.
+        """
+        rng = rng or random.Random()
+        exclude = self._as_lookup(exclude_ids)
+        avoid = self._as_lookup(avoid_ids)
+        
+        if exclude:
+            candidates = self._split_candidates(candidates, exclude)[0]
+        
+        reserve_candidates = {}
+        if avoid:
+            candidates, reserve_candidates = self._split_candidates(candidates, avoid)
+        
+        result = self.allocate(
+            chapter_quotas, self._count_candidates(candidates), self._count_candidates(reserve_candidates)
+        )
+        
+        selected_ids: Dict[int, List[int]] = {}
+        for chapter_id in chapter_quotas:
+            chapter_ids = []
+            for pools, cells in (
+                (candidates, result['allocation'][chapter_id]),
+                (reserve_candidates, result['reserve_allocation'][chapter_id])
+            ):
+                for cell in sorted(cells, key=self._cell_sort_key):
+                    count = cells[cell]
+                    if count:
+                        chapter_ids.extend(rng.sample(pools[chapter_id][cell], count))
+            selected_ids[chapter_id] = chapter_ids
+        
+        result['selected_ids'] = selected_ids
+        return result
+    
+    def _relax(self, relaxations: List[Dict], constraint: str, chapter_id: int, cell: Cell,
+               chapter_alloc: Dict[Cell, int], capacity: Dict[Cell, int], needed: int, matches) -> int:
+        """Backfill a deficit and record the relaxed constraint, returns the number placed"""
+        moved = self._backfill(chapter_alloc, capacity, needed, matches)
+        if moved:
+            relaxations.append({
+                'constraint': constraint,
+                'chapter_id': chapter_id,
+                'difficulty': cell[0],
+                'source': cell[1],
+                'count': moved
+            })
+        return moved
+    
+    def _backfill(self, chapter_alloc: Dict[Cell, int], capacity: Dict[Cell, int],
+                  needed: int, matches) -> int:
+        """Spread a deficit over matching cells in proportion to their spare stock"""
+        spare_cells = sorted(
+            (cell for cell in capacity if matches(cell) and capacity[cell] > chapter_alloc.get(cell, 0)),
+            key=self._cell_sort_key
+        )
+        if not spare_cells:
+            return 0
+        
+        spare = [capacity[cell] - chapter_alloc.get(cell, 0) for cell in spare_cells]
+        shares = apportion(needed, spare, spare)
+        for cell, share in zip(spare_cells, shares):
+            if share:
+                chapter_alloc[cell] = chapter_alloc.get(cell, 0) + share
+        return sum(shares)
+    
+    def _as_lookup(self, ids) -> Optional[Container]:
+        # Lists and other plain iterables become a set; sets and bitmap views are used as they are
+        if not ids:
+            return None
+        if isinstance(ids, (list, tuple)) or not isinstance(ids, Container):
+            return set(ids)
+        return ids
+    
+    def _split_candidates(self, candidates: Dict[int, Dict[Cell, List[int]]], ids: Container):
+        """Split candidate pools into (IDs not in ids, IDs in ids)"""
+        kept, removed = {}, {}
+        for chapter_id, cells in candidates.items():
+            kept[chapter_id], removed[chapter_id] = {}, {}
+            for cell, pool in cells.items():
+                kept_ids, removed_ids = [], []
+                for q_id in pool:
+                    (removed_ids if q_id in ids else kept_ids).append(q_id)
+                kept[chapter_id][cell] = kept_ids
+                removed[chapter_id][cell] = removed_ids
+        return kept, removed
+    
+    def _count_candidates(self, candidates: Dict[int, Dict[Cell, List[int]]]) -> Dict[int, Dict[Cell, int]]:
+        return {
+            chapter_id: {cell: len(ids) for cell, ids in cells.items()}
+            for chapter_id, cells in candidates.items()
+        }
+    
+    def _cell_sort_key(self, cell: Cell):
+        # Configured cells first in their configured order, then any others alphabetically
+        try:
+            return (0, self.cells.index(cell), '')
+        except ValueError:
+            return (1, 0, f'{cell[0]}:{cell[1]}')
@@ -7,8 +7,15 @@ from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 
 from app import db
-from app.models import QuestionBank, User, UGCNetMockAttempt, UGCNetPracticeAttempt
-from sqlalchemy import and_, or_, func
+from app.models import QuestionBank, User, UGCNetMockAttempt, UGCNetPracticeAttempt, AttemptResponse
+from app.services.attempt_response_service import AttemptResponseService
+from app.services.domain_events import QUESTION_CHANGED
+from app.services.memoize import memoize
+from app.utils.time_buckets import bucket_expression, bucket_labels, trailing_window
+from sqlalchemy import and_, or_, func, case, cast
+
+# Analytics read attempts too, those only show up once the timeout expires
+ANALYTICS_CACHE_TIMEOUT = 600  # 10 minutes
 
 
 class QuestionBankService:
@@ -335,18 +342,26 @@ class QuestionBankService:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Get analytics from UGC NET attempt models
-        mock_attempts = UGCNetMockAttempt.query.filter(
-            UGCNetMockAttempt.created_at >= start_date,
-            UGCNetMockAttempt.status == 'completed'
-        ).all()
-        
-        practice_attempts = UGCNetPracticeAttempt.query.filter(
-            UGCNetPracticeAttempt.start_time >= start_date,
-            UGCNetPracticeAttempt.status == 'completed'
-        ).all()
-        
-        total_attempts = len(mock_attempts) + len(practice_attempts)
+        # Attempt level totals, aggregated in SQL (zero scores and times stay out of the averages)
+        total_attempts = 0
+        score_sum = score_count = time_sum = time_count = 0
+        for model, date_column in (
+            (UGCNetMockAttempt, UGCNetMockAttempt.created_at),
+            (UGCNetPracticeAttempt, UGCNetPracticeAttempt.created_at)  # start_time is never set on practice attempts
+        ):
+            totals = db.session.query(
+                func.count(model.id),
+                func.sum(model.percentage),
+                func.count(case((model.percentage > 0, 1))),
+                func.sum(model.time_taken),
+                func.count(case((model.time_taken > 0, 1)))
+            ).filter(date_column >= start_date, model.status == 'completed').one()
+            
+            total_attempts += totals[0]
+            score_sum += totals[1] or 0
+            score_count += totals[2]
+            time_sum += totals[3] or 0
+            time_count += totals[4]
         
         if total_attempts == 0:
             return {
@@ -361,73 +376,61 @@ class QuestionBankService:
                 'topic_breakdown': {}
             }
         
-        # Calculate basic metrics
-        total_scores = []
-        total_times = []
+        overall_success_rate = score_sum / score_count if score_count else 0
+        average_time = time_sum / time_count if time_count else 0
         
-        for attempt in mock_attempts:
-            if attempt.percentage:
-                total_scores.append(attempt.percentage)
-            if attempt.time_taken:
-                total_times.append(attempt.time_taken)
+        # Question level breakdowns are GROUP BYs over the per-question responses
+        criteria = [AttemptResponse.created_at >= start_date]
+        if topic:
+            criteria.append(QuestionBank.topic == topic)
+        if difficulty:
+            criteria.append(QuestionBank.difficulty == difficulty)
         
-        for attempt in practice_attempts:
-            if attempt.percentage:
-                total_scores.append(attempt.percentage)
-            if attempt.time_taken:
-                total_times.append(attempt.time_taken)
+        difficulty_breakdown = {
+            diff: {'attempts': stats['total'], 'correct': stats['correct'], 'success_rate': stats['success_rate']}
+            for diff, stats in AttemptResponseService.get_breakdown(QuestionBank.difficulty, *criteria).items()
+        }
         
-        overall_success_rate = sum(total_scores) / len(total_scores) if total_scores else 0
-        average_time = sum(total_times) / len(total_times) if total_times else 0
+        topic_breakdown = {
+            topic_name: {'attempts': stats['total'], 'correct': stats['correct'], 'success_rate': stats['success_rate']}
+            for topic_name, stats in AttemptResponseService.get_breakdown(QuestionBank.topic, *criteria).items()
+        }
         
-        # Get question bank stats for fallback data
-        total_questions = QuestionBank.query.count()
+        daily_usage = AttemptResponseService.get_breakdown(bucket_expression(AttemptResponse.created_at), *criteria)
+        daily_usage_list = [
+            {'date': str(day), 'attempts': stats['total'], 'success_rate': stats['success_rate']}
+            for day, stats in sorted(daily_usage.items(), key=lambda item: str(item[0]))
+        ]
         
-        return {
-            'total_questions': total_questions,
-            'total_attempts': total_attempts,
-            'overall_success_rate': round(overall_success_rate, 2),
-            'average_time': round(average_time / 60, 1) if average_time else 0,  # Convert to minutes
-            'top_performers': [],
-            'worst_performers': [],
-            'daily_usage': [],
-            'difficulty_breakdown': {},
-            'topic_breakdown': {}
-        }
-        difficulty_breakdown = {}
-        for perf in performances:
-            diff = perf.question_bank.difficulty
-            if diff not in difficulty_breakdown:
-                difficulty_breakdown[diff] = {'attempts': 0, 'correct': 0}
-            difficulty_breakdown[diff]['attempts'] += 1
-            if perf.is_correct:
-                difficulty_breakdown[diff]['correct'] += 1
-        
-        # Add success rates to difficulty breakdown
-        for diff, stats in difficulty_breakdown.items():
-            stats['success_rate'] = round((stats['correct'] / stats['attempts']) * 100, 2) if stats['attempts'] > 0 else 0
-        
-        # Topic breakdown
-        topic_breakdown = {}
-        for perf in performances:
-            topic = perf.question_bank.topic
-            if topic not in topic_breakdown:
-                topic_breakdown[topic] = {'attempts': 0, 'correct': 0}
-            topic_breakdown[topic]['attempts'] += 1
-            if perf.is_correct:
-                topic_breakdown[topic]['correct'] += 1
-        
-        # Add success rates to topic breakdown
-        for topic, stats in topic_breakdown.items():
-            stats['success_rate'] = round((stats['correct'] / stats['attempts']) * 100, 2) if stats['attempts'] > 0 else 0
+        top_stats = AttemptResponseService.get_breakdown(
+            QuestionBank.id, *criteria, min_responses=min_attempts, order='best', limit=10
+        )
+        worst_stats = AttemptResponseService.get_breakdown(
+            QuestionBank.id, *criteria, min_responses=min_attempts, order='worst', limit=10
+        )
+        questions = {
+            q.id: q for q in QuestionBank.query.filter(QuestionBank.id.in_(set(top_stats) | set(worst_stats))).all()
+        } if top_stats or worst_stats else {}
+        
+        def performer(question_id, stats):
+            question = questions[question_id]
+            return {
+                'id': question.id,
+                'question_text': question.question_text[:100] + '...' if len(question.question_text) > 100 else question.question_text,
+                'topic': question.topic,
+                'difficulty': question.difficulty,
+                'attempts': stats['total'],
+                'success_rate': stats['success_rate'],
+                'average_time': stats['average_time']
+            }
         
         return {
-            'total_questions': len(question_stats),
+            'total_questions': QuestionBank.query.count(),
             'total_attempts': total_attempts,
             'overall_success_rate': round(overall_success_rate, 2),
-            'average_time': round(average_time, 1),
-            'top_performers': top_performers,
-            'worst_performers': worst_performers,
+            'average_time': round(average_time / 60, 1) if average_time else 0,  # Convert to minutes
+            'top_performers': [performer(q_id, stats) for q_id, stats in top_stats.items()],
+            'worst_performers': [performer(q_id, stats) for q_id, stats in worst_stats.items()],
             'daily_usage': daily_usage_list,
             'difficulty_breakdown': difficulty_breakdown,
             'topic_breakdown': topic_breakdown,
@@ -435,6 +438,11 @@ class QuestionBankService:
         }
     
     @staticmethod
+    @memoize(
+        ttl=ANALYTICS_CACHE_TIMEOUT,
+        key='question_bank_analytics:{days}:{topic}:{difficulty}',
+        invalidate_on=(QUESTION_CHANGED,)
+    )
     def get_detailed_analytics(
         days: int = 30,
         topic: Optional[str] = None,
@@ -468,7 +476,11 @@ class QuestionBankService:
         
         # Get questions that need review based on performance
         questions_needing_review = []
-        questions = QuestionBank.query.filter_by(is_verified=True).all()
+        questions = QuestionBank.query.filter(
+            QuestionBank.is_verified == True,
+            QuestionBank.attempt_count >= 10,
+            QuestionBank.success_rate <= 60
+        ).all()
         for question in questions:
             stats = question.get_performance_stats()
             if stats['total_attempts'] >= 10 and stats['success_rate'] <= 60:
@@ -571,53 +583,58 @@ class QuestionBankService:
         }
     
     @staticmethod
-    def get_usage_trends(days: int = 30) -> Dict:
-        """Get usage trends using UGC NET models"""
-        from datetime import timedelta, date
-        
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get mock test attempts as a proxy for question bank usage
-        mock_attempts = UGCNetMockAttempt.query.filter(
-            UGCNetMockAttempt.created_at >= start_date,
-            UGCNetMockAttempt.status == 'completed'
-        ).all()
+    def get_usage_trends(days: int = 30, granularity: str = 'day') -> Dict:
+        """
+        Question bank usage of the last N days per IST hour, day or week, raises ValueError on a bad granularity
         
-        practice_attempts = UGCNetPracticeAttempt.query.filter(
-            UGCNetPracticeAttempt.start_time >= start_date,
-            UGCNetPracticeAttempt.status == 'completed'
-        ).all()
+        One GROUP BY over the per-question responses: attempts that answered
+        questions, responses, distinct questions served and success rate per
+        bucket. Buckets without responses are filled in with zeros.
+        """
+        start_utc, start_ist, now_ist = trailing_window(days, granularity)
+        bucket = bucket_expression(AttemptResponse.created_at, granularity)
+        attempt_key = AttemptResponse.attempt_type + ':' + cast(AttemptResponse.attempt_id, db.String)
+        
+        rows = db.session.query(
+            bucket.label('bucket'),
+            func.count(func.distinct(attempt_key)).label('attempts'),
+            func.count(AttemptResponse.id).label('responses'),
+            func.count(func.distinct(AttemptResponse.question_id)).label('unique_questions'),
+            func.sum(case((AttemptResponse.is_correct == True, 1), else_=0)).label('correct')
+        ).filter(AttemptResponse.created_at >= start_utc).group_by(bucket).all()
+        by_bucket = {row.bucket: row for row in rows}
         
-        # Create daily trends data
         trends_data = []
-        current_date = start_date.date()
-        
-        while current_date <= end_date.date():
-            daily_mock = len([a for a in mock_attempts if a.created_at.date() == current_date])
-            daily_practice = len([a for a in practice_attempts if a.start_time and a.start_time.date() == current_date])
-            
+        for label in bucket_labels(start_ist, now_ist, granularity):
+            row = by_bucket.get(label)
             trends_data.append({
-                'date': current_date.isoformat(),
-                'attempts': daily_mock + daily_practice,
-                'unique_questions': 0,  # Would require detailed analysis
-                'success_rate': 0
+                'date': label,
+                'attempts': row.attempts if row else 0,
+                'responses': row.responses if row else 0,
+                'unique_questions': row.unique_questions if row else 0,
+                'success_rate': round((row.correct or 0) / row.responses * 100, 2) if row and row.responses else 0
             })
-            current_date += timedelta(days=1)
         
+        # An attempt's responses are recorded together, so it falls in a single bucket
+        total_attempts = sum(row.attempts for row in rows)
+        total_responses = sum(row.responses for row in rows)
+        total_correct = sum(row.correct or 0 for row in rows)
         return {
-            'daily': trends_data,
-            'weekly': [],
+            'granularity': granularity,
+            'trends': trends_data,
+            'daily': trends_data if granularity == 'day' else [],
+            'weekly': trends_data if granularity == 'week' else [],
             'period_days': days,
             'summary': {
-                'total_attempts': sum(d['attempts'] for d in trends_data),
-                'avg_daily_attempts': sum(d['attempts'] for d in trends_data) / days if days > 0 else 0,
-                'peak_day': max(trends_data, key=lambda x: x['attempts'])['date'] if trends_data else None,
-                'avg_success_rate': 0
+                'total_attempts': total_attempts,
+                'avg_daily_attempts': total_attempts / days if days > 0 else 0,
+                'peak_bucket': max(trends_data, key=lambda x: x['attempts'])['date'] if rows else None,
+                'avg_success_rate': round(total_correct / total_responses * 100, 2) if total_responses else 0
             }
         }
     
     @staticmethod
+    @memoize(ttl=ANALYTICS_CACHE_TIMEOUT, key='question_bank_recommendations', invalidate_on=(QUESTION_CHANGED,))
     def get_improvement_recommendations() -> Dict:
         """Get AI-driven recommendations for question bank improvements"""
         # Get base data for recommendations
@@ -639,7 +656,11 @@ class QuestionBankService:
         
         # Get questions that need review
         review_questions = []
-        questions = QuestionBank.query.filter_by(is_verified=True).all()
+        questions = QuestionBank.query.filter(
+            QuestionBank.is_verified == True,
+            QuestionBank.attempt_count >= 10,
+            QuestionBank.success_rate <= 60
+        ).all()
         for question in questions:
             stats = question.get_performance_stats()
             if stats['total_attempts'] >= 10 and stats['success_rate'] <= 60:
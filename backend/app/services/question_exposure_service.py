@@ -0,0 +1,63 @@
+"""
+Question Exposure Service
+Tracks which questions each user has already been served, as one Redis bitmap
+per user, so paper generation can steer repeat attempts towards fresh questions
+"""
+
+from typing import Iterable
+
+from app import redis_client
+
+
+class SeenQuestions:
+    """Read-only view over a seen-questions bitmap, membership checks are O(1)"""
+    
+    def __init__(self, bitmap: bytes = b''):
+        self._bitmap = bitmap or b''
+    
+    def __contains__(self, question_id) -> bool:
+        # Redis bitmaps store bit 0 as the most significant bit of the first byte
+        byte_index = question_id >> 3
+        return byte_index < len(self._bitmap) and bool(self._bitmap[byte_index] & (0x80 >> (question_id & 7)))
+    
+    def __len__(self) -> int:
+        return int.from_bytes(self._bitmap, 'big').bit_count()
+    
+    def __bool__(self) -> bool:
+        return any(self._bitmap)
+
+
+class QuestionExposureService:
+    """Service for per-user seen-question tracking"""
+    
+    KEY_PREFIX = 'seen_questions'
+    
+    def __init__(self):
+        self.ttl = 365 * 24 * 60 * 60  # Users inactive for a year start over with a clean slate
+    
+    def get_key(self, user_id: int) -> str:
+        return f'{self.KEY_PREFIX}:{user_id}'
+    
+    def get_seen(self, user_id: int) -> SeenQuestions:
+        """Load the questions a user has seen, empty when Redis is unavailable"""
+        try:
+            if redis_client:
+                return SeenQuestions(redis_client.get(self.get_key(user_id)))
+        except Exception as redis_error:
+            print(f"Redis seen questions error: {redis_error}")
+        return SeenQuestions()
+    
+    def mark_seen(self, user_id: int, question_ids: Iterable[int]):
+        """Record that a user has been served the given questions"""
+        try:
+            if not redis_client:
+                return
+            
+            key = self.get_key(user_id)
+            pipeline = redis_client.pipeline(transaction=False)
+            for question_id in question_ids:
+                pipeline.setbit(key, question_id, 1)
+            pipeline.expire(key, self.ttl)
+            pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis seen questions error: {redis_error}")
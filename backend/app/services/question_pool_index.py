@@ -0,0 +1,226 @@
+"""
+Question Pool Index
+Process-local index of question IDs used by the paper generators to sample
+questions in memory instead of loading whole chapters from the database
+"""
+
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db, redis_client
+from app.models import QuestionBank
+
+
+BANK_VERSION_KEY = 'question_bank_version'
+
+# Fallback version used when Redis is not reachable (single process deployments)
+_local_bank_version = 0
+
+
+def get_shared_bank_version() -> Optional[int]:
+    """Get the question bank version shared across workers, or None when Redis is not reachable"""
+    try:
+        if redis_client:
+            version = redis_client.get(BANK_VERSION_KEY)
+            return int(version) if version else 0
+    except Exception:
+        pass
+    return None
+
+
+def get_bank_version() -> int:
+    """Get the current question bank version, falling back to the process-local one"""
+    version = get_shared_bank_version()
+    return version if version is not None else _local_bank_version
+
+
+def bump_bank_version() -> int:
+    """Mark the question bank as changed so every pool index rebuilds"""
+    global _local_bank_version
+    _local_bank_version += 1
+    try:
+        if redis_client:
+            return int(redis_client.incr(BANK_VERSION_KEY))
+    except Exception:
+        pass
+    return _local_bank_version
+
+
+class QuestionPoolIndex:
+    """
+    Compact ID arrays keyed by (chapter_id, difficulty, source, is_verified)
+    
+    Chapters are loaded lazily with a single narrow query and the whole index is
+    dropped whenever the question bank version changes.
+    """
+    
+    # Changes committed by other processes are noticed within this many seconds
+    VERSION_CHECK_INTERVAL = 5
+    
+    def __init__(self):
+        # chapter_id -> {(difficulty, source, is_verified): array of question IDs}
+        self._pools: Dict[int, Dict[Tuple[str, str, bool], array]] = {}
+        # Calibrated IRT difficulty aligned with each pool, NaN when not calibrated
+        self._irt_pools: Dict[int, Dict[Tuple[str, str, bool], array]] = {}
+        self._version: Optional[int] = None
+        self._shared_version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._local_version_seen: Optional[int] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def version(self) -> Optional[int]:
+        """
+        Shared question bank version the loaded pools were built from
+        
+        None when Redis was not reachable: the process-local counter restarts
+        with the process, so it cannot identify a bank snapshot later on.
+        """
+        return self._shared_version
+    
+    def _sync_version(self):
+        """Drop all pools if the question bank changed since they were built, the caller holds the lock"""
+        now = time.monotonic()
+        # Changes committed by this process are seen at once, Redis is only asked every few seconds
+        if self._local_version_seen == _local_bank_version and now - self._version_checked_at < self.VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked_at = now
+        self._local_version_seen = _local_bank_version
+        
+        shared_version = get_shared_bank_version()
+        version = shared_version if shared_version is not None else _local_bank_version
+        if version != self._version:
+            self._pools = {}
+            self._irt_pools = {}
+            self._version = version
+        self._shared_version = shared_version
+    
+    def load_chapters(self, chapter_ids: Iterable[int]):
+        """Make sure the pools for the given chapters are in memory"""
+        with self._lock:
+            self._load_chapters(chapter_ids)
+    
+    def _load_chapters(self, chapter_ids: Iterable[int]):
+        self._sync_version()
+        
+        missing = [ch_id for ch_id in set(chapter_ids) if ch_id not in self._pools]
+        if not missing:
+            return
+        
+        rows = db.session.query(
+            QuestionBank.id,
+            QuestionBank.chapter_id,
+            QuestionBank.difficulty,
+            QuestionBank.source,
+            QuestionBank.is_verified,
+            QuestionBank.irt_difficulty
+        ).filter(QuestionBank.chapter_id.in_(missing)).order_by(QuestionBank.id).all()
+        
+        loaded = {ch_id: {} for ch_id in missing}
+        loaded_irt = {ch_id: {} for ch_id in missing}
+        for row in rows:
+            key = (row.difficulty, row.source, bool(row.is_verified))
+            pool = loaded[row.chapter_id].get(key)
+            if pool is None:
+                pool = loaded[row.chapter_id][key] = array('l')
+                loaded_irt[row.chapter_id][key] = array('d')
+            pool.append(row.id)
+            loaded_irt[row.chapter_id][key].append(
+                row.irt_difficulty if row.irt_difficulty is not None else float('nan')
+            )
+        
+        self._pools.update(loaded)
+        self._irt_pools.update(loaded_irt)
+    
+    def get_cells(self, chapter_id: int, is_verified: Optional[bool] = True,
+                  difficulty_band: Optional[Tuple[float, float]] = None) -> Dict[Tuple[str, str], List[int]]:
+        """
+        Get the question IDs of a chapter grouped by (difficulty, source)
+
+        With a (min, max) difficulty_band only questions whose calibrated IRT
+        difficulty lies inside the band are returned; uncalibrated ones never are.
+        """
+        # A version change swaps the index dicts, a chapter's loaded pools are never modified
+        with self._lock:
+            self._load_chapters([chapter_id])
+            pools = self._pools.get(chapter_id, {})
+            irt_pools = self._irt_pools.get(chapter_id, {})
+
+        cells: Dict[Tuple[str, str], List[int]] = {}
+        for key, pool in pools.items():
+            difficulty, source, q_verified = key
+            if is_verified is not None and q_verified != is_verified:
+                continue
+            if difficulty_band is None:
+                cells.setdefault((difficulty, source), []).extend(pool)
+            else:
+                low, high = difficulty_band
+                # NaN comparisons are False, so uncalibrated questions drop out
+                cells.setdefault((difficulty, source), []).extend(
+                    q_id for q_id, irt_difficulty in zip(pool, irt_pools[key]) if low <= irt_difficulty <= high
+                )
+        return cells
+
+
+def hydrate_questions(question_ids: List[int]) -> List[QuestionBank]:
+    """Load the given questions in one IN query, preserving the order of the IDs"""
+    if not question_ids:
+        return []
+    
+    questions_by_id = {
+        q.id: q for q in QuestionBank.query.filter(QuestionBank.id.in_(question_ids)).all()
+    }
+    return [questions_by_id[q_id] for q_id in question_ids if q_id in questions_by_id]
+
+
+# Shared per-process index
+question_pool_index = QuestionPoolIndex()
+
+
+# Columns that make up the pool key; changes to other columns keep the index valid
+INDEXED_COLUMNS = ('chapter_id', 'difficulty', 'source', 'is_verified', 'irt_difficulty')
+
+
+def _mark_session_changed(target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info['question_bank_changed'] = True
+
+
+# Version bumps happen once per committed transaction that touched QuestionBank
+@event.listens_for(QuestionBank, 'after_insert')
+@event.listens_for(QuestionBank, 'after_delete')
+def _mark_question_bank_changed(mapper, connection, target):
+    _mark_session_changed(target)
+
+
+@event.listens_for(QuestionBank, 'after_update')
+def _mark_question_bank_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in INDEXED_COLUMNS):
+        _mark_session_changed(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_version_on_commit(session):
+    if session.info.pop('question_bank_changed', False):
+        bump_bank_version()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _clear_change_flag_on_rollback(session, previous_transaction):
+    session.info.pop('question_bank_changed', None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_question_bank_changes(orm_execute_state):
+    # Query.update() / Query.delete() bypass the mapper events above
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is QuestionBank:
+            orm_execute_state.session.info['question_bank_changed'] = True
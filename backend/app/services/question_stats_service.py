@@ -0,0 +1,241 @@
+"""
+Question Stats Service
+Keeps QuestionBank.attempt_count, success_rate and avg_solve_time near real time:
+submits add per-question outcome deltas to a Redis hash and a periodic task
+folds the accumulated deltas into question_bank with one bulk UPDATE
+"""
+
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, case, func, select, Float, Integer
+
+from app import db, redis_client
+from app.models import AttemptResponse, QuestionBank, QuestionStatsFlush
+
+
+class QuestionStatsService:
+    """Service for batched per-question performance statistics"""
+    
+    PENDING_KEY = 'question_stats:pending'
+    FLUSHING_KEY = 'question_stats:flushing'
+    FLUSH_ID_KEY = 'question_stats:flushing_id'
+    LOCK_KEY = 'question_stats:flush_lock'
+    
+    LOCK_TIMEOUT = 300
+    
+    # Applied flush IDs only need to outlive the retry of an interrupted flush
+    FLUSH_ID_RETENTION = timedelta(days=1)
+    
+    # Hash fields are '<question_id>:<counter>'
+    COUNTERS = ('attempts', 'correct', 'time_sum', 'timed')
+    
+    def record_outcomes(self, result: Dict, time_spent: Optional[Dict] = None):
+        """Queue the per-question outcomes of a scored attempt (see ScoringEngine.score_attempts)"""
+        self._queue_deltas(self._build_deltas(result, time_spent or {}))
+    
+    def remove_outcomes(self, responses):
+        """Queue the reversal of deleted responses (question_id, is_correct, time_spent rows)"""
+        deltas = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+        for response in responses:
+            counters = deltas[response.question_id]
+            counters['attempts'] -= 1
+            counters['correct'] -= int(bool(response.is_correct))
+            if response.time_spent is not None:
+                counters['time_sum'] -= response.time_spent
+                counters['timed'] -= 1
+        self._queue_deltas(deltas)
+    
+    def _queue_deltas(self, deltas: Dict[int, Dict[str, int]]):
+        if not deltas:
+            return
+        
+        try:
+            if redis_client:
+                pipeline = redis_client.pipeline(transaction=False)
+                for question_id, counters in deltas.items():
+                    for counter, value in counters.items():
+                        if value:
+                            pipeline.hincrby(self.PENDING_KEY, f'{question_id}:{counter}', value)
+                pipeline.execute()
+                return
+        except Exception as redis_error:
+            print(f"Redis question stats error: {redis_error}")
+        
+        # Without Redis the deltas are applied straight away so no outcome is lost
+        self._apply_deltas(deltas)
+        db.session.commit()
+    
+    def flush(self) -> int:
+        """Fold the queued deltas into question_bank, returns the number of questions updated"""
+        if not redis_client:
+            return 0
+        
+        token = self._acquire_lock()
+        if not token:
+            return 0
+        try:
+            return self._flush()
+        finally:
+            self._release_lock(token)
+    
+    def _flush(self) -> int:
+        # Deltas recorded during the flush land in a fresh pending hash; a flushing
+        # hash left behind by an interrupted run is retried before taking a new one
+        if not redis_client.exists(self.FLUSHING_KEY):
+            if not redis_client.exists(self.PENDING_KEY):
+                return 0
+            pipeline = redis_client.pipeline()
+            pipeline.rename(self.PENDING_KEY, self.FLUSHING_KEY)
+            pipeline.set(self.FLUSH_ID_KEY, uuid.uuid4().hex)
+            pipeline.execute()
+        else:
+            # A flushing hash taken before flush IDs existed gets one now
+            redis_client.set(self.FLUSH_ID_KEY, uuid.uuid4().hex, nx=True)
+        
+        flush_id = redis_client.get(self.FLUSH_ID_KEY).decode()
+        
+        # The flush ID commits with the UPDATE, so a retry after the commit but
+        # before the flushing hash was deleted does not apply the deltas twice
+        updated = 0
+        if not db.session.get(QuestionStatsFlush, flush_id):
+            deltas = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+            for field, value in redis_client.hgetall(self.FLUSHING_KEY).items():
+                question_id, counter = field.decode().split(':', 1)
+                deltas[int(question_id)][counter] = int(value)
+            
+            updated = self._apply_deltas(deltas)
+            db.session.add(QuestionStatsFlush(flush_id=flush_id, applied_at=datetime.utcnow()))
+            QuestionStatsFlush.query.filter(
+                QuestionStatsFlush.applied_at < datetime.utcnow() - self.FLUSH_ID_RETENTION
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        
+        redis_client.delete(self.FLUSHING_KEY, self.FLUSH_ID_KEY)
+        return updated
+    
+    def rebuild(self, question_ids) -> int:
+        """
+        Recompute the statistics of the given questions from attempt_responses,
+        e.g. after an answer key correction re-marked their responses
+        
+        Queued deltas are folded in first, under the flush lock, so they are not
+        added again on top of the recomputed values.
+        """
+        question_ids = list(question_ids)
+        if not question_ids:
+            return 0
+        
+        token = None
+        try:
+            if redis_client:
+                token = self._acquire_lock(wait=self.LOCK_TIMEOUT)
+                if token:
+                    self._flush()
+        except Exception as redis_error:
+            print(f"Redis question stats error: {redis_error}")
+        
+        try:
+            table = QuestionBank.__table__
+            responses = AttemptResponse.__table__
+            
+            def per_question(aggregate):
+                return select(aggregate).where(responses.c.question_id == table.c.id).scalar_subquery()
+            
+            total = func.count(responses.c.id)
+            correct = func.sum(case((responses.c.is_correct == True, 1), else_=0))
+            result = db.session.execute(
+                table.update().where(table.c.id.in_(question_ids)).values(
+                    attempt_count=per_question(total),
+                    success_rate=per_question(func.coalesce(func.round(correct * 100.0 / total, 2), 0.0)),
+                    avg_solve_time=per_question(func.round(func.avg(responses.c.time_spent)).cast(Integer)),
+                    updated_at=table.c.updated_at
+                )
+            )
+            db.session.commit()
+            return result.rowcount
+        finally:
+            if token:
+                self._release_lock(token)
+    
+    def _acquire_lock(self, wait: float = 0) -> Optional[str]:
+        """Take the flush lock, None when another flush still holds it after wait seconds"""
+        token = uuid.uuid4().hex
+        deadline = time.time() + wait
+        while not redis_client.set(self.LOCK_KEY, token, nx=True, ex=self.LOCK_TIMEOUT):
+            if time.time() >= deadline:
+                return None
+            time.sleep(0.1)
+        return token
+    
+    def _release_lock(self, token: str):
+        try:
+            # A lock that timed out may have been taken by another flush since
+            current = redis_client.get(self.LOCK_KEY)
+            if current and current.decode() == token:
+                redis_client.delete(self.LOCK_KEY)
+        except Exception as redis_error:
+            print(f"Redis question stats error: {redis_error}")
+    
+    def _build_deltas(self, result: Dict, time_spent: Dict) -> Dict[int, Dict[str, int]]:
+        deltas = {}
+        for question_id, is_correct in zip(result['question_ids'], result['is_correct']):
+            seconds = time_spent.get(str(question_id))
+            timed = isinstance(seconds, (int, float)) and seconds >= 0
+            deltas[question_id] = {
+                'attempts': 1,
+                'correct': int(is_correct),
+                'time_sum': int(seconds) if timed else 0,
+                'timed': int(timed)
+            }
+        return deltas
+    
+    def _apply_deltas(self, deltas: Dict[int, Dict[str, int]]) -> int:
+        """
+        One executemany UPDATE for every question with deltas, the caller commits
+        
+        Negative deltas come from deleted attempts and take their responses back
+        out of the running averages.
+        """
+        rows = [
+            {
+                'b_id': question_id,
+                'b_attempts': counters['attempts'],
+                'b_correct': counters['correct'],
+                # Untimed responses are assumed to take the batch's average time
+                'b_avg_time': counters['time_sum'] / counters['timed'] if counters['timed'] else None
+            }
+            for question_id, counters in deltas.items() if any(counters.values())
+        ]
+        if not rows:
+            return 0
+        
+        table = QuestionBank.__table__
+        previous_count = func.coalesce(table.c.attempt_count, 0)
+        new_count = previous_count + bindparam('b_attempts')
+        batch_avg_time = bindparam('b_avg_time', type_=Float)
+        
+        statement = table.update().where(table.c.id == bindparam('b_id')).values(
+            attempt_count=case((new_count > 0, new_count), else_=0),
+            success_rate=case(
+                (new_count <= 0, 0.0),
+                else_=(
+                    func.coalesce(table.c.success_rate, 0.0) * previous_count + bindparam('b_correct') * 100.0
+                ) / new_count
+            ),
+            avg_solve_time=case(
+                (new_count <= 0, None),
+                (batch_avg_time.is_(None), table.c.avg_solve_time),
+                (table.c.avg_solve_time.is_(None), func.round(batch_avg_time)),
+                else_=func.round(
+                    (table.c.avg_solve_time * previous_count + batch_avg_time * bindparam('b_attempts')) / new_count
+                )
+            ).cast(Integer),
+            # Statistics refreshes are not content edits
+            updated_at=table.c.updated_at
+        )
+        db.session.execute(statement, rows)
+        return len(rows)
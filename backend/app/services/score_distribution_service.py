@@ -0,0 +1,189 @@
+"""
+Score Distribution Service
+Keeps the mock test score distribution per mock test and per subject as a
+fixed-bin histogram in Redis, so a submit updates it in O(1) and percentile,
+predicted rank and percentile-based qualification are read from a constant
+number of bins instead of sorting every attempt
+"""
+
+from typing import Dict, Optional
+
+from sqlalchemy import cast, func, Integer
+
+from app import db, redis_client
+from app.models import UGCNetMockAttempt, UGCNetMockTest
+
+# Percentages are binned at 0.1 resolution: bin 0 is 0.0%, bin 1000 is 100.0%
+BIN_RESOLUTION = 10
+BIN_COUNT = 100 * BIN_RESOLUTION + 1
+
+
+def score_bin(percentage: float) -> int:
+    """Histogram bin of a percentage score"""
+    return min(max(int(round((percentage or 0) * BIN_RESOLUTION)), 0), BIN_COUNT - 1)
+
+
+class ScoreHistogram:
+    """Mergeable fixed-bin histogram of percentage scores"""
+    
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = {b: c for b, c in (counts or {}).items() if c > 0}
+        self.total = sum(self.counts.values())
+    
+    def add(self, percentage: float, count: int = 1):
+        """Add (or with a negative count remove) scores, bins never go below zero"""
+        b = score_bin(percentage)
+        count = max(count, -self.counts.get(b, 0))
+        self.counts[b] = self.counts.get(b, 0) + count
+        self.total += count
+    
+    def merge(self, other: 'ScoreHistogram') -> 'ScoreHistogram':
+        merged = ScoreHistogram(self.counts)
+        for b, count in other.counts.items():
+            merged.counts[b] = merged.counts.get(b, 0) + count
+        merged.total = self.total + other.total
+        return merged
+    
+    def _split(self, percentage: float):
+        """(count below, count in the same bin, count above) a score"""
+        b = score_bin(percentage)
+        below = sum(count for bin_, count in self.counts.items() if bin_ < b)
+        equal = self.counts.get(b, 0)
+        return below, equal, self.total - below - equal
+    
+    def percentile(self, percentage: float) -> Optional[float]:
+        """Share of scores under a score, ties counted half, None when empty"""
+        if not self.total:
+            return None
+        below, equal, _ = self._split(percentage)
+        return round((below + equal / 2) / self.total * 100, 2)
+    
+    def rank(self, percentage: float) -> int:
+        """Rank a score would take, 1 + the number of strictly higher scores"""
+        return self._split(percentage)[2] + 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Score at quantile q (0-1), None when empty"""
+        if not self.total:
+            return None
+        target = q * self.total
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= target:
+                return b / BIN_RESOLUTION
+        return 100.0
+
+
+class ScoreDistributionService:
+    """Service for per mock test and per subject score distributions"""
+    
+    KEY_PREFIX = 'score_distribution'
+    
+    # Percentiles are only trusted for qualification once enough attempts exist
+    min_sample_size = 30
+    
+    def get_key(self, scope: str, scope_id: int) -> str:
+        return f'{self.KEY_PREFIX}:{scope}:{scope_id}'
+    
+    def record(self, mock_test_id: int, subject_id: int, percentage: float):
+        """Add a submitted score to both distributions"""
+        self._increment(mock_test_id, subject_id, {score_bin(percentage): 1})
+    
+    def move(self, mock_test_id: int, subject_id: int, old_percentage: float, new_percentage: float):
+        """Move a re-scored attempt to its new bin"""
+        old_bin, new_bin = score_bin(old_percentage), score_bin(new_percentage)
+        if old_bin != new_bin:
+            self._increment(mock_test_id, subject_id, {old_bin: -1, new_bin: 1})
+    
+    def discard(self, mock_test_id: int, subject_id: int, percentage: float):
+        """Take a deleted attempt's score out of both distributions"""
+        self._increment(mock_test_id, subject_id, {score_bin(percentage): -1})
+    
+    def _increment(self, mock_test_id: int, subject_id: int, deltas: Dict[int, int]):
+        try:
+            if redis_client:
+                pipeline = redis_client.pipeline()
+                for key in (self.get_key('mock_test', mock_test_id), self.get_key('subject', subject_id)):
+                    for b, delta in deltas.items():
+                        pipeline.hincrby(key, b, delta)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis score distribution error: {redis_error}")
+    
+    def get_histogram(self, scope: str, scope_id: int) -> ScoreHistogram:
+        """Load a distribution from Redis, rebuilding it from the database when missing"""
+        try:
+            if redis_client:
+                counts = redis_client.hgetall(self.get_key(scope, scope_id))
+                if counts:
+                    return ScoreHistogram({int(b): int(count) for b, count in counts.items()})
+        except Exception as redis_error:
+            print(f"Redis score distribution error: {redis_error}")
+        return self.rebuild(scope, scope_id)
+    
+    def rebuild(self, scope: str, scope_id: int) -> ScoreHistogram:
+        """Rebuild a distribution from completed attempts with one GROUP BY and cache it in Redis"""
+        score_bin_column = cast(func.round(func.coalesce(UGCNetMockAttempt.percentage, 0) * BIN_RESOLUTION), Integer)
+        query = db.session.query(score_bin_column, func.count(UGCNetMockAttempt.id)).filter(
+            UGCNetMockAttempt.status == 'completed'
+        )
+        if scope == 'mock_test':
+            query = query.filter(UGCNetMockAttempt.mock_test_id == scope_id)
+        else:
+            query = query.join(UGCNetMockTest).filter(UGCNetMockTest.subject_id == scope_id)
+        
+        counts = {}
+        for b, count in query.group_by(score_bin_column).all():
+            b = min(max(int(b), 0), BIN_COUNT - 1)
+            counts[b] = counts.get(b, 0) + count
+        histogram = ScoreHistogram(counts)
+        
+        try:
+            if redis_client and counts:
+                key = self.get_key(scope, scope_id)
+                pipeline = redis_client.pipeline()
+                pipeline.delete(key)
+                pipeline.hset(key, mapping=counts)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis score distribution error: {redis_error}")
+        
+        return histogram
+    
+    def get_standing(self, mock_test_id: int, subject_id: int, percentage: float) -> Dict:
+        """Percentile and predicted rank of a score among the mock test's and subject's attempts"""
+        return self.build_standing(
+            self.get_histogram('mock_test', mock_test_id), self.get_histogram('subject', subject_id), percentage
+        )
+    
+    @staticmethod
+    def build_standing(mock_histogram: ScoreHistogram, subject_histogram: ScoreHistogram,
+                       percentage: float) -> Dict:
+        """Standing of a score in already loaded distributions, see get_standing"""
+        return {
+            'percentile': mock_histogram.percentile(percentage),
+            'predicted_rank': mock_histogram.rank(percentage),
+            'sample_size': mock_histogram.total,
+            'subject_percentile': subject_histogram.percentile(percentage),
+            'subject_predicted_rank': subject_histogram.rank(percentage),
+            'subject_sample_size': subject_histogram.total
+        }
+    
+    def get_qualification_percentile(self, standing: Dict) -> Optional[float]:
+        """Percentile to qualify on: the subject's when large enough, else the mock test's, else None"""
+        if standing['subject_sample_size'] >= self.min_sample_size:
+            return standing['subject_percentile']
+        if standing['sample_size'] >= self.min_sample_size:
+            return standing['percentile']
+        return None
+    
+    def get_summary(self, scope: str, scope_id: int) -> Dict:
+        """Attempt count and score quantiles of a distribution"""
+        histogram = self.get_histogram(scope, scope_id)
+        return {
+            'attempts': histogram.total,
+            'quantiles': {
+                f'p{int(q * 100)}': histogram.quantile(q) for q in (0.1, 0.25, 0.5, 0.75, 0.9)
+            }
+        }
@@ -0,0 +1,254 @@
+"""
+Scoring Engine
+Scores mock and practice attempts with NumPy: the answer key, marks and chapters
+of every question involved are loaded in one query and all attempts are scored
+together with vectorized operations
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app import db
+from app.models import QuestionBank, Chapter
+
+# Options are compared as small integer codes, 0 means unanswered or invalid
+OPTION_CODES = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
+OPTION_LETTERS = {code: letter for letter, code in OPTION_CODES.items()}
+
+# Question IDs per IN query when loading answer keys
+IN_CHUNK_SIZE = 900
+
+
+def encode_option(option) -> int:
+    """Integer code of an answer option, 0 when missing or invalid"""
+    if not option:
+        return 0
+    return OPTION_CODES.get(str(option).strip().upper(), 0)
+
+
+# UGC NET qualification thresholds on the raw percentage and, once enough
+# attempts exist to trust it, on the percentile among other candidates
+QUALIFYING_PERCENTAGE = 60
+BORDERLINE_PERCENTAGE = 40
+QUALIFYING_PERCENTILE = 85
+BORDERLINE_PERCENTILE = 75
+
+
+def get_qualification_status(percentage: float, percentile: Optional[float] = None) -> str:
+    """
+    UGC NET qualification status of a mock attempt
+    
+    With a percentile (see ScoreDistributionService) the status follows the
+    relative standing like the real cut-offs do, otherwise the raw percentage.
+    """
+    if percentile is not None:
+        if percentile >= QUALIFYING_PERCENTILE:
+            return 'qualified'
+        elif percentile >= BORDERLINE_PERCENTILE:
+            return 'borderline'
+        return 'not_qualified'
+    
+    if percentage >= QUALIFYING_PERCENTAGE:
+        return 'qualified'
+    elif percentage >= BORDERLINE_PERCENTAGE:
+        return 'borderline'
+    return 'not_qualified'
+
+
+def build_question_results(result: Dict, answers: Dict) -> List[Dict]:
+    """Question-wise results of a scored practice attempt, with explanations loaded in one query"""
+    explanations = dict(
+        db.session.query(QuestionBank.id, QuestionBank.explanation)
+        .filter(QuestionBank.id.in_(result['question_ids'])).all()
+    ) if result['question_ids'] else {}
+    
+    return [
+        {
+            'question_id': question_id,
+            'user_answer': answers.get(str(question_id)),
+            'correct_answer': correct_option,
+            'is_correct': is_correct,
+            'explanation': explanations.get(question_id)
+        }
+        for question_id, is_correct, correct_option in zip(
+            result['question_ids'], result['is_correct'], result['correct_options']
+        )
+    ]
+
+
+class ScoringEngine:
+    """Vectorized scoring of attempts against their answer keys"""
+    
+    def score_attempt(self, question_ids: List[int], answers: Dict,
+                      answer_key: Optional[Dict] = None) -> Dict:
+        """Score a single attempt, see score_attempts"""
+        return self.score_attempts([{
+            'question_ids': question_ids,
+            'answers': answers,
+            'answer_key': answer_key
+        }])[0]
+    
+    def score_attempts(self, attempts: List[Dict]) -> List[Dict]:
+        """
+        Score many attempts in one pass
+        
+        Each attempt is a dict with question_ids, answers ({question_id: option})
+        and an optional frozen answer_key ({question_id: [correct_option, marks]})
+        that takes precedence over the question bank. Questions that are neither
+        in the frozen key nor in the bank any more are skipped.
+        
+        Returns one result per attempt, in order, with correct/wrong/unanswered
+        counts, obtained and total marks, percentage, per-chapter performance and
+        per-question is_correct / correct_options lists aligned with the scored
+        question IDs, along with the normalized chosen option (None when
+        unanswered), marks and chapter ID of each of those questions.
+        """
+        if not attempts:
+            return []
+        
+        bank = self._load_bank_keys({
+            int(q_id) for attempt in attempts for q_id in attempt['question_ids']
+        })
+        
+        chapter_index = {}  # chapter_id -> dense index
+        chapter_labels = []
+        
+        attempt_idx, correct, given, marks, chapters = [], [], [], [], []
+        scored_ids, scored_chapter_ids = [], []
+        for i, attempt in enumerate(attempts):
+            answers = attempt.get('answers') or {}
+            frozen_key = attempt.get('answer_key') or {}
+            attempt_scored_ids, attempt_chapter_ids = [], []
+            
+            for q_id in attempt['question_ids']:
+                q_id = int(q_id)
+                bank_entry = bank.get(q_id)
+                frozen_entry = frozen_key.get(str(q_id))
+                if frozen_entry is None and bank_entry is None:
+                    continue
+                
+                if frozen_entry is not None:
+                    correct_code, question_marks = encode_option(frozen_entry[0]), frozen_entry[1] or 1
+                else:
+                    correct_code, question_marks = bank_entry[0], bank_entry[1]
+                
+                chapter_id, chapter_name = bank_entry[2:] if bank_entry else (None, None)
+                if chapter_id not in chapter_index:
+                    chapter_index[chapter_id] = len(chapter_labels)
+                    chapter_labels.append(chapter_name or 'General')
+                
+                attempt_idx.append(i)
+                correct.append(correct_code)
+                given.append(encode_option(answers.get(str(q_id))))
+                marks.append(question_marks)
+                chapters.append(chapter_index[chapter_id])
+                attempt_scored_ids.append(q_id)
+                attempt_chapter_ids.append(chapter_id)
+            
+            scored_ids.append(attempt_scored_ids)
+            scored_chapter_ids.append(attempt_chapter_ids)
+        
+        attempt_idx = np.asarray(attempt_idx, dtype=np.int64)
+        correct = np.asarray(correct, dtype=np.int8)
+        given = np.asarray(given, dtype=np.int8)
+        marks = np.asarray(marks, dtype=np.float64)
+        chapters = np.asarray(chapters, dtype=np.int64)
+        
+        answered = given > 0
+        is_correct = answered & (given == correct)
+        
+        n_attempts = len(attempts)
+        question_counts = np.bincount(attempt_idx, minlength=n_attempts)
+        answered_counts = np.bincount(attempt_idx, weights=answered, minlength=n_attempts)
+        correct_counts = np.bincount(attempt_idx, weights=is_correct, minlength=n_attempts)
+        total_marks = np.bincount(attempt_idx, weights=marks, minlength=n_attempts)
+        obtained_marks = np.bincount(attempt_idx, weights=marks * is_correct, minlength=n_attempts)
+        
+        # Per-chapter breakdown of every attempt at once: one cell per (attempt, chapter)
+        n_chapters = max(len(chapter_labels), 1)
+        cells = attempt_idx * n_chapters + chapters
+        chapter_totals = np.bincount(cells, minlength=n_attempts * n_chapters).reshape(n_attempts, n_chapters)
+        chapter_correct = np.bincount(
+            cells, weights=is_correct, minlength=n_attempts * n_chapters
+        ).reshape(n_attempts, n_chapters)
+        
+        # Rows of each attempt are contiguous, so split points give per-attempt views
+        bounds = np.cumsum(question_counts)[:-1]
+        is_correct_by_attempt = np.split(is_correct, bounds)
+        correct_by_attempt = np.split(correct, bounds)
+        given_by_attempt = np.split(given, bounds)
+        marks_by_attempt = np.split(marks, bounds)
+        
+        results = []
+        for i in range(n_attempts):
+            chapter_performance = {}
+            for c in np.nonzero(chapter_totals[i])[0]:
+                performance = chapter_performance.setdefault(chapter_labels[c], {'correct': 0, 'total': 0})
+                performance['correct'] += int(chapter_correct[i, c])
+                performance['total'] += int(chapter_totals[i, c])
+            
+            total = float(total_marks[i])
+            obtained = float(obtained_marks[i])
+            results.append({
+                'question_ids': scored_ids[i],
+                'is_correct': is_correct_by_attempt[i].tolist(),
+                'correct_options': [OPTION_LETTERS.get(code, '') for code in correct_by_attempt[i].tolist()],
+                'chosen_options': [OPTION_LETTERS.get(code) for code in given_by_attempt[i].tolist()],
+                'question_marks': marks_by_attempt[i].tolist(),
+                'chapter_ids': scored_chapter_ids[i],
+                'total_questions': int(question_counts[i]),
+                'correct_answers': int(correct_counts[i]),
+                'wrong_answers': int(answered_counts[i] - correct_counts[i]),
+                'unanswered': int(question_counts[i] - answered_counts[i]),
+                'obtained_marks': obtained,
+                'total_marks': total,
+                'percentage': min(round(obtained / total * 100, 2), 100) if total > 0 else 0,
+                'chapter_performance': chapter_performance
+            })
+        
+        return results
+    
+    def score_mock_attempts(self, attempts) -> List[Dict]:
+        """Score UGCNetMockAttempt rows against their frozen answer keys"""
+        return self.score_attempts([
+            {
+                'question_ids': attempt.get_question_ids(),
+                'answers': json.loads(attempt.answers_data) if attempt.answers_data else attempt.get_answers(),
+                'answer_key': attempt.get_answer_key()
+            }
+            for attempt in attempts
+        ])
+    
+    def score_practice_attempts(self, attempts) -> List[Dict]:
+        """Score UGCNetPracticeAttempt rows against the question bank"""
+        return self.score_attempts([
+            {
+                'question_ids': [q['id'] for q in attempt.get_questions_data()],
+                'answers': attempt.get_answers_data()
+            }
+            for attempt in attempts
+        ])
+    
+    def _load_bank_keys(self, question_ids) -> Dict[int, tuple]:
+        """question_id -> (correct option code, marks, chapter_id, chapter_name)"""
+        question_ids = sorted(question_ids)
+        
+        keys = {}
+        # A single attempt fits in one query; cohort re-scores are chunked to stay under SQLite's parameter limit
+        for start in range(0, len(question_ids), IN_CHUNK_SIZE):
+            rows = db.session.query(
+                QuestionBank.id,
+                QuestionBank.correct_option,
+                QuestionBank.marks,
+                QuestionBank.chapter_id,
+                Chapter.name
+            ).outerjoin(Chapter, Chapter.id == QuestionBank.chapter_id).filter(
+                QuestionBank.id.in_(question_ids[start:start + IN_CHUNK_SIZE])
+            ).all()
+            
+            for row in rows:
+                keys[row.id] = (encode_option(row.correct_option), row.marks or 1, row.chapter_id, row.name)
+        
+        return keys
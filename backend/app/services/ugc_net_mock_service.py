@@ -6,11 +6,13 @@ Handles intelligent generation of UGC NET style mock tests with proper weightage
 import random
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from sqlalchemy import and_, func
+from sqlalchemy import func
 
 from app import db
 from app.models import QuestionBank, Chapter, Subject, UGCNetMockTest, UGCNetMockAttempt
-from app.utils.ugc_net_seed_data import get_subject_weightage_info
+from app.services.paper_assembler import PaperAssembler
+from app.services.question_pool_index import question_pool_index, hydrate_questions
+from app.utils.seed_subjects_and_chapters import get_subject_weightage_info
 
 
 class UGCNetMockTestService:
@@ -25,8 +27,9 @@ class UGCNetMockTestService:
         """
         Calculate how many questions should come from each chapter based on weightage
         """
-        weightage_info = get_subject_weightage_info(subject_id, paper_type)
-        if not weightage_info:
+        # Chapters and their weightage belong to the subject, which is already paper specific
+        weightage_info = next(iter(get_subject_weightage_info(subject_id).values()), None)
+        if not weightage_info or not weightage_info['chapters']:
             raise ValueError(f"Subject {subject_id} not found or has no weightage info")
         
         distribution = {}
@@ -77,10 +80,13 @@ class UGCNetMockTestService:
         count: int,
         difficulty_distribution: Optional[Dict[str, float]] = None,
         source_distribution: Optional[Dict[str, float]] = None,
-        exclude_question_ids: Optional[List[int]] = None
+        exclude_question_ids: Optional[List[int]] = None,
+        seed: Optional[int] = None
     ) -> List[QuestionBank]:
         """
         Get questions from question bank based on criteria
+        
+        The same seed and question bank contents always give the same ordered selection.
         """
         if difficulty_distribution is None:
             difficulty_distribution = {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}
@@ -88,64 +94,14 @@ class UGCNetMockTestService:
         if source_distribution is None:
             source_distribution = {'previous_year': 0.7, 'ai_generated': 0.3}
         
-        if exclude_question_ids is None:
-            exclude_question_ids = []
-        
-        selected_questions = []
-        
-        # Calculate counts for each difficulty and source
-        for difficulty, diff_ratio in difficulty_distribution.items():
-            diff_count = max(1, round(count * diff_ratio))
-            
-            for source, source_ratio in source_distribution.items():
-                source_count = max(1, round(diff_count * source_ratio))
-                
-                # Query questions
-                query = QuestionBank.query.filter(
-                    and_(
-                        QuestionBank.chapter_id == chapter_id,
-                        QuestionBank.difficulty == difficulty,
-                        QuestionBank.source == source,
-                        QuestionBank.is_verified == True,
-                        ~QuestionBank.id.in_(exclude_question_ids)
-                    )
-                )
-                
-                available_questions = query.all()
-                
-                if len(available_questions) >= source_count:
-                    # Randomly select required count
-                    selected = random.sample(available_questions, source_count)
-                    selected_questions.extend(selected)
-                    exclude_question_ids.extend([q.id for q in selected])
-                else:
-                    # Use all available questions
-                    selected_questions.extend(available_questions)
-                    exclude_question_ids.extend([q.id for q in available_questions])
-                
-                # Break if we have enough questions
-                if len(selected_questions) >= count:
-                    break
-            
-            if len(selected_questions) >= count:
-                break
-        
-        # If we still don't have enough, fill with any available questions
-        if len(selected_questions) < count:
-            remaining_needed = count - len(selected_questions)
-            
-            fallback_query = QuestionBank.query.filter(
-                and_(
-                    QuestionBank.chapter_id == chapter_id,
-                    QuestionBank.is_verified == True,
-                    ~QuestionBank.id.in_(exclude_question_ids)
-                )
-            )
-            
-            fallback_questions = fallback_query.limit(remaining_needed).all()
-            selected_questions.extend(fallback_questions)
+        assembly = PaperAssembler(difficulty_distribution, source_distribution).assemble(
+            {chapter_id: count},
+            {chapter_id: question_pool_index.get_cells(chapter_id, is_verified=True)},
+            random.Random(seed),
+            exclude_question_ids
+        )
         
-        return selected_questions[:count]  # Ensure we don't exceed the count
+        return hydrate_questions(assembly['selected_ids'][chapter_id])
     
     @staticmethod
     def generate_mock_test_questions(
@@ -153,11 +109,19 @@ class UGCNetMockTestService:
         paper_type: str = 'paper2',
         total_questions: int = 50,
         difficulty_distribution: Optional[Dict[str, float]] = None,
-        source_distribution: Optional[Dict[str, float]] = None
+        source_distribution: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = None
     ) -> Dict:
         """
         Generate a complete mock test with proper question distribution
+        
+        The chapter x difficulty x source allocation is solved in one step over
+        the in-memory question pools and the chosen rows are loaded in one query.
         """
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        rng = random.Random(seed)
+        
         if difficulty_distribution is None:
             difficulty_distribution = {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}
         
@@ -168,27 +132,32 @@ class UGCNetMockTestService:
         chapter_distribution = UGCNetMockTestService.calculate_chapter_question_distribution(
             subject_id, paper_type, total_questions
         )
+        chapter_quotas = {
+            chapter_id: question_count
+            for chapter_id, question_count in chapter_distribution['distribution'].items()
+            if question_count > 0
+        }
         
-        mock_test_questions = []
-        chapter_wise_questions = {}
-        exclude_question_ids = []
-        
-        for chapter_id, question_count in chapter_distribution['distribution'].items():
-            if question_count > 0:
-                chapter_questions = UGCNetMockTestService.get_questions_by_criteria(
-                    chapter_id=chapter_id,
-                    count=question_count,
-                    difficulty_distribution=difficulty_distribution,
-                    source_distribution=source_distribution,
-                    exclude_question_ids=exclude_question_ids
-                )
-                
-                chapter_wise_questions[chapter_id] = chapter_questions
-                mock_test_questions.extend(chapter_questions)
-                exclude_question_ids.extend([q.id for q in chapter_questions])
+        question_pool_index.load_chapters(chapter_quotas.keys())
+        assembly = PaperAssembler(difficulty_distribution, source_distribution).assemble(
+            chapter_quotas,
+            {chapter_id: question_pool_index.get_cells(chapter_id, is_verified=True) for chapter_id in chapter_quotas},
+            rng
+        )
+        
+        questions_by_id = {
+            q.id: q for q in hydrate_questions(
+                [q_id for selected_ids in assembly['selected_ids'].values() for q_id in selected_ids]
+            )
+        }
+        chapter_wise_questions = {
+            chapter_id: [questions_by_id[q_id] for q_id in selected_ids if q_id in questions_by_id]
+            for chapter_id, selected_ids in assembly['selected_ids'].items()
+        }
+        mock_test_questions = [q for questions in chapter_wise_questions.values() for q in questions]
         
         # Shuffle the final question order
-        random.shuffle(mock_test_questions)
+        rng.shuffle(mock_test_questions)
         
         return {
             'questions': mock_test_questions,
@@ -196,7 +165,9 @@ class UGCNetMockTestService:
             'weightage_info': chapter_distribution['weightage_info'],
             'total_questions': len(mock_test_questions),
             'difficulty_distribution': difficulty_distribution,
-            'source_distribution': source_distribution
+            'source_distribution': source_distribution,
+            'relaxed_constraints': assembly['relaxations'],
+            'seed': seed
         }
     
     @staticmethod
@@ -5,10 +5,11 @@ Handles the generation of UGC NET mock papers based on weightage system
 
 import random
 import json
-from typing import Dict, List, Any
+from typing import Container, Dict, List, Any, Optional, Tuple
 from app import db
 from app.models import Subject, Chapter, QuestionBank
-from app.utils.seed_subjects_and_chapters import get_subject_weightage_info
+from app.services.paper_assembler import PaperAssembler
+from app.services.question_pool_index import question_pool_index, hydrate_questions, get_shared_bank_version
 
 
 class UGCNetPaperGenerator:
@@ -18,7 +19,8 @@ class UGCNetPaperGenerator:
         self.min_questions_per_chapter = 1
         self.max_questions_per_chapter = 15
     
-    def generate_paper(self, config: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_paper(self, config: Dict[str, Any], seed: Optional[int] = None,
+                       avoid_ids: Optional[Container] = None) -> Dict[str, Any]:
         """
         Generate a UGC NET paper based on configuration
         
@@ -30,50 +32,32 @@ class UGCNetPaperGenerator:
                 - difficulty_distribution: Dict with easy, medium, hard percentages
                 - source_distribution: Dict with previous_year, ai_generated percentages
                 - weightage_config: Optional custom weightage configuration
+                - difficulty_band: Optional {'min', 'max'} calibrated IRT difficulty to target
+            seed: Optional seed; the same seed and question bank version give the same paper
+            avoid_ids: Optional question IDs (e.g. already seen by the user) to use only as a last resort
         
         Returns:
-            Dictionary with generated paper data and statistics
+            Dictionary with generated paper data, statistics, seed and bank_version
         """
         try:
             subject_id = config['subject_id']
             paper_type = config['paper_type']
             total_questions = config['total_questions']
             
+            seed = self._resolve_seed(seed)
+            rng = random.Random(seed)
+            
             # Handle mock test (Paper 1 + Paper 2)
             if paper_type == 'mock':
-                return self._generate_mock_test(config)
+                return self._generate_mock_test(config, seed, avoid_ids)
             
             # Get subject and validate
             subject = Subject.query.get(subject_id)
             if not subject:
                 return {'success': False, 'error': 'Subject not found'}
             
-            # Get chapters with weightage
-            weightage_config = config.get('weightage_config')
-            if weightage_config:
-                # Handle custom weightage config (dict mapping chapter_id to weightage)
-                if isinstance(weightage_config, dict) and 'chapters' not in weightage_config:
-                    # Convert simple weightage dict to proper format
-                    chapters_data = []
-                    for chapter_id_str, weightage in weightage_config.items():
-                        try:
-                            chapter_id = int(chapter_id_str)
-                            chapter = Chapter.query.get(chapter_id)
-                            if chapter and chapter.subject_id == subject_id:
-                                chapters_data.append({
-                                    'chapter_id': chapter_id,
-                                    'chapter_name': chapter.name,
-                                    'weightage': weightage
-                                })
-                        except (ValueError, TypeError):
-                            continue
-                else:
-                    # Use provided chapters data directly
-                    chapters_data = weightage_config.get('chapters', [])
-            else:
-                # Use default weightage info from seed data
-                weightage_info = get_subject_weightage_info(subject_id)
-                chapters_data = weightage_info.get('chapters', []) if weightage_info else []
+            # Get chapters with weightage (one query for the whole subject)
+            chapters_data = self._get_chapters_data(subject_id, config.get('weightage_config'))
             
             if not chapters_data:
                 return {'success': False, 'error': 'No chapters found for this subject'}
@@ -92,17 +76,20 @@ class UGCNetPaperGenerator:
                 'source_distribution': {'previous_year': 0, 'ai_generated': 0, 'manual': 0}
             }
             
+            # Select questions for all chapters with one pool load and one hydration query
+            questions_by_chapter, relaxations = self._get_questions_for_distribution(
+                question_distribution,
+                config.get('difficulty_distribution') or {'easy': 30, 'medium': 50, 'hard': 20},
+                config.get('source_distribution') or {'previous_year': 70, 'ai_generated': 30},
+                rng,
+                avoid_ids,
+                self._get_difficulty_band(config)
+            )
+            statistics['relaxed_constraints'] = relaxations
+            
             for chapter_info in question_distribution:
-                chapter_id = chapter_info['chapter_id']
                 required_questions = chapter_info['questions_needed']
-                
-                # Get questions for this chapter
-                chapter_questions = self._get_chapter_questions(
-                    chapter_id,
-                    required_questions,
-                    config.get('difficulty_distribution', {}),
-                    config.get('source_distribution', {})
-                )
+                chapter_questions = questions_by_chapter.get(chapter_info['chapter_id'], [])
                 
                 generated_questions.extend(chapter_questions)
                 
@@ -122,7 +109,7 @@ class UGCNetPaperGenerator:
                     statistics['source_distribution'][source] += 1
             
             # Shuffle questions to randomize order
-            random.shuffle(generated_questions)
+            rng.shuffle(generated_questions)
             
             statistics['total_questions'] = len(generated_questions)
             
@@ -141,12 +128,82 @@ class UGCNetPaperGenerator:
                     'total_questions': len(generated_questions),
                     'questions': generated_questions
                 },
-                'statistics': statistics
+                'statistics': statistics,
+                'seed': seed,
+                'bank_version': question_pool_index.version
             }
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def regenerate_paper(self, config: Dict[str, Any], seed: int, bank_version: Optional[int],
+                         avoid_ids: Optional[Container] = None) -> Dict[str, Any]:
+        """
+        Rebuild a previously generated paper from its seed if the question bank is unchanged
+        
+        Papers generated with avoid_ids only come out the same when given the same avoided IDs.
+        """
+        if bank_version is None:
+            return {'success': False, 'error': 'Paper was generated without a shared question bank version'}
+        
+        if get_shared_bank_version() != bank_version:
+            return {'success': False, 'error': 'Question bank has changed since this paper was generated'}
+        
+        return self.generate_paper(config, seed=seed, avoid_ids=avoid_ids)
+    
+    def _resolve_seed(self, seed: Optional[int]) -> int:
+        """Use the given seed or draw a fresh one that fits a signed 64-bit column"""
+        return seed if seed is not None else random.SystemRandom().getrandbits(63)
+    
+    def _get_chapters_data(self, subject_id: int, weightage_config: Any) -> List[Dict]:
+        """Resolve chapter weightages for a subject with a single chapter query"""
+        
+        # Use provided chapters data directly
+        if isinstance(weightage_config, dict) and 'chapters' in weightage_config:
+            return weightage_config.get('chapters', [])
+        
+        # Handle custom weightage config (dict mapping chapter_id to weightage)
+        custom_weightages = {}
+        if isinstance(weightage_config, dict):
+            for chapter_id_str, weightage in weightage_config.items():
+                try:
+                    custom_weightages[int(chapter_id_str)] = weightage
+                except (ValueError, TypeError):
+                    continue
+        
+        if custom_weightages:
+            chapters = Chapter.query.filter(
+                Chapter.id.in_(list(custom_weightages.keys())),
+                Chapter.subject_id == subject_id
+            ).all()
+            chapters_by_id = {chapter.id: chapter for chapter in chapters}
+            
+            # Keep the order of the configuration
+            return [
+                {
+                    'chapter_id': chapter_id,
+                    'chapter_name': chapters_by_id[chapter_id].name,
+                    'weightage': weightage
+                }
+                for chapter_id, weightage in custom_weightages.items()
+                if chapter_id in chapters_by_id
+            ]
+        
+        # Use default chapter weightages of the subject
+        chapters = Chapter.query.filter_by(
+            subject_id=subject_id,
+            is_active=True
+        ).order_by(Chapter.chapter_order, Chapter.id).all()
+        
+        return [
+            {
+                'chapter_id': chapter.id,
+                'chapter_name': chapter.name,
+                'weightage': chapter.weightage or 0
+            }
+            for chapter in chapters
+        ]
+    
     def _calculate_question_distribution(self, chapters_data: List[Dict], total_questions: int) -> List[Dict]:
         """Calculate how many questions should come from each chapter based on weightage"""
         
@@ -201,75 +258,81 @@ class UGCNetPaperGenerator:
         
         return distribution
     
-    def _get_chapter_questions(self, chapter_id: int, required_count: int, 
-                             difficulty_dist: Dict, source_dist: Dict) -> List[QuestionBank]:
-        """Get questions for a specific chapter with difficulty and source distribution"""
-        
-        # Get all available questions for this chapter
-        # First try verified questions
-        available_questions = QuestionBank.query.filter_by(
-            chapter_id=chapter_id,
-            is_verified=True
-        ).all()
+    def _get_questions_for_distribution(self, question_distribution: List[Dict],
+                                        difficulty_dist: Dict, source_dist: Dict,
+                                        rng: Optional[random.Random] = None,
+                                        avoid_ids: Optional[Container] = None,
+                                        difficulty_band: Optional[Tuple[float, float]] = None) -> Tuple[Dict[int, List[QuestionBank]], List[Dict]]:
+        """
+        Select questions for every chapter of a distribution and load them in one query
         
-        # If no verified questions found, include unverified ones for development/testing
-        if not available_questions:
-            print(f"No verified questions found for chapter {chapter_id}, including unverified questions for testing")
-            available_questions = QuestionBank.query.filter_by(
-                chapter_id=chapter_id
-            ).all()
+        With a calibrated difficulty_band, chapters draw only on questions inside
+        the band while it can fill their quota and on all their questions otherwise.
+        Returns the questions per chapter and the constraints that had to be relaxed.
+        """
+        chapter_quotas = {
+            chapter_info['chapter_id']: chapter_info['questions_needed'] for chapter_info in question_distribution
+        }
         
-        if not available_questions:
-            return []
+        # One narrow query loads the ID pools of every chapter that is not cached yet
+        question_pool_index.load_chapters(chapter_quotas.keys())
         
-        # If we don't have enough questions, return all available
-        if len(available_questions) <= required_count:
-            return available_questions
+        candidates = {}
+        band_relaxations = []
+        for chapter_id, quota in chapter_quotas.items():
+            candidates[chapter_id] = self._get_chapter_candidates(chapter_id)
+            if difficulty_band is None:
+                continue
+            
+            banded = self._get_chapter_candidates(chapter_id, difficulty_band)
+            in_band = sum(len(ids) for ids in banded.values())
+            if in_band >= quota:
+                candidates[chapter_id] = banded
+            else:
+                band_relaxations.append({
+                    'constraint': 'difficulty_band',
+                    'chapter_id': chapter_id,
+                    'difficulty': None,
+                    'source': None,
+                    'count': quota - in_band
+                })
         
-        # Try to maintain difficulty distribution
-        selected_questions = []
+        assembly = PaperAssembler(difficulty_dist, source_dist).assemble(
+            chapter_quotas, candidates, rng, avoid_ids=avoid_ids
+        )
         
-        # Calculate target counts for each difficulty
-        easy_target = int(required_count * difficulty_dist.get('easy', 30) / 100)
-        medium_target = int(required_count * difficulty_dist.get('medium', 50) / 100)
-        hard_target = required_count - easy_target - medium_target
+        # Hydrate only the chosen rows for all chapters at once
+        all_selected_ids = [
+            q_id for selected_ids in assembly['selected_ids'].values() for q_id in selected_ids
+        ]
+        questions_by_id = {q.id: q for q in hydrate_questions(all_selected_ids)}
         
-        # Group questions by difficulty
-        questions_by_difficulty = {
-            'easy': [q for q in available_questions if q.difficulty == 'easy'],
-            'medium': [q for q in available_questions if q.difficulty == 'medium'],
-            'hard': [q for q in available_questions if q.difficulty == 'hard']
+        questions_by_chapter = {
+            chapter_id: [questions_by_id[q_id] for q_id in selected_ids if q_id in questions_by_id]
+            for chapter_id, selected_ids in assembly['selected_ids'].items()
         }
+        return questions_by_chapter, band_relaxations + assembly['relaxations']
+    
+    def _get_chapter_candidates(self, chapter_id: int,
+                                difficulty_band: Optional[Tuple[float, float]] = None) -> Dict:
+        """Candidate question IDs of a chapter grouped by (difficulty, source)"""
         
-        # Select questions by difficulty
-        targets = [
-            ('easy', easy_target),
-            ('medium', medium_target),
-            ('hard', hard_target)
-        ]
+        # First try verified questions
+        candidates = question_pool_index.get_cells(chapter_id, is_verified=True, difficulty_band=difficulty_band)
         
-        for difficulty, target in targets:
-            difficulty_questions = questions_by_difficulty[difficulty]
-            if difficulty_questions:
-                # Randomly select from available questions of this difficulty
-                selected_count = min(target, len(difficulty_questions))
-                selected = random.sample(difficulty_questions, selected_count)
-                selected_questions.extend(selected)
-        
-        # If we still need more questions, randomly pick from remaining
-        if len(selected_questions) < required_count:
-            remaining_questions = [
-                q for q in available_questions 
-                if q not in selected_questions
-            ]
-            
-            additional_needed = required_count - len(selected_questions)
-            if remaining_questions:
-                additional_count = min(additional_needed, len(remaining_questions))
-                additional = random.sample(remaining_questions, additional_count)
-                selected_questions.extend(additional)
+        # If no verified questions found, include unverified ones for development/testing
+        if not candidates:
+            print(f"No verified questions found for chapter {chapter_id}, including unverified questions for testing")
+            candidates = question_pool_index.get_cells(chapter_id, is_verified=None, difficulty_band=difficulty_band)
         
-        return selected_questions[:required_count]  # Ensure we don't exceed required count
+        return candidates
+    
+    def _get_difficulty_band(self, config: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+        """(min, max) calibrated IRT difficulty band of a config, None when not set"""
+        band = config.get('difficulty_band')
+        if not band:
+            return None
+        return float(band.get('min', float('-inf'))), float(band.get('max', float('inf')))
     
     def validate_paper_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """Validate the paper generation configuration"""
@@ -310,12 +373,22 @@ class UGCNetPaperGenerator:
             if abs(total_percentage - 100) > 0.1:
                 errors.append('Source distribution percentages must sum to 100')
         
+        # Validate calibrated difficulty band
+        if config.get('difficulty_band'):
+            try:
+                band_min, band_max = self._get_difficulty_band(config)
+                if band_min > band_max:
+                    errors.append('Difficulty band min must not exceed max')
+            except (AttributeError, TypeError, ValueError):
+                errors.append('Difficulty band must be an object with numeric min and/or max')
+        
         return {
             'valid': len(errors) == 0,
             'errors': errors
         }
     
-    def generate_practice_test(self, config: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_practice_test(self, config: Dict[str, Any], seed: Optional[int] = None,
+                               avoid_ids: Optional[Container] = None) -> Dict[str, Any]:
         """
         Generate a UGC NET practice test with focused chapter selection
         
@@ -328,11 +401,16 @@ class UGCNetPaperGenerator:
                 - difficulty_distribution: Dict with easy, medium, hard percentages
                 - source_distribution: Dict with previous_year, ai_generated percentages
                 - practice_type: 'chapter_wise', 'mixed', 'revision'
+            seed: Optional seed; the same seed and question bank version give the same test
+            avoid_ids: Optional question IDs (e.g. already seen by the user) to use only as a last resort
         
         Returns:
-            Dictionary with generated practice test data and statistics
+            Dictionary with generated practice test data, statistics, seed and bank_version
         """
         try:
+            seed = self._resolve_seed(seed)
+            rng = random.Random(seed)
+            
             subject_id = config['subject_id']
             paper_type = config.get('paper_type', 'paper2')
             total_questions = config.get('total_questions', 20)
@@ -412,17 +490,20 @@ class UGCNetPaperGenerator:
                 'source_distribution': {'previous_year': 0, 'ai_generated': 0, 'manual': 0}
             }
             
+            # Select questions for all chapters with one pool load and one hydration query
+            questions_by_chapter, relaxations = self._get_questions_for_distribution(
+                question_distribution,
+                config.get('difficulty_distribution') or {'easy': 30, 'medium': 50, 'hard': 20},
+                config.get('source_distribution') or {'previous_year': 70, 'ai_generated': 30},
+                rng,
+                avoid_ids,
+                self._get_difficulty_band(config)
+            )
+            statistics['relaxed_constraints'] = relaxations
+            
             for chapter_info in question_distribution:
-                chapter_id = chapter_info['chapter_id']
                 required_questions = chapter_info['questions_needed']
-                
-                # Get questions for this chapter
-                chapter_questions = self._get_chapter_questions(
-                    chapter_id,
-                    required_questions,
-                    config.get('difficulty_distribution', {'easy': 30, 'medium': 50, 'hard': 20}),
-                    config.get('source_distribution', {'previous_year': 70, 'ai_generated': 30})
-                )
+                chapter_questions = questions_by_chapter.get(chapter_info['chapter_id'], [])
                 
                 # Convert QuestionBank objects to dictionaries for practice test
                 chapter_questions_data = []
@@ -450,7 +531,7 @@ class UGCNetPaperGenerator:
                     statistics['source_distribution'][source] += 1
             
             # Shuffle questions to randomize order
-            random.shuffle(generated_questions)
+            rng.shuffle(generated_questions)
             
             statistics['total_questions'] = len(generated_questions)
             
@@ -480,7 +561,9 @@ class UGCNetPaperGenerator:
                     'selected_chapters': chapter_ids
                 },
                 'statistics': statistics,
-                'practice_stats': practice_stats
+                'practice_stats': practice_stats,
+                'seed': seed,
+                'bank_version': question_pool_index.version
             }
             
         except Exception as e:
@@ -502,12 +585,14 @@ class UGCNetPaperGenerator:
         else:
             return 'medium'
     
-    def _generate_mock_test(self, config: Dict[str, Any]) -> Dict[str, Any]:
+    def _generate_mock_test(self, config: Dict[str, Any], seed: int,
+                            avoid_ids: Optional[Container] = None) -> Dict[str, Any]:
         """
         Generate a UGC NET mock test with both Paper 1 and Paper 2
         
         Args:
             config: Dictionary containing mock test configuration
+            seed: Seed from which the seeds of both papers and the final order are derived
         
         Returns:
             Dictionary with generated mock test data
@@ -538,10 +623,15 @@ class UGCNetPaperGenerator:
                 'subject_id': paper1_subject.id,
                 'paper_type': 'paper1',
                 'total_questions': paper1_questions,
-                'difficulty_distribution': difficulty_distribution
+                'difficulty_distribution': difficulty_distribution,
+                'difficulty_band': config.get('difficulty_band')
             }
             
-            paper1_result = self.generate_paper(paper1_config)
+            # Derive independent seeds for each paper and the final shuffle
+            rng = random.Random(seed)
+            paper1_seed, paper2_seed = rng.getrandbits(63), rng.getrandbits(63)
+            
+            paper1_result = self.generate_paper(paper1_config, seed=paper1_seed, avoid_ids=avoid_ids)
             if not paper1_result['success']:
                 return {'success': False, 'error': f'Failed to generate Paper 1: {paper1_result["error"]}'}
             
@@ -550,10 +640,11 @@ class UGCNetPaperGenerator:
                 'subject_id': subject_id,
                 'paper_type': 'paper2',
                 'total_questions': paper2_questions,
-                'difficulty_distribution': difficulty_distribution
+                'difficulty_distribution': difficulty_distribution,
+                'difficulty_band': config.get('difficulty_band')
             }
             
-            paper2_result = self.generate_paper(paper2_config)
+            paper2_result = self.generate_paper(paper2_config, seed=paper2_seed, avoid_ids=avoid_ids)
             if not paper2_result['success']:
                 return {'success': False, 'error': f'Failed to generate Paper 2: {paper2_result["error"]}'}
             
@@ -574,7 +665,7 @@ class UGCNetPaperGenerator:
             
             # Shuffle to randomize order while maintaining paper segregation
             # (In actual exam, papers are separate, but for our mock test we can mix)
-            random.shuffle(all_questions)
+            rng.shuffle(all_questions)
             
             # Combine statistics
             combined_stats = {
@@ -618,7 +709,9 @@ class UGCNetPaperGenerator:
                     'total_questions': len(all_questions),
                     'questions': all_questions
                 },
-                'statistics': combined_stats
+                'statistics': combined_stats,
+                'seed': seed,
+                'bank_version': paper2_result['bank_version']
             }
             
         except Exception as e:
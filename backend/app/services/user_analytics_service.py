@@ -6,7 +6,8 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 from sqlalchemy import desc
 from app import db
-from app.models import User, UGCNetMockAttempt, UGCNetPracticeAttempt, UGCNetMockTest
+from app.models import User, UGCNetMockAttempt, UGCNetPracticeAttempt, UGCNetMockTest, QuestionBank
+from app.services.attempt_response_service import AttemptResponseService
 
 
 class UserAnalyticsService:
@@ -93,16 +94,15 @@ class UserAnalyticsService:
             for date, scores in sorted(attempts_by_date.items())
         ]
 
+    def _get_topic_scores(self, attempts):
+        """Correct and total responses per topic across the attempts, grouped in SQL"""
+        return AttemptResponseService.get_breakdown(
+            QuestionBank.topic, AttemptResponseService.attempts_criterion(attempts)
+        )
+
     def _calculate_strengths(self, attempts):
         """Calculate areas of strength"""
-        topic_scores = defaultdict(lambda: {"correct": 0, "total": 0})
-        
-        for attempt in attempts:
-            if hasattr(attempt, 'get_topic_wise_performance'):
-                topic_perf = attempt.get_topic_wise_performance()
-                for topic, scores in topic_perf.items():
-                    topic_scores[topic]["correct"] += scores["correct"]
-                    topic_scores[topic]["total"] += scores["total"]
+        topic_scores = self._get_topic_scores(attempts)
         
         strengths = []
         for topic, scores in topic_scores.items():
@@ -115,14 +115,7 @@ class UserAnalyticsService:
 
     def _calculate_weaknesses(self, attempts):
         """Calculate areas needing improvement"""
-        topic_scores = defaultdict(lambda: {"correct": 0, "total": 0})
-        
-        for attempt in attempts:
-            if hasattr(attempt, 'get_topic_wise_performance'):
-                topic_perf = attempt.get_topic_wise_performance()
-                for topic, scores in topic_perf.items():
-                    topic_scores[topic]["correct"] += scores["correct"]
-                    topic_scores[topic]["total"] += scores["total"]
+        topic_scores = self._get_topic_scores(attempts)
         
         weaknesses = []
         for topic, scores in topic_scores.items():
@@ -146,14 +139,9 @@ class UserAnalyticsService:
 
     def _calculate_accuracy_by_difficulty(self, attempts):
         """Calculate accuracy by question difficulty"""
-        difficulty_scores = defaultdict(lambda: {"correct": 0, "total": 0})
-        
-        for attempt in attempts:
-            if hasattr(attempt, 'get_difficulty_wise_performance'):
-                diff_perf = attempt.get_difficulty_wise_performance()
-                for diff, scores in diff_perf.items():
-                    difficulty_scores[diff]["correct"] += scores["correct"]
-                    difficulty_scores[diff]["total"] += scores["total"]
+        difficulty_scores = AttemptResponseService.get_breakdown(
+            QuestionBank.difficulty, AttemptResponseService.attempts_criterion(attempts)
+        )
         
         return {
             diff: round((scores["correct"] / scores["total"] * 100), 2) if scores["total"] > 0 else 0
@@ -0,0 +1,319 @@
+"""
+User Dashboard Service
+Per-user dashboard read model. user_dashboards keeps a document per user with
+the totals, averages, recent attempts, study streak and readiness inputs of
+their completed attempts. Submits fold the attempt into it in the same
+transaction, deletes and re-scoring drop it to be rebuilt on the next read.
+The assembled dashboard response is cached in Redis until one of the user's
+attempt or profile events (or a subject change) invalidates it, so a page
+load is a single key read
+"""
+
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import desc, func, union
+from sqlalchemy.dialects.sqlite import insert
+
+from app import db, redis_client
+from app.models import Subject, UGCNetMockAttempt, UGCNetPracticeAttempt, User, UserDashboard
+from app.services.cache_registry import cache_registry
+from app.services.domain_events import (
+    ATTEMPT_COMPLETED, ATTEMPT_DELETED, ATTEMPT_RESCORED, SUBJECT_CHANGED, USER_CHANGED
+)
+from app.services.scoring_engine import get_qualification_status
+from app.utils.time_buckets import bucket_expression
+from app.utils.timezone_utils import attempt_time_to_utc, get_ist_now, utc_to_ist
+
+DASHBOARD_KEY = 'user_dashboard_{user_id}'
+# Subject changes don't name users, their keys are found through this set
+DASHBOARD_INDEX_KEY = 'user_dashboard_index'
+# Bounds the drift of the rank, which moves with other users' attempts
+DASHBOARD_CACHE_TIMEOUT = 3600  # 1 hour
+RECENT_ATTEMPTS = 5
+# Readiness is judged on the average of the latest mock attempts
+READINESS_MOCK_ATTEMPTS = 5
+
+ATTEMPT_MODELS = {'mock': UGCNetMockAttempt, 'practice': UGCNetPracticeAttempt}
+# Documents of another version are rebuilt on their next read
+DOCUMENT_VERSION = 2
+
+cache_registry.register(
+    DASHBOARD_KEY, ATTEMPT_COMPLETED, ATTEMPT_RESCORED, ATTEMPT_DELETED, USER_CHANGED, SUBJECT_CHANGED,
+    index_key=DASHBOARD_INDEX_KEY
+)
+
+
+class UserDashboardService:
+    """Service for the per-user dashboard read model"""
+    
+    @staticmethod
+    def _empty_document() -> Dict:
+        return {
+            'version': DOCUMENT_VERSION,
+            'totals': {
+                attempt_type: {'attempts': 0, 'scored': 0, 'percentage_sum': 0.0}
+                for attempt_type in ATTEMPT_MODELS
+            },
+            'correct_answers': 0,
+            'total_questions': 0,
+            'time_taken': 0,
+            # Completion times are naive UTC, practice attempts store theirs in IST
+            'recent_attempts': [],
+            # [completed_at, percentage] of the latest mock attempts, newest first
+            'recent_mock_percentages': [],
+            # [completed_at, qualification_status] of the latest mock attempt
+            'latest_mock': None,
+            'last_activity': None,
+            # The run of consecutive study days (in IST) ending on last_day
+            'streak': {'last_day': None, 'length': 0}
+        }
+    
+    @staticmethod
+    def _fold(document: Dict, attempt_type: str, attempt) -> bool:
+        """Add a completed attempt to a document, False when it can't be folded in and needs a rebuild"""
+        completed_at = attempt_time_to_utc(attempt_type, attempt.completed_at)
+        day = utc_to_ist(completed_at).date()
+        streak = document['streak']
+        last_day = date.fromisoformat(streak['last_day']) if streak['last_day'] else None
+        if last_day is None or day > last_day:
+            streak['length'] = streak['length'] + 1 if last_day and day == last_day + timedelta(days=1) else 1
+            streak['last_day'] = day.isoformat()
+        elif day <= last_day - timedelta(days=streak['length']):
+            # An older day may join the run with days before it that the document doesn't know
+            return False
+        
+        completed_at = completed_at.isoformat()
+        totals = document['totals'][attempt_type]
+        totals['attempts'] += 1
+        if attempt.percentage is not None:
+            totals['scored'] += 1
+            totals['percentage_sum'] += attempt.percentage
+        document['correct_answers'] += attempt.correct_answers or 0
+        document['total_questions'] += attempt.total_questions or 0
+        document['time_taken'] += attempt.time_taken or 0
+        document['last_activity'] = max(document['last_activity'] or completed_at, completed_at)
+        
+        recent = document['recent_attempts']
+        recent.append({'type': attempt_type, 'data': attempt.to_dict(), 'completed_at': completed_at})
+        recent.sort(key=lambda item: item['completed_at'], reverse=True)
+        del recent[RECENT_ATTEMPTS:]
+        
+        if attempt_type == 'mock':
+            if attempt.percentage is not None:
+                percentages = document['recent_mock_percentages']
+                percentages.append([completed_at, attempt.percentage])
+                percentages.sort(reverse=True)
+                del percentages[READINESS_MOCK_ATTEMPTS:]
+            if not document['latest_mock'] or completed_at >= document['latest_mock'][0]:
+                document['latest_mock'] = [completed_at, attempt.qualification_status]
+        return True
+    
+    def record(self, attempt_type: str, attempts: List):
+        """Fold newly completed attempts into their users' documents, the caller commits"""
+        for attempt in attempts:
+            if not attempt.completed_at:
+                continue
+            row = db.session.get(UserDashboard, attempt.user_id)
+            if row is None:
+                # Built on the next read, from committed attempts including this one
+                continue
+            document = row.get_document()
+            if document.get('version') == DOCUMENT_VERSION and self._fold(document, attempt_type, attempt):
+                row.set_document(document)
+            else:
+                db.session.delete(row)
+    
+    def discard(self, user_ids: Iterable[int]):
+        """Drop documents to be rebuilt on their next read, after attempts were removed or re-scored"""
+        user_ids = set(user_ids)
+        if user_ids:
+            UserDashboard.query.filter(UserDashboard.user_id.in_(user_ids)).delete(synchronize_session=False)
+    
+    def rebuild(self, user_id: int) -> Dict:
+        """Document of a user built from their completed attempts"""
+        document = self._empty_document()
+        recent = []
+        last_activity = None
+        for attempt_type, model in ATTEMPT_MODELS.items():
+            completed = model.query.filter(model.user_id == user_id, model.is_completed == True)
+            totals = completed.with_entities(
+                func.count(model.id), func.count(model.percentage), func.sum(model.percentage),
+                func.sum(model.correct_answers), func.sum(model.total_questions), func.sum(model.time_taken),
+                func.max(model.completed_at)
+            ).one()
+            document['totals'][attempt_type] = {
+                'attempts': totals[0], 'scored': totals[1], 'percentage_sum': totals[2] or 0.0
+            }
+            document['correct_answers'] += totals[3] or 0
+            document['total_questions'] += totals[4] or 0
+            document['time_taken'] += totals[5] or 0
+            latest_completed_at = attempt_time_to_utc(attempt_type, totals[6])
+            if latest_completed_at and (last_activity is None or latest_completed_at > last_activity):
+                last_activity = latest_completed_at
+            
+            latest = completed.filter(model.completed_at.isnot(None)).order_by(desc(model.completed_at)).limit(
+                max(RECENT_ATTEMPTS, READINESS_MOCK_ATTEMPTS if attempt_type == 'mock' else 0)
+            ).all()
+            recent.extend(
+                {
+                    'type': attempt_type, 'data': attempt.to_dict(),
+                    'completed_at': attempt_time_to_utc(attempt_type, attempt.completed_at).isoformat()
+                }
+                for attempt in latest[:RECENT_ATTEMPTS]
+            )
+            if attempt_type == 'mock' and latest:
+                document['recent_mock_percentages'] = [
+                    [attempt_time_to_utc('mock', attempt.completed_at).isoformat(), attempt.percentage]
+                    for attempt in latest[:READINESS_MOCK_ATTEMPTS] if attempt.percentage is not None
+                ]
+                document['latest_mock'] = [
+                    attempt_time_to_utc('mock', latest[0].completed_at).isoformat(), latest[0].qualification_status
+                ]
+        
+        recent.sort(key=lambda item: item['completed_at'], reverse=True)
+        document['recent_attempts'] = recent[:RECENT_ATTEMPTS]
+        document['last_activity'] = last_activity.isoformat() if last_activity else None
+        document['streak'] = self._rebuild_streak(user_id)
+        return document
+    
+    @staticmethod
+    def _rebuild_streak(user_id: int) -> Dict:
+        days = union(*(
+            db.session.query(
+                bucket_expression(model.completed_at, 'day', stored_in_ist=attempt_type == 'practice').label('day')
+            ).filter(
+                model.user_id == user_id, model.is_completed == True, model.completed_at.isnot(None)
+            )
+            for attempt_type, model in ATTEMPT_MODELS.items()
+        )).subquery()
+        study_days = [
+            date.fromisoformat(day) for (day,) in db.session.query(days.c.day).order_by(desc(days.c.day))
+        ]
+        if not study_days:
+            return {'last_day': None, 'length': 0}
+        
+        length = 1
+        while length < len(study_days) and study_days[length] == study_days[0] - timedelta(days=length):
+            length += 1
+        return {'last_day': study_days[0].isoformat(), 'length': length}
+    
+    def get_document(self, user_id: int) -> Dict:
+        """A user's document, built and stored on first use"""
+        row = db.session.get(UserDashboard, user_id)
+        if row is not None:
+            document = row.get_document()
+            if document.get('version') == DOCUMENT_VERSION:
+                return document
+            db.session.delete(row)
+            db.session.commit()
+        
+        document = self.rebuild(user_id)
+        # A concurrent read may have stored it first, both built the same document
+        db.session.execute(
+            insert(UserDashboard).values(user_id=user_id, document=json.dumps(document)).on_conflict_do_nothing()
+        )
+        db.session.commit()
+        return document
+    
+    # Dashboard responses
+    
+    @staticmethod
+    def get_cached(user_id: int) -> Optional[bytes]:
+        """Cached dashboard response body, None on a miss or when Redis is unavailable"""
+        try:
+            if redis_client:
+                return redis_client.get(DASHBOARD_KEY.format(user_id=user_id))
+        except Exception as redis_error:
+            print(f"Redis user dashboard error: {redis_error}")
+        return None
+    
+    def get_dashboard(self, user: User) -> Dict:
+        """Dashboard response of a user, assembled from their document and cached"""
+        document = self.get_document(user.id)
+        stats = self.describe(document)
+        subjects = Subject.query.filter_by(is_active=True).all()
+        dashboard = {
+            'user': user.to_dict(),
+            'stats': {
+                **stats,
+                'subjects_available': len(subjects),
+                'rank': self._mock_rank(user.id) if stats['average_score'] > 0 else None
+            },
+            'recent_attempts': document['recent_attempts'],
+            'subjects': [subject.to_dict() for subject in subjects]
+        }
+        
+        try:
+            if redis_client:
+                # Streaks count IST days, so nothing cached outlives the day
+                now = get_ist_now().replace(tzinfo=None)
+                midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+                timeout = max(1, min(DASHBOARD_CACHE_TIMEOUT, int((midnight - now).total_seconds())))
+                key = DASHBOARD_KEY.format(user_id=user.id)
+                pipeline = redis_client.pipeline()
+                pipeline.setex(key, timeout, json.dumps(dashboard, default=str))
+                pipeline.sadd(DASHBOARD_INDEX_KEY, key)
+                pipeline.expire(DASHBOARD_INDEX_KEY, DASHBOARD_CACHE_TIMEOUT)
+                pipeline.execute()
+        except Exception as redis_error:
+            print(f"Redis user dashboard set error: {redis_error}")
+        
+        return dashboard
+    
+    @staticmethod
+    def describe(document: Dict) -> Dict:
+        """Dashboard statistics of a document"""
+        mock, practice = document['totals']['mock'], document['totals']['practice']
+        
+        def average(*totals):
+            scored = sum(total['scored'] for total in totals)
+            return round(sum(total['percentage_sum'] for total in totals) / scored, 2) if scored else 0
+        
+        streak = document['streak']
+        today = get_ist_now().date()
+        study_streak = 0
+        if streak['last_day'] and date.fromisoformat(streak['last_day']) >= today - timedelta(days=1):
+            study_streak = streak['length']
+        
+        percentages = [percentage for _, percentage in document['recent_mock_percentages']]
+        recent_mock_average = round(sum(percentages) / len(percentages), 1) if percentages else None
+        
+        total_questions = document['total_questions']
+        return {
+            'total_attempts': mock['attempts'] + practice['attempts'],
+            'total_mock_attempts': mock['attempts'],
+            'total_practice_attempts': practice['attempts'],
+            'average_score': average(mock, practice),
+            'average_mock_score': average(mock),
+            'average_practice_score': average(practice),
+            'study_streak': study_streak,
+            'qualification_status': document['latest_mock'][1] if document['latest_mock'] else None,
+            'hours_studied': round(document['time_taken'] / 3600, 1),
+            'accuracy_rate': round(document['correct_answers'] / total_questions * 100, 1) if total_questions > 0 else 0.0,
+            'last_activity': document['last_activity'],
+            'readiness': {
+                'recent_mock_average': recent_mock_average,
+                'mock_attempts_considered': len(percentages),
+                'status': get_qualification_status(recent_mock_average) if percentages else None
+            }
+        }
+    
+    @staticmethod
+    def _mock_rank(user_id: int) -> Optional[int]:
+        """Position of the user among all users by average mock percentage"""
+        try:
+            averages = db.session.query(
+                UGCNetMockAttempt.user_id,
+                func.avg(UGCNetMockAttempt.percentage).label('avg_score')
+            ).filter(
+                UGCNetMockAttempt.is_completed == True
+            ).group_by(UGCNetMockAttempt.user_id).subquery()
+            own = db.session.query(averages.c.avg_score).filter(averages.c.user_id == user_id).scalar()
+            if own is None:
+                return None
+            return db.session.query(func.count()).select_from(averages).filter(averages.c.avg_score > own).scalar() + 1
+        except Exception as e:
+            print(f"Error calculating user rank: {e}")
+            return None
@@ -5,7 +5,11 @@ Handles user CRUD operations and management
 from datetime import datetime
 from sqlalchemy import desc, or_
 from app import db
-from app.models import User, UGCNetMockAttempt, UGCNetPracticeAttempt
+from app.models import User, UGCNetMockAttempt, UGCNetPracticeAttempt, AttemptResponse
+from app.services.activity_service import ActivityService
+from app.services.attempt_rescoring_service import AttemptRescoringService
+from app.services.attempt_response_service import AttemptResponseService
+from app.services.question_stats_service import QuestionStatsService
 from app.utils.timezone_utils import get_ist_now
 
 
@@ -179,6 +183,7 @@ class UserManagementService:
             
             db.session.add(user)
             db.session.commit()
+            ActivityService().record_signup(user)
             
             return user.to_dict()
         except Exception as e:
@@ -196,9 +201,14 @@ class UserManagementService:
             if user.is_admin:
                 raise ValueError('Cannot delete admin users')
             
+            # Rows keyed by attempt have no foreign key to the attempts, drop them with the user
+            AttemptRescoringService.unindex_attempts(user.ugc_net_mock_attempts + user.ugc_net_practice_attempts)
+            responses = AttemptResponseService.delete_responses(AttemptResponse.user_id == user.id)
+            
             # Delete the user (cascades will handle related data)
             db.session.delete(user)
             db.session.commit()
+            QuestionStatsService().remove_outcomes(responses)
             
             return True
         except Exception as e:
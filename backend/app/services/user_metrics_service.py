@@ -7,10 +7,20 @@ from sqlalchemy import desc, func, and_, or_
 from app import db
 from app.models import (
     User, UGCNetMockAttempt, UGCNetPracticeAttempt, UGCNetMockTest, 
-    Chapter, Subject, QuestionBank
+    Chapter, Subject, QuestionBank, AttemptResponse
 )
+from app.services.attempt_response_service import AttemptResponseService
+from app.services.memoize import memoize
+from app.services import domain_events
 import json
 
+METRICS_CACHE_TIMEOUT = 900  # 15 minutes
+# A user's metrics only change with their own attempts and profile
+METRICS_EVENTS = (
+    domain_events.ATTEMPT_COMPLETED, domain_events.ATTEMPT_RESCORED, domain_events.ATTEMPT_DELETED,
+    domain_events.USER_CHANGED
+)
+
 
 class UserMetricsService:
     """Service for comprehensive user metrics and analytics"""
@@ -18,6 +28,7 @@ class UserMetricsService:
     def __init__(self):
         pass
     
+    @memoize(ttl=METRICS_CACHE_TIMEOUT, key='user_metrics:{user_id}:{days}', invalidate_on=METRICS_EVENTS)
     def get_comprehensive_user_metrics(self, user_id, days=30):
         """Get comprehensive metrics for AI recommendations and study planning"""
         try:
@@ -236,51 +247,42 @@ class UserMetricsService:
     
     def _identify_chapter_weaknesses(self, practice_attempts):
         """Identify chapters where user performs poorly"""
-        chapter_stats = {}
-        
-        for attempt in practice_attempts:
-            if attempt.is_completed and attempt.percentage is not None:
-                # Parse selected chapters from attempt data
-                if hasattr(attempt, 'selected_chapters') and attempt.selected_chapters:
-                    try:
-                        if isinstance(attempt.selected_chapters, str):
-                            selected_chapters = json.loads(attempt.selected_chapters)
-                        else:
-                            selected_chapters = attempt.selected_chapters
-                        
-                        for chapter_id in selected_chapters:
-                            if chapter_id not in chapter_stats:
-                                chapter = Chapter.query.get(chapter_id)
-                                if chapter:
-                                    chapter_stats[chapter_id] = {
-                                        'chapter_name': chapter.name,
-                                        'subject_name': chapter.subject.name if chapter.subject else 'Unknown',
-                                        'scores': [],
-                                        'attempts': 0
-                                    }
-                            
-                            if chapter_id in chapter_stats:
-                                chapter_stats[chapter_id]['scores'].append(attempt.percentage)
-                                chapter_stats[chapter_id]['attempts'] += 1
-                    except (json.JSONDecodeError, TypeError):
-                        continue
+        completed = [a for a in practice_attempts if a.is_completed and a.percentage is not None]
+        
+        # Per-chapter accuracy over the attempts' responses, grouped in SQL
+        chapter_stats = AttemptResponseService.get_breakdown(
+            AttemptResponse.chapter_id,
+            AttemptResponseService.attempts_criterion(completed),
+            AttemptResponse.chapter_id.isnot(None)
+        )
+        
+        chapter_names = {
+            row.id: (row.name, row.subject_name)
+            for row in db.session.query(
+                Chapter.id, Chapter.name, Subject.name.label('subject_name')
+            ).outerjoin(Subject, Subject.id == Chapter.subject_id).filter(
+                Chapter.id.in_(list(chapter_stats))
+            ).all()
+        } if chapter_stats else {}
         
         # Calculate chapter performance
         chapter_weaknesses = []
         for chapter_id, stats in chapter_stats.items():
-            if stats['scores']:
-                avg_score = sum(stats['scores']) / len(stats['scores'])
-                
-                # Identify as weakness if average score < 50% and has multiple attempts
-                if avg_score < 50 and stats['attempts'] >= 2:
-                    chapter_weaknesses.append({
-                        'chapter_id': chapter_id,
-                        'chapter_name': stats['chapter_name'],
-                        'subject_name': stats['subject_name'],
-                        'average_score': round(avg_score, 1),
-                        'attempts': stats['attempts'],
-                        'weakness_level': 'critical' if avg_score < 30 else 'moderate' if avg_score < 40 else 'minor'
-                    })
+            if chapter_id not in chapter_names:
+                continue
+            avg_score = stats['success_rate']
+            
+            # Identify as weakness if average score < 50% and has multiple attempts
+            if avg_score < 50 and stats['attempts'] >= 2:
+                chapter_name, subject_name = chapter_names[chapter_id]
+                chapter_weaknesses.append({
+                    'chapter_id': chapter_id,
+                    'chapter_name': chapter_name,
+                    'subject_name': subject_name or 'Unknown',
+                    'average_score': round(avg_score, 1),
+                    'attempts': stats['attempts'],
+                    'weakness_level': 'critical' if avg_score < 30 else 'moderate' if avg_score < 40 else 'minor'
+                })
         
         return sorted(chapter_weaknesses, key=lambda x: x['average_score'])
     
@@ -342,13 +344,22 @@ class UserMetricsService:
     
     def _analyze_difficulty_performance(self, practice_attempts):
         """Analyze performance across different difficulty levels"""
-        # This would require difficulty tracking in practice attempts
-        # For now, return basic structure
-        return {
+        difficulty_performance = {
             'easy': {'attempts': 0, 'average_score': 0},
             'medium': {'attempts': 0, 'average_score': 0},
             'hard': {'attempts': 0, 'average_score': 0}
         }
+        
+        completed = [a for a in practice_attempts if a.is_completed]
+        for difficulty, stats in AttemptResponseService.get_breakdown(
+            QuestionBank.difficulty, AttemptResponseService.attempts_criterion(completed)
+        ).items():
+            difficulty_performance[difficulty] = {
+                'attempts': stats['attempts'],
+                'average_score': round(stats['success_rate'], 1)
+            }
+        
+        return difficulty_performance
     
     def _analyze_time_management(self, mock_attempts, practice_attempts):
         """Analyze time management in tests"""
@@ -1,6 +1,15 @@
 from .export_tasks import export_admin_data, export_user_data
 from .notification_tasks import send_daily_reminders, send_monthly_reports
 from .verification_tasks import verify_and_store_quiz_task, verify_single_question_task
+from .paper_pool_tasks import refill_mock_paper_pools
+from .calibration_tasks import calibrate_question_difficulty
+from .question_stats_tasks import flush_question_stats
+from .answer_buffer_tasks import flush_answer_buffers
+from .expiry_tasks import expire_stale_attempts
+from .rollup_tasks import rebuild_attempt_rollups
+from .leaderboard_tasks import rebuild_leaderboards
+from .activity_tasks import rebuild_activity_bitmaps
+from .rescoring_tasks import rescore_question_attempts, backfill_attempt_question_index, backfill_attempt_responses
 
 __all__ = [
     'export_admin_data', 
@@ -8,5 +17,73 @@ __all__ = [
     'send_daily_reminders', 
     'send_monthly_reports',
     'verify_and_store_quiz_task',
-    'verify_single_question_task'
+    'verify_single_question_task',
+    'refill_mock_paper_pools',
+    'calibrate_question_difficulty',
+    'flush_question_stats',
+    'flush_answer_buffers',
+    'expire_stale_attempts',
+    'rebuild_attempt_rollups',
+    'rebuild_leaderboards',
+    'rebuild_activity_bitmaps',
+    'rescore_question_attempts',
+    'backfill_attempt_question_index',
+    'backfill_attempt_responses',
+    'register_tasks'
 ]
+
+
+def register_tasks(celery):
+    """Register background tasks and their periodic schedule with Celery"""
+    celery.task(name='app.tasks.refill_mock_paper_pools')(refill_mock_paper_pools)
+    celery.task(name='app.tasks.flush_question_stats')(flush_question_stats)
+    celery.task(name='app.tasks.flush_answer_buffers')(flush_answer_buffers)
+    celery.task(name='app.tasks.expire_stale_attempts')(expire_stale_attempts)
+    celery.task(name='app.tasks.rebuild_attempt_rollups')(rebuild_attempt_rollups)
+    celery.task(name='app.tasks.rebuild_leaderboards')(rebuild_leaderboards)
+    celery.task(name='app.tasks.rebuild_activity_bitmaps')(rebuild_activity_bitmaps)
+    celery.task(name='app.tasks.calibrate_question_difficulty')(calibrate_question_difficulty)
+    celery.task(name='app.tasks.rescore_question_attempts')(rescore_question_attempts)
+    celery.task(name='app.tasks.backfill_attempt_question_index')(backfill_attempt_question_index)
+    celery.task(name='app.tasks.backfill_attempt_responses')(backfill_attempt_responses)
+    
+    # Old-style setting name, the Flask config passed to Celery uses CELERY_* keys
+    celery.conf.update(CELERYBEAT_SCHEDULE={
+        'refill-mock-paper-pools': {
+            'task': 'app.tasks.refill_mock_paper_pools',
+            'schedule': 60.0
+        },
+        'flush-question-stats': {
+            'task': 'app.tasks.flush_question_stats',
+            'schedule': 30.0
+        },
+        'flush-answer-buffers': {
+            'task': 'app.tasks.flush_answer_buffers',
+            'schedule': 60.0
+        },
+        'expire-stale-attempts': {
+            'task': 'app.tasks.expire_stale_attempts',
+            'schedule': 5 * 60.0
+        },
+        # Reconciles recent rollups and the subject activity with the attempts, backfills missing rollups
+        'rebuild-recent-attempt-rollups': {
+            'task': 'app.tasks.rebuild_attempt_rollups',
+            'schedule': 24 * 60 * 60.0,
+            'args': (3,)
+        },
+        # Restores leaderboards lost to a Redis flush and drops stale entries
+        'rebuild-leaderboards': {
+            'task': 'app.tasks.rebuild_leaderboards',
+            'schedule': 24 * 60 * 60.0
+        },
+        # Reconciles recent activity, or builds the bitmaps from scratch after a Redis flush
+        'rebuild-activity-bitmaps': {
+            'task': 'app.tasks.rebuild_activity_bitmaps',
+            'schedule': 60 * 60.0,
+            'args': (3,)
+        },
+        'calibrate-question-difficulty': {
+            'task': 'app.tasks.calibrate_question_difficulty',
+            'schedule': 24 * 60 * 60.0
+        }
+    })
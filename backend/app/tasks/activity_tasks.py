@@ -0,0 +1,18 @@
+def rebuild_activity_bitmaps(days=None):
+    """Rebuild the activity bitmaps of the last N days, or of the whole retention window when they are missing"""
+    try:
+        # Import here to avoid circular import
+        from datetime import timedelta
+        from app import get_task_app
+        from app.services.activity_service import ActivityService, ist_day
+        
+        with get_task_app().app_context():
+            service = ActivityService()
+            if days and service.is_built():
+                rebuilt = service.rebuild(ist_day() - timedelta(days=days - 1))
+                return f"Rebuilt the activity bitmaps of the last {rebuilt} days"
+            rebuilt = service.rebuild()
+            return f"Rebuilt the activity bitmaps of {rebuilt} days"
+    
+    except Exception as e:
+        return f"Error rebuilding activity bitmaps: {str(e)}"
@@ -0,0 +1,13 @@
+def flush_answer_buffers():
+    """Write buffered practice test auto-saves that are due to the database"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.answer_buffer_service import AnswerBufferService
+        
+        with get_task_app().app_context():
+            flushed = AnswerBufferService().flush()
+            return f"Flushed the buffered answers of {flushed} practice attempts"
+    
+    except Exception as e:
+        return f"Error flushing buffered answers: {str(e)}"
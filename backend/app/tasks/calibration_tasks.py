@@ -0,0 +1,17 @@
+def calibrate_question_difficulty(model='2pl'):
+    """Fit IRT difficulty and discrimination of every question from the stored responses"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.irt_calibration_service import IRTCalibrationService
+        
+        with get_task_app().app_context():
+            summary = IRTCalibrationService(model=model).calibrate()
+            return (
+                f"Calibrated {summary['calibrated_questions']} questions ({summary['model']}) from "
+                f"{summary['responses']} responses of {summary['users']} users in {summary['iterations']} "
+                f"iterations, {summary['elapsed_seconds']}s"
+            )
+    
+    except Exception as e:
+        return f"Error calibrating question difficulty: {str(e)}"
@@ -0,0 +1,13 @@
+def expire_stale_attempts():
+    """Finalize mock and practice attempts left in progress past their time limit"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.attempt_expiry_service import AttemptExpiryService
+        
+        with get_task_app().app_context():
+            finalized = AttemptExpiryService().sweep()
+            return f"Finalized {finalized['mock']} mock and {finalized['practice']} practice attempts"
+    
+    except Exception as e:
+        return f"Error expiring stale attempts: {str(e)}"
@@ -0,0 +1,18 @@
+def rebuild_leaderboards(scope=None, scope_id=None):
+    """Rebuild one leaderboard, or all of them after a Redis flush, from the mock attempts"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.leaderboard_service import LeaderboardService
+        
+        with get_task_app().app_context():
+            service = LeaderboardService()
+            if scope:
+                board = service.resolve_board(scope, scope_id)
+                users = service.rebuild(board)
+                return f"Rebuilt the {board[0]} {board[1]} leaderboard with {users} users"
+            boards = service.rebuild_all()
+            return f"Rebuilt {boards} leaderboards"
+    
+    except Exception as e:
+        return f"Error rebuilding leaderboards: {str(e)}"
@@ -0,0 +1,23 @@
+def refill_mock_paper_pools(mock_test_id=None):
+    """Top up the pre-generated paper pools of active mock tests"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.models.models import UGCNetMockTest
+        from app.services.mock_paper_pool_service import MockPaperPoolService
+        
+        with get_task_app().app_context():
+            query = UGCNetMockTest.query.filter_by(is_active=True)
+            if mock_test_id is not None:
+                query = query.filter_by(id=mock_test_id)
+            
+            pool_service = MockPaperPoolService()
+            papers_added = 0
+            mock_tests = query.all()
+            for mock_test in mock_tests:
+                papers_added += pool_service.fill_pool(mock_test)
+            
+            return f"Added {papers_added} papers to the pools of {len(mock_tests)} mock tests"
+    
+    except Exception as e:
+        return f"Error refilling mock paper pools: {str(e)}"
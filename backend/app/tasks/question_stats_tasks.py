@@ -0,0 +1,13 @@
+def flush_question_stats():
+    """Fold the queued per-question outcome deltas into the question bank statistics"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.question_stats_service import QuestionStatsService
+        
+        with get_task_app().app_context():
+            updated = QuestionStatsService().flush()
+            return f"Updated the statistics of {updated} questions"
+    
+    except Exception as e:
+        return f"Error flushing question statistics: {str(e)}"
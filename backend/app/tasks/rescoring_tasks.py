@@ -0,0 +1,47 @@
+def rescore_question_attempts(question_ids, job_id=None):
+    """Re-score the attempts that served questions whose answer key was corrected"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.attempt_rescoring_service import AttemptRescoringService
+        
+        with get_task_app().app_context():
+            summary = AttemptRescoringService().rescore(question_ids, job_id)
+            
+            return (
+                f"Re-scored {summary['attempts_rescored']} of {summary['attempts_checked']} attempts "
+                f"for questions {question_ids}, refreshed metrics of {summary['metrics_updated']} users"
+            )
+    
+    except Exception as e:
+        return f"Error re-scoring attempts: {str(e)}"
+
+
+def backfill_attempt_question_index():
+    """Index the questions of attempts created before the question to attempt index existed"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.attempt_rescoring_service import AttemptRescoringService
+        
+        with get_task_app().app_context():
+            added = AttemptRescoringService().backfill_index()
+            return f"Indexed the questions of {added} attempts"
+    
+    except Exception as e:
+        return f"Error backfilling attempt question index: {str(e)}"
+
+
+def backfill_attempt_responses():
+    """Write per-question responses for attempts submitted before the attempt_responses table existed"""
+    try:
+        # Import here to avoid circular import
+        from app import get_task_app
+        from app.services.attempt_response_service import AttemptResponseService
+        
+        with get_task_app().app_context():
+            added = AttemptResponseService().backfill()
+            return f"Backfilled the responses of {added} attempts"
+    
+    except Exception as e:
+        return f"Error backfilling attempt responses: {str(e)}"
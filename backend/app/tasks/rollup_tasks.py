@@ -0,0 +1,24 @@
+def rebuild_attempt_rollups(days=None):
+    """
+    Recompute the daily attempt rollups of the last N days, or of all days when
+    they are missing or no N is given, and the subject activity
+    """
+    try:
+        # Import here to avoid circular import
+        from datetime import timedelta
+        from app import get_task_app
+        from app.services.activity_service import ist_day
+        from app.services.attempt_rollup_service import AttemptRollupService
+        
+        with get_task_app().app_context():
+            service = AttemptRollupService()
+            start_day = ist_day() - timedelta(days=days) if days and service.is_built() else None
+            written = service.rebuild(start_day)
+            users = service.rebuild_activity()
+            return (
+                f"Rebuilt {written} daily attempt rollups" + (f" for the last {days} days" if start_day else "")
+                + f" and the subject activity of {users} users"
+            )
+    
+    except Exception as e:
+        return f"Error rebuilding attempt rollups: {str(e)}"
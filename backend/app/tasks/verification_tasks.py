@@ -1,6 +1,5 @@
 from flask import Flask
 from app import create_app, db
-from app.models.models import Quiz, Question
 from app.services.ai_service import AIService
 from datetime import datetime
 import json
@@ -38,6 +37,9 @@ def verify_and_store_quiz_task(quiz_id, verification_config=None):
     
     with app.app_context():
         try:
+            # Import here so the tasks package stays importable without the legacy quiz models
+            from app.models.models import Quiz, Question
+            
             # Get quiz and questions
             quiz = Quiz.query.get(quiz_id)
             if not quiz:
@@ -161,6 +163,9 @@ def verify_single_question_task(question_id, verification_config=None):
     
     with app.app_context():
         try:
+            # Import here so the tasks package stays importable without the legacy quiz models
+            from app.models.models import Question
+            
             question = Question.query.get(question_id)
             if not question:
                 return {'status': 'error', 'message': 'Question not found'}
@@ -33,6 +33,17 @@ def add_column_if_not_exists(table_name, column_name, column_definition):
         db.session.rollback()
         return False
 
+def create_index_if_not_exists(index_name, table_name, columns):
+    """Create an index on an existing table if it doesn't exist"""
+    try:
+        db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})"))
+        db.session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error creating index {index_name} on {table_name}: {e}")
+        db.session.rollback()
+        return False
+
 def apply_migrations():
     """Apply all pending migrations"""
     logger.info("Starting database migrations...")
@@ -63,4 +74,102 @@ def apply_migrations():
         db.session.rollback()
         raise
     
+    # Migration 002: Freeze the generated paper on mock attempts
+    try:
+        add_column_if_not_exists('ugc_net_mock_attempts', 'answer_key', 'TEXT')
+        
+        logger.info("Migration 002 completed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error in migration 002: {e}")
+        db.session.rollback()
+        raise
+    
+    # Migration 003: Store the generation seed and question bank version of each paper
+    try:
+        add_column_if_not_exists('ugc_net_mock_attempts', 'paper_seed', 'BIGINT')
+        add_column_if_not_exists('ugc_net_mock_attempts', 'bank_version', 'INTEGER')
+        add_column_if_not_exists('ugc_net_practice_attempts', 'paper_seed', 'BIGINT')
+        add_column_if_not_exists('ugc_net_practice_attempts', 'bank_version', 'INTEGER')
+        
+        logger.info("Migration 003 completed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error in migration 003: {e}")
+        db.session.rollback()
+        raise
+    
+    # Migration 004: Calibrated IRT parameters per question
+    try:
+        add_column_if_not_exists('question_bank', 'irt_difficulty', 'FLOAT')
+        add_column_if_not_exists('question_bank', 'irt_discrimination', 'FLOAT')
+        add_column_if_not_exists('question_bank', 'irt_calibrated_at', 'DATETIME')
+        
+        logger.info("Migration 004 completed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error in migration 004: {e}")
+        db.session.rollback()
+        raise
+    
+    # Migration 005: Index in-progress attempts by start time for the expiry sweeper
+    try:
+        create_index_if_not_exists(
+            'ix_ugc_net_mock_attempts_status_start_time', 'ugc_net_mock_attempts', ['status', 'start_time']
+        )
+        create_index_if_not_exists(
+            'ix_ugc_net_practice_attempts_status_start_time', 'ugc_net_practice_attempts', ['status', 'start_time']
+        )
+        
+        # Practice attempts only started recording start_time now; older ones expire from creation
+        db.session.execute(text(
+            "UPDATE ugc_net_practice_attempts SET start_time = created_at "
+            "WHERE status = 'in_progress' AND start_time IS NULL"
+        ))
+        db.session.commit()
+        
+        logger.info("Migration 005 completed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error in migration 005: {e}")
+        db.session.rollback()
+        raise
+    
+    # Migration 006: Add pass counts to the daily attempt rollups
+    try:
+        added = [
+            add_column_if_not_exists('daily_attempt_rollups', column, 'INTEGER NOT NULL DEFAULT 0')
+            for column in ('borderline_count', 'qualifying_count')
+        ]
+        if any(added):
+            # Rows written without pass counts are dropped, the rebuild_attempt_rollups
+            # task backfills an empty rollup table from all attempts
+            db.session.execute(text("DELETE FROM daily_attempt_rollups"))
+            db.session.commit()
+        
+        logger.info("Migration 006 completed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error in migration 006: {e}")
+        db.session.rollback()
+        raise
+    
+    # Migration 007: Index completed attempts per user for the attempt history feed
+    try:
+        create_index_if_not_exists(
+            'ix_ugc_net_mock_attempts_user_completed', 'ugc_net_mock_attempts',
+            ['user_id', 'is_completed', 'completed_at', 'id']
+        )
+        create_index_if_not_exists(
+            'ix_ugc_net_practice_attempts_user_completed', 'ugc_net_practice_attempts',
+            ['user_id', 'is_completed', 'completed_at', 'id']
+        )
+        
+        logger.info("Migration 007 completed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error in migration 007: {e}")
+        db.session.rollback()
+        raise
+    
     logger.info("All migrations applied successfully")
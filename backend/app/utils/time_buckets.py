@@ -0,0 +1,89 @@
+"""
+Time bucket helpers for trend queries
+Hour, day and week (starting Monday) buckets in IST, as SQL expressions to
+GROUP BY and as the matching labels to fill empty buckets in Python, so a
+trend over any window costs one grouped query
+"""
+
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import func
+
+from app.utils.timezone_utils import utc_to_ist
+
+GRANULARITIES = ('hour', 'day', 'week')
+
+# IST has no daylight saving, fixed SQLite modifiers convert between stored UTC and IST times
+IST_MODIFIER = '+330 minutes'
+UTC_MODIFIER = '-330 minutes'
+
+
+def validate_granularity(granularity):
+    """Raise ValueError for anything but hour, day or week"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity}, expected one of {', '.join(GRANULARITIES)}")
+    return granularity
+
+
+def bucket_expression(column, granularity='day', stored_in_ist=False):
+    """
+    SQL label of the IST bucket of a datetime column
+    
+    Columns hold naive UTC unless stored_in_ist (practice completion times).
+    Labels are 'YYYY-MM-DDTHH:00' for hours and 'YYYY-MM-DD' for days and
+    for weeks, where they name the Monday.
+    """
+    validate_granularity(granularity)
+    modifiers = () if stored_in_ist else (IST_MODIFIER,)
+    if granularity == 'hour':
+        return func.strftime('%Y-%m-%dT%H:00', column, *modifiers)
+    if granularity == 'day':
+        return func.date(column, *modifiers)
+    # Back six days, then forward to the next Monday (the same day if it is one)
+    return func.date(column, *modifiers, '-6 days', 'weekday 1')
+
+
+def utc_expression(column, stored_in_ist=False):
+    """SQL naive UTC time of a datetime column that holds UTC, or IST when stored_in_ist"""
+    return func.datetime(column, UTC_MODIFIER) if stored_in_ist else column
+
+
+def bucket_start(ist_dt, granularity='day'):
+    """Start of the bucket holding a naive IST time"""
+    validate_granularity(granularity)
+    if granularity == 'hour':
+        return ist_dt.replace(minute=0, second=0, microsecond=0)
+    day_start = ist_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return day_start
+    return day_start - timedelta(days=day_start.weekday())
+
+
+def bucket_label(ist_dt, granularity='day'):
+    """Label of the bucket holding a naive IST time, as bucket_expression gives it"""
+    start = bucket_start(ist_dt, granularity)
+    return start.strftime('%Y-%m-%dT%H:00') if granularity == 'hour' else start.date().isoformat()
+
+
+def bucket_labels(start_ist, end_ist, granularity='day') -> List[str]:
+    """Labels of every bucket from the one holding start_ist to the one holding end_ist"""
+    step = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}[
+        validate_granularity(granularity)
+    ]
+    labels = []
+    current = bucket_start(start_ist, granularity)
+    while current <= end_ist:
+        labels.append(bucket_label(current, granularity))
+        current += step
+    return labels
+
+
+def trailing_window(days, granularity='day', now=None):
+    """
+    (start in UTC, start in IST, now in IST) of the last N days, the start moved
+    back to the beginning of its bucket so the first bucket is whole
+    """
+    now_ist = utc_to_ist(now or datetime.utcnow()).replace(tzinfo=None)
+    start_ist = bucket_start(now_ist - timedelta(days=days), granularity)
+    return start_ist - timedelta(minutes=330), start_ist, now_ist
@@ -67,6 +67,14 @@ def parse_ist_datetime(date_str, format_str='%Y-%m-%d %H:%M:%S'):
     ist_dt = IST.localize(ist_dt)
     return ist_dt.astimezone(timezone.utc).replace(tzinfo=None)
 
+def attempt_time_to_utc(attempt_type, completed_at):
+    """Naive UTC completion time of an attempt, practice attempts store theirs in IST and mock attempts in UTC"""
+    if completed_at is None:
+        return None
+    
+    completed_at = completed_at.replace(tzinfo=None)
+    return completed_at if attempt_type == 'mock' else ist_to_utc(completed_at)
+
 def get_ist_isoformat(dt):
     """Get ISO format string in IST timezone"""
     if dt is None:
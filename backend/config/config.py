@@ -30,6 +30,14 @@ class Config:
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') 
     MOCK_TEST_TIME_LIMIT = int(os.environ.get('MOCK_TEST_TIME_LIMIT') or 60)
     CACHE_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT') or 300)
+    
+    # Pre-generated mock test papers kept per active mock test
+    MOCK_PAPER_POOL_SIZE = int(os.environ.get('MOCK_PAPER_POOL_SIZE') or 20)
+    MOCK_PAPER_POOL_LOW_WATER = int(os.environ.get('MOCK_PAPER_POOL_LOW_WATER') or 5)
+    
+    # Practice auto-saves are buffered in Redis and written at most once per flush age (seconds)
+    ANSWER_BUFFER_ENABLED = os.environ.get('ANSWER_BUFFER_ENABLED', 'true').lower() in ['true', 'on', '1']
+    ANSWER_BUFFER_FLUSH_AGE = int(os.environ.get('ANSWER_BUFFER_FLUSH_AGE') or 300)
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -178,7 +178,7 @@ export function useDashboard() {
       
       const [dashboardRes, historyRes] = await Promise.all([
         userService.getDashboard(),
-        userService.getHistory(1, 5)
+        userService.getHistory(5)
       ])
       
       // Extract stats from dashboard response
@@ -22,8 +22,10 @@ class UserService {
     return await apiClient.get(`/api/v1/users/mock-tests/${chapterId}`)
   }
 
-  async getHistory(page = 1, perPage = 20) {
-    return await apiClient.get(`/api/v1/users/attempts/history?page=${page}&per_page=${perPage}`)
+  async getHistory(perPage = 20, cursor = null) {
+    const params = new URLSearchParams({ per_page: perPage })
+    if (cursor) params.set('cursor', cursor)
+    return await apiClient.get(`/api/v1/users/attempts/history?${params}`)
   }
 
   async getProgress() {
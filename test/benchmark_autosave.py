@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Load test for practice test auto-saves, write-through against buffered
+
+Builds a throwaway SQLite database with one subject's questions and a batch of
+practice attempts, then replays a simulated session through the auto-save
+endpoint: every attempt saves one changed answer per auto-save interval for the
+given duration, buffered answers are flushed once per flush age of simulated
+time and each attempt is submitted at the end. The same session is replayed
+with the answer buffer disabled (every auto-save rewrites answers_data) and
+enabled, counting the SQL write statements and write transactions per attempt.
+
+Needs a reachable Redis at REDIS_URL; responses report whether saves were
+buffered so a missing Redis shows up as a write-through run.
+
+Usage:
+    python test/benchmark_autosave.py --attempts 200 --duration 1800 --autosave-interval 5
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test practice test auto-saves')
+    parser.add_argument('--attempts', type=int, default=100, help='Concurrent practice attempts')
+    parser.add_argument('--questions', type=int, default=30, help='Questions per practice attempt')
+    parser.add_argument('--duration', type=int, default=1800, help='Simulated seconds each attempt is worked on')
+    parser.add_argument('--autosave-interval', type=int, default=5, help='Simulated seconds between auto-saves')
+    parser.add_argument('--flush-age', type=int, default=300, help='ANSWER_BUFFER_FLUSH_AGE in simulated seconds')
+    parser.add_argument('--db', help='SQLite file to build (default: a temporary file)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the simulated answers')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    return parser.parse_args()
+
+
+def configure_environment(db_path):
+    """Point the app at the benchmark database before it is imported"""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark')
+    sys.path.insert(0, BACKEND_DIR)
+
+
+class WriteCounter:
+    """Counts SQL write statements and the transactions that committed them"""
+    
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.statements = 0
+        self.transactions = 0
+        self._pending = False
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+        event.listen(engine, 'commit', self._on_commit)
+    
+    def _on_execute(self, conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
+            self.statements += 1
+            self._pending = True
+    
+    def _on_commit(self, conn):
+        if self._pending:
+            self.transactions += 1
+            self._pending = False
+    
+    def snapshot(self):
+        return self.statements, self.transactions
+
+
+def build_dataset(db, args):
+    """Questions for the attempts and a student to own them"""
+    import hashlib
+    from app.models import User, Chapter, QuestionBank
+    
+    chapter = Chapter.query.order_by(Chapter.id).first()
+    rows = []
+    for i in range(args.questions):
+        text = f'Benchmark question {i}'
+        rows.append({
+            'question_text': text, 'option_a': 'a', 'option_b': 'b', 'option_c': 'c', 'option_d': 'd',
+            'correct_option': 'ABCD'[i % 4], 'topic': 'Benchmark', 'difficulty': 'medium', 'source': 'manual', 'marks': 2,
+            'is_verified': True, 'chapter_id': chapter.id,
+            'content_hash': hashlib.sha256(text.encode()).hexdigest()
+        })
+    db.session.execute(QuestionBank.__table__.insert(), rows)
+    
+    user = User(email='autosave@bench.local', full_name='Autosave Benchmark')
+    user.set_password('benchmark')
+    db.session.add(user)
+    db.session.commit()
+    
+    question_ids = [q.id for q in QuestionBank.query.filter_by(chapter_id=chapter.id).order_by(QuestionBank.id)]
+    return user, chapter, question_ids[-args.questions:]
+
+
+def create_attempts(db, args, user, chapter, question_ids):
+    from app.models import UGCNetPracticeAttempt
+    
+    attempts = []
+    for i in range(args.attempts):
+        attempt = UGCNetPracticeAttempt(
+            user_id=user.id,
+            subject_id=chapter.subject_id,
+            title=f'Benchmark practice {i}',
+            total_questions=len(question_ids),
+            status='generated'
+        )
+        attempt.set_selected_chapters([chapter.id])
+        attempt.set_questions_data([{'id': question_id} for question_id in question_ids])
+        attempts.append(attempt)
+    db.session.add_all(attempts)
+    db.session.commit()
+    return [attempt.id for attempt in attempts]
+
+
+def run_session(app, db, args, mode, attempt_ids, question_ids, headers, counter):
+    """Replay one simulated session, returning its write counts and latencies"""
+    from app.services.answer_buffer_service import AnswerBufferService
+    
+    app.config['ANSWER_BUFFER_ENABLED'] = mode == 'buffered'
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    
+    ticks = args.duration // args.autosave_interval
+    flush_every = max(args.flush_age // args.autosave_interval, 1)
+    
+    saves = 0
+    buffered = 0
+    latencies = []
+    start_statements, start_transactions = counter.snapshot()
+    
+    for tick in range(1, ticks + 1):
+        for attempt_id in attempt_ids:
+            question_id = rng.choice(question_ids)
+            started = time.perf_counter()
+            response = client.put(
+                f'/api/v1/ugc-net/practice-tests/attempts/{attempt_id}/answers',
+                headers=headers, json={'changes': {str(question_id): rng.choice('ABCD')}}
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            saves += 1
+            buffered += bool(response.get_json().get('buffered'))
+        
+        if tick % flush_every == 0:
+            AnswerBufferService().flush(max_age=0)
+    
+    autosave_statements, autosave_transactions = counter.snapshot()
+    
+    for attempt_id in attempt_ids:
+        client.post(f'/api/v1/ugc-net/practice-tests/attempts/{attempt_id}/submit', headers=headers, json={})
+    
+    end_statements, end_transactions = counter.snapshot()
+    latencies.sort()
+    
+    return {
+        'mode': mode,
+        'autosaves': saves,
+        'buffered_autosaves': buffered,
+        'autosave_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3),
+            'p95': round(latencies[int(len(latencies) * 0.95)], 3)
+        },
+        'autosave_phase': {
+            'write_statements_per_attempt': round((autosave_statements - start_statements) / len(attempt_ids), 2),
+            'write_transactions_per_attempt': round(
+                (autosave_transactions - start_transactions) / len(attempt_ids), 3
+            )
+        },
+        'submit_phase': {
+            'write_statements_per_attempt': round((end_statements - autosave_statements) / len(attempt_ids), 2),
+            'write_transactions_per_attempt': round((end_transactions - autosave_transactions) / len(attempt_ids), 3)
+        }
+    }
+
+
+def main():
+    args = parse_args()
+    
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='prepcheck-bench-'), 'benchmark.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    configure_environment(db_path)
+    
+    from app import create_app, db
+    from flask_jwt_extended import create_access_token
+    
+    with redirect_stdout(io.StringIO()):
+        app = create_app()
+    
+    with app.app_context():
+        user, chapter, question_ids = build_dataset(db, args)
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+        counter = WriteCounter(db.engine)
+        
+        results = []
+        for mode in ('write_through', 'buffered'):
+            attempt_ids = create_attempts(db, args, user, chapter, question_ids)
+            with redirect_stdout(io.StringIO()):
+                results.append(run_session(app, db, args, mode, attempt_ids, question_ids, headers, counter))
+    
+    write_through, buffered = (result['autosave_phase'] for result in results)
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform()
+        },
+        'parameters': vars(args),
+        'results': results,
+        'autosave_write_reduction': {
+            key: round(write_through[key] / buffered[key], 1) if buffered[key] else None
+            for key in write_through
+        }
+    }
+    
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(report_json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the IRT calibration fit on a synthetic sparse response matrix
+
+Draws abilities, difficulties and discriminations, simulates a fixed number of
+responses per user against random questions and times building the matrix and
+fitting it. Parameter recovery (correlation with the true values) is reported
+next to the timings so speedups can be checked for accuracy regressions.
+
+Usage:
+    python test/benchmark_irt_calibration.py --users 100000 --questions 50000 --responses-per-user 100
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark IRT calibration')
+    parser.add_argument('--users', type=int, default=100000, help='Synthetic users')
+    parser.add_argument('--questions', type=int, default=50000, help='Synthetic questions')
+    parser.add_argument('--responses-per-user', type=int, default=100, help='Responses simulated per user')
+    parser.add_argument('--model', choices=['1pl', '2pl'], default='2pl', help='IRT model to fit')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic data')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    return parser.parse_args()
+
+
+def simulate(args):
+    """Sparse responses as aligned (user, question, correct) arrays plus the true parameters"""
+    rng = np.random.default_rng(args.seed)
+    ability = rng.normal(0, 1, args.users)
+    difficulty = rng.normal(0, 1, args.questions)
+    discrimination = rng.lognormal(0, 0.3, args.questions) if args.model == '2pl' else np.ones(args.questions)
+    
+    users = np.repeat(np.arange(args.users), args.responses_per_user)
+    questions = rng.integers(0, args.questions, len(users))
+    p = 1 / (1 + np.exp(-discrimination[questions] * (ability[users] - difficulty[questions])))
+    correct = rng.random(len(p)) < p
+    return users, questions, correct, difficulty, discrimination
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, BACKEND_DIR)
+    from app.services.irt_calibration_service import IRTCalibrationService
+    
+    service = IRTCalibrationService(model=args.model)
+    
+    start = time.perf_counter()
+    users, questions, correct, true_difficulty, true_discrimination = simulate(args)
+    simulate_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    user_index, item_index, correct, user_ids, question_ids = service.build_matrix(users, questions, correct)
+    matrix_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    fit = service.fit(user_index, item_index, correct, len(user_ids), len(question_ids))
+    fit_seconds = time.perf_counter() - start
+    
+    recovery = {
+        'difficulty_correlation': round(float(np.corrcoef(fit['difficulty'], true_difficulty[question_ids])[0, 1]), 4)
+    }
+    if args.model == '2pl':
+        recovery['discrimination_correlation'] = round(
+            float(np.corrcoef(fit['discrimination'], true_discrimination[question_ids])[0, 1]), 4
+        )
+    
+    report = {
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform()},
+        'parameters': vars(args),
+        'matrix': {'responses': int(len(correct)), 'users': int(len(user_ids)), 'questions': int(len(question_ids))},
+        'timings_seconds': {
+            'simulate': round(simulate_seconds, 2),
+            'build_matrix': round(matrix_seconds, 2),
+            'fit': round(fit_seconds, 2),
+            'per_iteration': round(fit_seconds / max(fit['iterations'], 1), 3)
+        },
+        'iterations': fit['iterations'],
+        'converged': fit['converged'],
+        'recovery': recovery
+    }
+    
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(report_json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the paper assembler
+Times the chapter x difficulty x source allocation on synthetic question pools,
+no database or Redis needed
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app.services.paper_assembler import PaperAssembler
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+SOURCES = ('previous_year', 'ai_generated', 'manual')
+
+
+def build_candidates(chapters, questions_per_chapter, rng):
+    """Synthetic pools with uneven stock so some cells run short"""
+    candidates = {}
+    next_id = 1
+    for chapter_id in range(1, chapters + 1):
+        cells = {}
+        for difficulty in DIFFICULTIES:
+            for source in SOURCES:
+                size = rng.randint(0, questions_per_chapter // 4)
+                cells[(difficulty, source)] = list(range(next_id, next_id + size))
+                next_id += size
+        candidates[chapter_id] = cells
+    return candidates
+
+
+def run_benchmark(chapters=10, questions_per_chapter=400, total_questions=100, rounds=2000):
+    rng = random.Random(42)
+    candidates = build_candidates(chapters, questions_per_chapter, rng)
+    chapter_quotas = {chapter_id: total_questions // chapters for chapter_id in candidates}
+    assembler = PaperAssembler(
+        {'easy': 30, 'medium': 50, 'hard': 20},
+        {'previous_year': 60, 'ai_generated': 30, 'manual': 10}
+    )
+    
+    start = time.perf_counter()
+    for i in range(rounds):
+        result = assembler.assemble(chapter_quotas, candidates, random.Random(i))
+    elapsed = time.perf_counter() - start
+    
+    selected = sum(len(ids) for ids in result['selected_ids'].values())
+    print(f"{chapters} chapters, {total_questions} questions: "
+          f"{elapsed / rounds * 1000:.3f} ms per paper "
+          f"({selected} selected, {len(result['relaxations'])} relaxations, shortfall {result['shortfall']})")
+
+
+if __name__ == '__main__':
+    print("Benchmarking paper assembler...")
+    run_benchmark(chapters=10, total_questions=50)
+    run_benchmark(chapters=10, total_questions=100)
+    run_benchmark(chapters=30, total_questions=150, rounds=500)
+    run_benchmark(chapters=100, questions_per_chapter=2000, total_questions=200, rounds=200)
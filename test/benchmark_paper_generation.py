@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for paper and practice test generation on a synthetic question bank
+
+Builds a throwaway SQLite database with the seeded UGC NET subjects and chapters,
+optional extra synthetic subjects and a configurable number of QuestionBank rows
+with skewed chapter, difficulty and source mixes. Each generator path is timed
+(cold index and warm), its SQL statements counted and its peak Python memory
+recorded. The report is written as JSON so runs can be diffed between releases,
+and the script exits non-zero when any path fails or is skipped.
+
+Usage:
+    python test/benchmark_paper_generation.py --questions 100000 --output report.json
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+DIFFICULTY_MIX = {'easy': 35, 'medium': 45, 'hard': 20}
+SOURCE_MIX = {'ai_generated': 60, 'previous_year': 25, 'manual': 15}
+VERIFIED_RATIO = 0.9
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark UGC NET paper generation')
+    parser.add_argument('--questions', type=int, default=10000, help='QuestionBank rows to create (1k-1M)')
+    parser.add_argument('--extra-subjects', type=int, default=0, help='Synthetic paper 2 subjects on top of the seeded ones')
+    parser.add_argument('--chapters-per-subject', type=int, default=10, help='Chapters per synthetic subject')
+    parser.add_argument('--chapter-skew', type=float, default=1.0, help='Zipf exponent of questions per chapter (0 = uniform)')
+    parser.add_argument('--paper-questions', type=int, default=100, help='Questions per generated paper')
+    parser.add_argument('--practice-questions', type=int, default=30, help='Questions per practice test')
+    parser.add_argument('--rounds', type=int, default=20, help='Warm runs per generator path')
+    parser.add_argument('--db', help='SQLite file to build (default: a temporary file)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic data')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    return parser.parse_args()
+
+
+def configure_environment(db_path):
+    """Point the app at the benchmark database before it is imported"""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark')
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def weighted_choices(rng, mix, k):
+    return rng.choices(list(mix), weights=list(mix.values()), k=k)
+
+
+def build_dataset(db, args):
+    """Add synthetic subjects and bulk insert the question bank"""
+    from app.models import Subject, Chapter, QuestionBank
+    
+    rng = random.Random(args.seed)
+    
+    # The mock test path looks Paper 1 up by the code 'P1', which the subject seed does not use
+    if not Subject.query.filter_by(subject_code='P1').first():
+        Subject.query.filter_by(paper_type='paper1').order_by(Subject.id).first().subject_code = 'P1'
+    
+    for i in range(args.extra_subjects):
+        subject = Subject(
+            name=f'Benchmark Subject {i + 1}',
+            subject_code=f'B{i + 1:03d}',
+            paper_type='paper2',
+            description='Synthetic subject for benchmarking'
+        )
+        db.session.add(subject)
+        db.session.flush()
+        for order in range(args.chapters_per_subject):
+            db.session.add(Chapter(
+                name=f'Benchmark Chapter {order + 1}',
+                subject_id=subject.id,
+                weightage=rng.randint(5, 20),
+                chapter_order=order + 1
+            ))
+    db.session.commit()
+    
+    chapters = Chapter.query.order_by(Chapter.id).all()
+    
+    # Zipf-like skew: a few chapters hold most of the bank
+    chapter_weights = [1 / (rank + 1) ** args.chapter_skew for rank in range(len(chapters))]
+    rng.shuffle(chapter_weights)
+    
+    batch_size = 10000
+    for start in range(0, args.questions, batch_size):
+        count = min(batch_size, args.questions - start)
+        chapter_picks = rng.choices(chapters, weights=chapter_weights, k=count)
+        difficulties = weighted_choices(rng, DIFFICULTY_MIX, count)
+        sources = weighted_choices(rng, SOURCE_MIX, count)
+        
+        rows = []
+        for offset in range(count):
+            chapter = chapter_picks[offset]
+            text = f'Benchmark question {start + offset}'
+            rows.append({
+                'question_text': text,
+                'option_a': 'A', 'option_b': 'B', 'option_c': 'C', 'option_d': 'D',
+                'correct_option': rng.choice('ABCD'),
+                'marks': 2,
+                'paper_type': 'paper1' if chapter.subject.paper_type == 'paper1' else 'paper2',
+                'topic': chapter.name,
+                'difficulty': difficulties[offset],
+                'source': sources[offset],
+                'is_verified': rng.random() < VERIFIED_RATIO,
+                'chapter_id': chapter.id,
+                'content_hash': hashlib.sha256(text.encode()).hexdigest()
+            })
+        db.session.execute(QuestionBank.__table__.insert(), rows)
+        db.session.commit()
+    
+    return {
+        'subjects': Subject.query.count(),
+        'chapters': len(chapters),
+        'questions': QuestionBank.query.count(),
+        'verified_questions': QuestionBank.query.filter_by(is_verified=True).count(),
+        'chapter_skew': args.chapter_skew,
+        'difficulty_mix': DIFFICULTY_MIX,
+        'source_mix': SOURCE_MIX
+    }
+
+
+class StatementCounter:
+    """Counts SQL statements sent through the engine"""
+    
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+    
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(fn, counter):
+    """Run fn once, returning (elapsed_ms, sql_statements, peak_kb, result)"""
+    counter.count = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = fn()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, counter.count, peak / 1024, result
+
+
+def benchmark_path(name, fn, rounds, counter, db):
+    """Time one generator path with a cold question pool index and then warm"""
+    from app.services.question_pool_index import bump_bank_version
+    
+    try:
+        bump_bank_version()
+        db.session.expunge_all()
+        cold_ms, cold_sql, cold_peak_kb, result = measure(fn, counter)
+    except ImportError as e:
+        return {'name': name, 'status': 'skipped', 'error': str(e)}
+    
+    if isinstance(result, dict) and result.get('success') is False:
+        return {'name': name, 'status': 'failed', 'error': result.get('error')}
+    
+    timings, statements, peaks = [], [], []
+    for _ in range(rounds):
+        db.session.expunge_all()
+        elapsed_ms, sql_count, peak_kb, _ = measure(fn, counter)
+        timings.append(elapsed_ms)
+        statements.append(sql_count)
+        peaks.append(peak_kb)
+    
+    timings.sort()
+    return {
+        'name': name,
+        'status': 'ok',
+        'cold': {'ms': round(cold_ms, 3), 'sql_statements': cold_sql, 'peak_memory_kb': round(cold_peak_kb, 1)},
+        'warm': {
+            'rounds': rounds,
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'max_ms': round(timings[-1], 3),
+            'sql_statements': max(statements),
+            'peak_memory_kb': round(max(peaks), 1)
+        }
+    }
+
+
+def run_benchmarks(db, args):
+    from app.models import Subject, Chapter
+    from app.services.ugc_net_paper_generator import UGCNetPaperGenerator
+    
+    generator = UGCNetPaperGenerator()
+    counter = StatementCounter(db.engine)
+    
+    # Benchmark against the paper 2 subject with the most chapters
+    subject = max(
+        Subject.query.filter_by(paper_type='paper2').all(),
+        key=lambda s: Chapter.query.filter_by(subject_id=s.id).count()
+    )
+    chapter_ids = [
+        c.id for c in Chapter.query.filter_by(subject_id=subject.id).order_by(Chapter.chapter_order).limit(3)
+    ]
+    
+    paper_config = {
+        'subject_id': subject.id,
+        'paper_type': 'paper2',
+        'total_questions': args.paper_questions,
+        'difficulty_distribution': {'easy': 30, 'medium': 50, 'hard': 20},
+        'source_distribution': {'previous_year': 70, 'ai_generated': 30}
+    }
+    practice_config = dict(paper_config, total_questions=args.practice_questions, chapter_ids=chapter_ids)
+    mock_config = dict(paper_config, paper_type='mock')
+    
+    def mock_service_questions():
+        from app.services.ugc_net_mock_service import UGCNetMockTestService
+        return UGCNetMockTestService.generate_mock_test_questions(
+            subject.id, 'paper2', args.paper_questions
+        )
+    
+    paths = [
+        ('generate_paper', lambda: generator.generate_paper(paper_config)),
+        ('generate_practice_test', lambda: generator.generate_practice_test(practice_config)),
+        ('generate_mock_test', lambda: generator.generate_paper(mock_config)),
+        ('mock_service_generate_mock_test_questions', mock_service_questions)
+    ]
+    
+    return {
+        'subject_id': subject.id,
+        'results': [benchmark_path(name, fn, args.rounds, counter, db) for name, fn in paths]
+    }
+
+
+def main():
+    args = parse_args()
+    
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='prepcheck-bench-'), 'benchmark.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    configure_environment(db_path)
+    
+    from app import create_app, db
+    
+    with redirect_stdout(io.StringIO()):
+        app = create_app()
+    
+    with app.app_context():
+        build_start = time.perf_counter()
+        dataset = build_dataset(db, args)
+        dataset['build_seconds'] = round(time.perf_counter() - build_start, 2)
+        
+        benchmarks = run_benchmarks(db, args)
+    
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform()
+        },
+        'parameters': vars(args),
+        'dataset': dataset,
+        'subject_id': benchmarks['subject_id'],
+        'results': benchmarks['results']
+    }
+    
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(report_json)
+    
+    # A failed or skipped path means the report is incomplete
+    incomplete = [result['name'] for result in report['results'] if result['status'] != 'ok']
+    if incomplete:
+        print(f"Incomplete paths: {', '.join(incomplete)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Check that a stored mock attempt's paper can be rebuilt from its seed over HTTP"""
+
+import sys
+import os
+from datetime import datetime
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from app import create_app, db
+from app.models import User, UGCNetMockTest, UGCNetMockAttempt
+from app.controllers.ugc_net.mock_test_controller import freeze_attempt_paper
+from app.services.mock_paper_pool_service import build_paper_config
+from app.services.ugc_net_paper_generator import UGCNetPaperGenerator
+from flask_jwt_extended import create_access_token
+
+REGENERATE_URL = "/api/v1/admin/mock-tests/attempts/{attempt_id}/regenerate"
+
+
+def test_paper_regeneration():
+    """A frozen attempt paper regenerates to the same ordered question IDs"""
+    app = create_app()
+
+    with app.app_context():
+        admin = User.query.filter_by(is_admin=True).first()
+        if not admin:
+            print("❌ No admin user found")
+            return False
+
+        mock_test = UGCNetMockTest.query.filter_by(is_active=True).first()
+        if not mock_test:
+            print("❌ No active mock test found")
+            return False
+
+        result = UGCNetPaperGenerator().generate_paper(build_paper_config(mock_test))
+        if not result['success']:
+            print(f"❌ Paper generation failed: {result['error']}")
+            return False
+        if result['bank_version'] is None:
+            print("❌ No shared question bank version; regeneration needs Redis")
+            return False
+
+        attempt = UGCNetMockAttempt(
+            mock_test_id=mock_test.id,
+            user_id=admin.id,
+            status='in_progress',
+            start_time=datetime.utcnow(),
+            time_limit=mock_test.time_limit
+        )
+        freeze_attempt_paper(attempt, result['paper']['questions'], result['seed'], result['bank_version'])
+        db.session.add(attempt)
+        db.session.commit()
+
+        try:
+            client = app.test_client()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=str(admin.id))}'}
+
+            response = client.get(REGENERATE_URL.format(attempt_id=attempt.id), headers=headers)
+            data = response.get_json() or {}
+            if response.status_code != 200:
+                print(f"❌ Regeneration failed: {response.status_code} {data}")
+                return False
+            if not data['data']['matches_frozen_paper']:
+                print(f"❌ Seed {attempt.paper_seed} rebuilt a different paper")
+                return False
+            print(f"✅ Seed {attempt.paper_seed} rebuilt {len(data['data']['question_ids'])} questions in order")
+
+            response = client.get(REGENERATE_URL.format(attempt_id=0), headers=headers)
+            if response.status_code != 404:
+                print(f"❌ Unknown attempt: expected 404, got {response.status_code}")
+                return False
+            print("✅ Unknown attempt answered with 404")
+
+            return True
+        finally:
+            db.session.delete(attempt)
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    success = test_paper_regeneration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Check the question bank usage trends endpoint over HTTP for every granularity"""
+
+import sys
+import os
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from app import create_app
+from app.models.models import User
+from flask_jwt_extended import create_access_token
+
+TRENDS_URL = "/api/v1/admin/question-bank/analytics/trends"
+
+# (query string, expected status)
+CASES = [
+    ("", 200),
+    ("?granularity=day&days=30", 200),
+    ("?granularity=week&days=90", 200),
+    ("?granularity=hour&days=2", 200),
+    ("?granularity=hour&days=60", 200),
+    ("?granularity=month", 400),
+]
+
+
+def test_usage_trends():
+    """Every granularity answers with one bucket per period, unknown ones with 400"""
+    app = create_app()
+
+    with app.app_context():
+        admin = User.query.filter_by(is_admin=True).first()
+        if not admin:
+            print("❌ No admin user found")
+            return False
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(admin.id))}'}
+
+        passed = True
+        for query, expected_status in CASES:
+            response = client.get(f"{TRENDS_URL}{query}", headers=headers)
+            data = response.get_json() or {}
+
+            if response.status_code != expected_status:
+                print(f"❌ {query or '(defaults)'}: expected {expected_status}, got {response.status_code} {data}")
+                passed = False
+                continue
+
+            if response.status_code == 200:
+                trends = data.get('trends', [])
+                labels = [bucket['date'] for bucket in trends]
+                if labels != sorted(set(labels)):
+                    print(f"❌ {query or '(defaults)'}: buckets are not unique and ordered")
+                    passed = False
+                    continue
+                if data.get('granularity') == 'hour' and data.get('period_days', 0) > 14:
+                    print(f"❌ {query}: hourly series spans {data.get('period_days')} days")
+                    passed = False
+                    continue
+                print(f"✅ {query or '(defaults)'}: {len(trends)} {data.get('granularity')} buckets, "
+                      f"{sum(bucket['responses'] for bucket in trends)} responses")
+            else:
+                print(f"✅ {query}: {response.status_code} {data.get('error')}")
+
+        response = client.get(TRENDS_URL)
+        if response.status_code != 401:
+            print(f"❌ Unauthenticated request: expected 401, got {response.status_code}")
+            passed = False
+        else:
+            print("✅ Unauthenticated request rejected")
+
+        return passed
+
+
+if __name__ == "__main__":
+    success = test_usage_trends()
+    sys.exit(0 if success else 1)